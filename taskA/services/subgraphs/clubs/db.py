@@ -16,6 +16,9 @@ Attributes:
     db (pymongo.asynchronous.database.AsyncDatabase): MongoDB database.
     clubsdb (pymongo.asynchronous.collection.AsyncCollection): MongoDB
                                                              clubs collection.
+    cache_invalidationsdb (pymongo.asynchronous.collection.AsyncCollection):
+        MongoDB collection for versions of the collections polled by the
+        invalidation bus.
 """
 
 from os import getenv
@@ -36,6 +39,7 @@ client = AsyncMongoClient(MONGO_URI)
 # get database
 db = client[MONGO_DATABASE]
 clubsdb = db.clubs
+cache_invalidationsdb = db.cache_invalidations
 
 
 async def ensure_clubs_index():
@@ -0,0 +1,105 @@
+"""
+Request Loaders Module.
+
+DataLoaders batching and deduplicating the lookups of users made while
+resolving one GraphQL operation. They are created per request on first use,
+see `otypes.Context.loaders`, so nothing is shared between users and the
+results live only as long as the request.
+
+All the users requested in the same tick are fetched with a single
+`usersByList` request to the gateway.
+
+Each loader counts the loads it served, how many were cache hits, and the
+upstream requests and keys it fetched; the counts are returned in the
+`extensions` of the response in debug mode.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+from httpx import AsyncClient
+from strawberry.dataloader import DataLoader
+from strawberry.extensions import SchemaExtension
+
+
+class CountingDataLoader(DataLoader):
+    """
+    DataLoader keeping statistics of its loads and upstream fetches.
+    """
+
+    def __init__(
+        self,
+        load_fn: Callable[[List[Any]], Awaitable[Sequence[Any]]],
+        stats: Dict[str, int],
+        **kwargs,
+    ):
+        self.stats = stats
+
+        async def counted_load_fn(keys: List[Any]) -> Sequence[Any]:
+            self.stats["batches"] += 1
+            self.stats["keys"] += len(keys)
+            return await load_fn(keys)
+
+        super().__init__(counted_load_fn, **kwargs)
+
+    def load(self, key: Any) -> Awaitable[Any]:
+        self.stats["loads"] += 1
+        if self.cache and self.cache_map.get(key) is not None:
+            self.stats["hits"] += 1
+        return super().load(key)
+
+
+class Loaders:
+    """
+    The loaders of a request.
+
+    Attributes:
+        user (CountingDataLoader): user profile by uid, None for unknown
+                                   users, as utils.getUser.
+        stats (Dict[str, Dict[str, int]]): statistics by loader.
+    """
+
+    def __init__(self, cookies: dict | None = None):
+        self.cookies = cookies
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.user = self._loader("user", self._loadUsers)
+
+    def _loader(self, name: str, load_fn) -> CountingDataLoader:
+        self.stats[name] = {"loads": 0, "hits": 0, "batches": 0, "keys": 0}
+        return CountingDataLoader(load_fn, self.stats[name])
+
+    async def _loadUsers(self, uids: List[str]) -> List[dict | None]:
+        query = """
+            query usersByList($userInputs: [UserInput!]!) {
+                usersByList(userInputs: $userInputs) {
+                    firstName
+                    lastName
+                    email
+                    rollno
+                }
+            }
+        """
+        variables = {"userInputs": [{"uid": uid} for uid in uids]}
+        try:
+            async with AsyncClient(cookies=self.cookies) as client:
+                request = await client.post(
+                    "http://gateway/graphql",
+                    json={"query": query, "variables": variables},
+                )
+            return list(request.json()["data"]["usersByList"])
+        except Exception:
+            return [None] * len(uids)
+
+
+class LoaderStatsExtension(SchemaExtension):
+    """
+    Adds the statistics of the loaders used by the operation to the
+    `extensions` of the response, used in debug mode only.
+    """
+
+    def get_results(self) -> Dict[str, Any]:
+        context = self.execution_context.context
+        # the loaders are a cached property, only set if they were used
+        loaders = getattr(context, "__dict__", {}).get("loaders")
+        if loaders is None:
+            return {}
+        return {"loaderStats": loaders.stats}
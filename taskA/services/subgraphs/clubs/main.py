@@ -13,6 +13,7 @@ Attributes:
     app (FastAPI): The FastAPI application instance.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from os import getenv
 
@@ -23,12 +24,15 @@ from strawberry.tools import create_type
 
 # override PyObjectId and Context scalars
 from db import ensure_clubs_index
+from invalidation import invalidation_bus
+from loaders import LoaderStatsExtension
 from models import PyObjectId
 from mutations import mutations
 from otypes import Context, PyObjectIdType
 
 # import all queries and mutations
 from queries import queries
+from utils import clear_club_caches
 
 # create query types
 Query = create_type("Query", queries)
@@ -42,17 +46,18 @@ async def get_context() -> Context:
     return Context()
 
 
+# check whether running in debug mode
+DEBUG = getenv("GLOBAL_DEBUG", "False").lower() in ("true", "1", "t")
+
 # initialize federated schema
 schema = strawberry.federation.Schema(
     query=Query,
     mutation=Mutation,
     enable_federation_2=True,
     scalar_overrides={PyObjectId: PyObjectIdType},
+    extensions=[LoaderStatsExtension] if DEBUG else [],
 )
 
-# check whether running in debug mode
-DEBUG = getenv("GLOBAL_DEBUG", "False").lower() in ("true", "1", "t")
-
 # serve API with FastAPI router
 gql_app = GraphQLRouter(schema, graphiql=True, context_getter=get_context)
 
@@ -61,8 +66,12 @@ gql_app = GraphQLRouter(schema, graphiql=True, context_getter=get_context)
 async def lifespan(app: FastAPI):
     # Startup
     await ensure_clubs_index()
+    # drops the club caches when the clubs change in any process
+    invalidation_bus.subscribe("clubs", lambda _: clear_club_caches())
+    invalidation_task = asyncio.create_task(invalidation_bus.run())
     yield
     # Shutdown
+    invalidation_task.cancel()
 
 
 app = FastAPI(
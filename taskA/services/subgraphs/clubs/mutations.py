@@ -18,9 +18,9 @@ from otypes import (
 )
 from utils import (
     check_remove_old_file,
-    getUser,
     invalidate_active_clubs_cache,
     invalidate_club_cache,
+    invalidate_dependent_club_caches,
     update_events_members_cid,
     update_role,
 )
@@ -84,6 +84,7 @@ async def createClub(clubInput: FullClubInput, info: Info) -> SimpleClubType:
         #     raise Exception("Error in updating the role for the club")
 
         await invalidate_active_clubs_cache()
+        await invalidate_dependent_club_caches(info.context.cookies)
 
         return SimpleClubType.from_pydantic(created_sample)
 
@@ -140,7 +141,7 @@ async def editClub(clubInput: FullClubInput, info: Info) -> FullClubType:
             raise Exception("A club with this code doesn't exist")
 
         # Check whether this cid is valid or not
-        clubMember = await getUser(club_input["cid"], info.context.cookies)
+        clubMember = await info.context.loaders.user.load(club_input["cid"])
         if clubMember is None:
             raise Exception("Invalid Club ID/Club Email")
 
@@ -185,6 +186,7 @@ async def editClub(clubInput: FullClubInput, info: Info) -> FullClubType:
 
         await invalidate_club_cache(club_input["cid"])
         await invalidate_active_clubs_cache()
+        await invalidate_dependent_club_caches(info.context.cookies)
 
         if exists["cid"] != club_input["cid"]:
             await invalidate_club_cache(exists["cid"])
@@ -270,6 +272,7 @@ async def editClub(clubInput: FullClubInput, info: Info) -> FullClubType:
 
         await invalidate_club_cache(club_input["cid"])
         await invalidate_active_clubs_cache()
+        await invalidate_dependent_club_caches(info.context.cookies)
 
         result = Club.model_validate(
             await clubsdb.find_one({"cid": club_input["cid"]})
@@ -324,6 +327,7 @@ async def deleteClub(clubInput: SimpleClubInput, info: Info) -> SimpleClubType:
     )
 
     await invalidate_active_clubs_cache()
+    await invalidate_dependent_club_caches(info.context.cookies)
     await invalidate_club_cache(club_input["cid"])
 
     return SimpleClubType.from_pydantic(updated_sample)
@@ -375,6 +379,7 @@ async def restartClub(
     )
 
     await invalidate_active_clubs_cache()
+    await invalidate_dependent_club_caches(info.context.cookies)
     await invalidate_club_cache(club_input["cid"])
 
     return SimpleClubType.from_pydantic(updated_sample)
@@ -11,6 +11,7 @@ from strawberry.fastapi import BaseContext
 from strawberry.types import Info as _Info
 from strawberry.types.info import RootValueType
 
+from loaders import Loaders
 from models import Club, PyObjectId, Social
 
 
@@ -37,6 +38,13 @@ class Context(BaseContext):
         cookies = json.loads(self.request.headers.get("cookies", "{}"))
         return cookies
 
+    @cached_property
+    def loaders(self) -> Loaders:
+        """
+        DataLoaders of users for this request.
+        """
+        return Loaders(self.cookies)
+
 
 Info = _Info[Context, RootValueType]
 """custom info Type for user metadata"""
@@ -4,6 +4,8 @@ import aiorwlock
 from cachetools import LFUCache, LRUCache
 from httpx import AsyncClient
 
+from invalidation import invalidation_bus
+
 inter_communication_secret = os.getenv("INTER_COMMUNICATION_SECRET")
 
 active_clubs_cache = LRUCache(maxsize=1)
@@ -23,6 +25,60 @@ async def invalidate_club_cache(cid: str):
             del club_cache[cid]
 
 
+async def clear_club_caches():
+    """
+    Drops all the cached clubs, run when the clubs change in any process.
+    """
+    await invalidate_active_clubs_cache()
+    async with club_cache_lock.writer_lock:
+        club_cache.clear()
+
+
+async def invalidate_dependent_club_caches(cookies=None) -> bool:
+    """
+    Function to call the club cache invalidation mutations
+
+    Makes a mutation resolved by the `invalidateEventsClubCache` method from
+    Events Microservice and the `invalidateMembersClubCache` method from
+    Members Microservice, in a single request to the gateway.
+    Used whenever a club is created, edited, deleted or restarted so that
+    their club directories do not serve stale clubs. The change is also
+    published on the invalidation bus for the other processes.
+
+    Args:
+        cookies (dict): Cookies from the request. Defaults to None.
+
+    Returns:
+        (bool): True if both services invalidated their caches.
+    """
+    await invalidation_bus.publish("clubs")
+
+    try:
+        query = """
+            mutation InvalidateClubCaches($interCommunicationSecret: String) {
+                invalidateEventsClubCache(
+                    interCommunicationSecret: $interCommunicationSecret
+                )
+                invalidateMembersClubCache(
+                    interCommunicationSecret: $interCommunicationSecret
+                )
+            }
+        """
+        variables = {"interCommunicationSecret": inter_communication_secret}
+        async with AsyncClient(cookies=cookies) as client:
+            result = await client.post(
+                "http://gateway/graphql",
+                json={"query": query, "variables": variables},
+            )
+        data = result.json()["data"]
+        return bool(
+            data["invalidateEventsClubCache"]
+            and data["invalidateMembersClubCache"]
+        )
+    except Exception:
+        return False
+
+
 async def update_role(uid, cookies=None, role="club") -> dict | None:
     """
     Function to call the updateRole mutation
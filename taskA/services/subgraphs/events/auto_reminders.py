@@ -1,6 +1,26 @@
+"""
+Auto Reminders Module.
+
+Scheduled jobs mailing clubs about their pending bills and event reports.
+A run reads the due events, resolves their clubs and the mail recipients
+once, and then sends the mails concurrently, at most REMINDER_CONCURRENCY
+at a time. A failing mail does not stop the others, each run prints a
+summary of the mails sent, failed and skipped. Sent mails are recorded on
+the run of the firing, a retried firing only sends the ones that failed.
+
+Attributes:
+    REMINDER_CONCURRENCY (int): Maximum number of mails sent at the same
+                                time by a run. Defaults to 8.
+"""
+
+import asyncio
+import os
+import time
 from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
 
 from db import eventsdb
 from mailing import triggerMail
@@ -10,170 +30,251 @@ from mailing_templates import (
     EVENT_REPORT_REMINDER_BODY,
     EVENT_REPORT_REMINDER_SUBJECT,
 )
-from models import Event
 from mtypes import Bills_State_Status, Event_State_Status, timezone
+from scheduling import (
+    addLeasedJob,
+    recordSentItem,
+    sentItems,
+    startCatchUp,
+)
 from utils import get_bot_cookie, getClubDetails, getEventLink, getRoleEmails
 
+REMINDER_CONCURRENCY = int(os.getenv("REMINDER_CONCURRENCY", "8"))
+
+REMINDER_PROJECTION = {"code": 1, "name": 1, "clubid": 1, "budget": 1}
+
 
-async def check_for_bill_status():
+async def resolveClubs(events: List[dict]) -> Dict[str, dict]:
     """
-    Checks for events that have pending bills and sends reminder emails.
-    This function is meant to be run on a schedule.
+    Fetches the details of the clubs of the given events, once per club.
+
+    Args:
+        events (List[dict]): The events.
+
+    Returns:
+        (Dict[str, dict]): The details of the clubs by cid, empty for clubs
+                           that do not exist.
+    """
+    clubids = list({event["clubid"] for event in events})
+    details = await asyncio.gather(
+        *(getClubDetails(clubid, None) for clubid in clubids),
+        return_exceptions=True,
+    )
+    return {
+        clubid: club if isinstance(club, dict) else {}
+        for clubid, club in zip(clubids, details)
+    }
+
+
+async def sendReminders(
+    job: str,
+    events: List[dict],
+    send: Callable[[dict, dict], Awaitable[bool]],
+    started: float,
+) -> dict:
+    """
+    Sends the reminders of a run with bounded concurrency, isolating the
+    failure of each event. Events already reminded by an earlier attempt of
+    the same firing are counted as sent and not mailed again.
 
     Args:
-    None
+        job (str): Name of the job, used in the logs.
+        events (List[dict]): The events to remind.
+        send (Callable[[dict, dict], Awaitable[bool]]): Sends the reminder
+            of an event given the event and its club, returns whether the
+            mail was sent.
+        started (float): time.monotonic() at the start of the run.
+
+    Returns:
+        (dict): The summary of the run, number of mails sent, failed and
+                skipped and duration in seconds.
+    """
+    already_sent = await sentItems()
+    events_to_send = [
+        event for event in events if event["_id"] not in already_sent
+    ]
+    clubs = await resolveClubs(events_to_send)
+    semaphore = asyncio.Semaphore(REMINDER_CONCURRENCY)
+    summary = {
+        "sent": len(events) - len(events_to_send),
+        "failed": 0,
+        "skipped": 0,
+    }
+
+    async def remind(event: dict) -> None:
+        club = clubs.get(event["clubid"]) or {}
+        if not club.get("email"):
+            print(f"{job}: club does not exist for event {event['code']}")
+            summary["skipped"] += 1
+            return
+
+        async with semaphore:
+            try:
+                sent = await send(event, club)
+            except Exception as e:
+                print(
+                    f"{job}: error sending reminder for {event['code']}: {e}"
+                )
+                sent = False
+
+        if sent:
+            summary["sent"] += 1
+            try:
+                await recordSentItem(event["_id"])
+            except Exception as e:
+                print(
+                    f"{job}: error recording reminder for {event['code']}: {e}"
+                )
+        else:
+            summary["failed"] += 1
+
+    await asyncio.gather(*(remind(event) for event in events_to_send))
+
+    summary["duration"] = round(time.monotonic() - started, 3)
+    print(
+        f"{job}: {summary['sent']} sent, {summary['failed']} failed, "
+        f"{summary['skipped']} skipped in {summary['duration']}s"
+    )
+    return summary
+
+
+async def check_for_bill_status() -> dict:
+    """
+    Checks for events that have pending bills and sends reminder emails.
+    This function is meant to be run on a schedule.
 
     Returns:
-    None
+        (dict): The summary of the run.
     """
-    # find events ended in past 4 days, that have
+    started = time.monotonic()
+
+    # find events ended in past week, that have
     # bill status not submitted and event is complete
     current_time = datetime.now(timezone)
     week_ago = current_time - timedelta(days=7)
 
     pending_bills = await eventsdb.find(
         {
-            "datetimeperiod.1": {
-                "$gte": week_ago.isoformat(),
-                "$lte": current_time.isoformat(),
+            "end_at": {
+                "$gte": week_ago,
+                "$lte": current_time,
             },
             "status.state": Event_State_Status.approved.value,
             "budget": {"$exists": True, "$ne": []},
             "bills_status.state": Bills_State_Status.not_submitted.value,
-        }
+        },
+        REMINDER_PROJECTION,
     ).to_list(length=None)
 
     if len(pending_bills) == 0:
-        # print("No pending bills found")
-        return
-
-    bot_cookie = await get_bot_cookie()
-
-    for event in pending_bills:
-        event_instance = Event.model_validate(event)
+        return {"sent": 0, "failed": 0, "skipped": 0, "duration": 0}
 
-        try:
-            clubDetails = await getClubDetails(event_instance.clubid, None)
-
-            if len(clubDetails.keys()) == 0:
-                print(f"Club does not exist for event {event_instance.code}")
-                continue
+    bot_cookie, cc_emails = await asyncio.gather(
+        get_bot_cookie(), getRoleEmails("cc")
+    )
 
-            mail_club = clubDetails["email"]
-            clubname = clubDetails["name"]
+    async def send(event: dict, club: dict) -> bool:
+        total_budget = sum(item["amount"] for item in event["budget"])
+
+        mail_subject = EVENT_BILL_REMINDER_SUBJECT.safe_substitute(
+            event_id=event["code"],
+            event=event["name"],
+        )
+        mail_body = EVENT_BILL_REMINDER_BODY.safe_substitute(
+            club=club["name"],
+            event=event["name"],
+            eventlink=getEventLink(event["code"]),
+            total_budget=total_budget,
+        )
+
+        return await triggerMail(
+            "events_autoemailing",
+            mail_subject,
+            mail_body,
+            toRecipients=[club["email"]],
+            ccRecipients=cc_emails,
+            cookies=bot_cookie,
+        )
+
+    return await sendReminders(
+        "check_for_bill_status", pending_bills, send, started
+    )
 
-            # Check if budget exists for the event
-            if event_instance.budget and len(event_instance.budget) > 0:
-                total_budget = sum(
-                    item.amount for item in event_instance.budget
-                )
 
-            # Prepare email
-            mail_subject = EVENT_BILL_REMINDER_SUBJECT.safe_substitute(
-                event_id=event_instance.code,
-                event=event_instance.name,
-            )
-
-            mail_body = EVENT_BILL_REMINDER_BODY.safe_substitute(
-                club=clubname,
-                event=event_instance.name,
-                eventlink=getEventLink(event_instance.code),
-                total_budget=total_budget,
-            )
-
-            await triggerMail(
-                "events_autoemailing",
-                mail_subject,
-                mail_body,
-                toRecipients=[mail_club],
-                ccRecipients=await getRoleEmails("cc"),
-                cookies=bot_cookie,
-            )
-
-        except Exception as e:
-            print(
-                f"Error sending reminder for event {event_instance.code}: {e}"
-            )
-
-
-async def check_for_ended_events():
+async def check_for_ended_events() -> dict:
     """
     Checks for events that have ended on the last day and sends reminder emails.
     This function is meant to be run on a schedule.
 
-    Args:
-    None
-
     Returns:
-    None
+        (dict): The summary of the run.
     """  # noqa: E501
+    started = time.monotonic()
+
     current_time = datetime.now(timezone)
     one_day_ago = current_time - timedelta(days=1)
 
     # find events that ended today
     ended_events = await eventsdb.find(
         {
-            "datetimeperiod.1": {
-                "$gte": one_day_ago.isoformat(),
-                "$lte": current_time.isoformat(),
+            "end_at": {
+                "$gte": one_day_ago,
+                "$lte": current_time,
             },
             "status.state": Event_State_Status.approved.value,
             "event_report_submitted": {"$ne": True},
-        }
+        },
+        REMINDER_PROJECTION,
     ).to_list(length=None)
 
     if len(ended_events) == 0:
-        # print("No ended events found")
-        return
+        return {"sent": 0, "failed": 0, "skipped": 0, "duration": 0}
 
     bot_cookie = await get_bot_cookie()
 
-    for event in ended_events:
-        event_instance = Event.model_validate(event)
-
-        try:
-            clubDetails = await getClubDetails(event_instance.clubid, None)
-
-            if len(clubDetails.keys()) == 0:
-                print(f"Club does not exist for event {event_instance.code}")
-                continue
-
-            mail_club = clubDetails["email"]
-            clubname = clubDetails["name"]
-
-            # Prepare email
-            mail_subject = EVENT_REPORT_REMINDER_SUBJECT.safe_substitute(
-                event_id=event_instance.code,
-                event=event_instance.name,
-            )
-
-            mail_body = EVENT_REPORT_REMINDER_BODY.safe_substitute(
-                club=clubname,
-                event=event_instance.name,
-                eventlink=getEventLink(event_instance.code),
-            )
-
-            await triggerMail(
-                "events_autoemailing",
-                mail_subject,
-                mail_body,
-                toRecipients=[mail_club],
-                cookies=bot_cookie,
-            )
-
-        except Exception as e:
-            print(
-                f"Error sending reminder for event {event_instance.code}: {e}"
-            )
+    async def send(event: dict, club: dict) -> bool:
+        mail_subject = EVENT_REPORT_REMINDER_SUBJECT.safe_substitute(
+            event_id=event["code"],
+            event=event["name"],
+        )
+        mail_body = EVENT_REPORT_REMINDER_BODY.safe_substitute(
+            club=club["name"],
+            event=event["name"],
+            eventlink=getEventLink(event["code"]),
+        )
+
+        return await triggerMail(
+            "events_autoemailing",
+            mail_subject,
+            mail_body,
+            toRecipients=[club["email"]],
+            cookies=bot_cookie,
+        )
+
+    return await sendReminders(
+        "check_for_ended_events", ended_events, send, started
+    )
 
 
 def init_event_reminder_system():
     """
     Initializes the event reminder system using AsyncIOScheduler.
+
+    Every instance schedules the jobs, each firing runs on the instance
+    holding the job's lease, see scheduling.py.
     """
     scheduler = AsyncIOScheduler(timezone=timezone)
-    scheduler.add_job(check_for_ended_events, "cron", hour=0, minute=0)
-    scheduler.add_job(
-        check_for_bill_status, "cron", day_of_week="sun", hour=12, minute=0
+    addLeasedJob(
+        scheduler,
+        "check_for_ended_events",
+        check_for_ended_events,
+        CronTrigger(hour=0, minute=0, timezone=timezone),
+    )
+    addLeasedJob(
+        scheduler,
+        "check_for_bill_status",
+        check_for_bill_status,
+        CronTrigger(day_of_week="sun", hour=12, minute=0, timezone=timezone),
     )
     scheduler.start()
+    startCatchUp()
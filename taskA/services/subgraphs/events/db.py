@@ -20,11 +20,37 @@ Attributes:
                                             holidays.
     event_reportsdb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
                                                 event reports.
+    countersdb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
+                                            event code counters.
+    occupancydb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
+                                            room occupancy of approved events.
+    scheduler_locksdb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
+                                            leases of the scheduled jobs.
+    scheduler_runsdb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
+                                            run history of the scheduled jobs.
+    mail_outboxdb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
+                                            mails queued by the mutations.
+    cache_versionsdb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
+                                            versions of the response caches.
+    response_cachedb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
+                                            shared response cache entries.
+    cache_invalidationsdb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
+                                            versions of the collections polled
+                                            by the invalidation bus.
+    migrationsdb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
+                                            runs and checkpoints of the data
+                                            migrations.
+    finance_rollupsdb (pymongo.asynchronous.collection.AsyncCollection): MongoDB collection for
+                                            finance totals per club and fiscal
+                                            year.
+    INDEXES (Dict[str, List[pymongo.IndexModel]]): declared indexes per
+                                                   collection.
 """
 
 from os import getenv
+from typing import Any, Dict, List, Tuple
 
-from pymongo import AsyncMongoClient
+from pymongo import AsyncMongoClient, IndexModel
 
 # get mongodb URI and database name from environment variable
 MONGO_URI = "mongodb://{}:{}@mongo:{}/".format(
@@ -42,43 +68,210 @@ db = client[MONGO_DATABASE]
 eventsdb = db.events
 holidaysdb = db.holidays
 event_reportsdb = db.event_reports
+countersdb = db.counters
+occupancydb = db.occupancy
+scheduler_locksdb = db.scheduler_locks
+scheduler_runsdb = db.scheduler_runs
+mail_outboxdb = db.mail_outbox
+cache_versionsdb = db.cache_versions
+response_cachedb = db.response_cache
+cache_invalidationsdb = db.cache_invalidations
+migrationsdb = db.migrations
+finance_rollupsdb = db.finance_rollups
 
 
-async def create_index() -> None:
+# declared indexes per collection, built on startup by create_index
+INDEXES: Dict[str, List[IndexModel]] = {
+    "events": [
+        IndexModel([("code", 1)], unique=True, name="unique_event_code"),
+        # ongoing/upcoming events, pendingEvents, clashingEvents and
+        # availableRooms filter on the state and the start time
+        IndexModel(
+            [("status.state", 1), ("start_at", 1)],
+            name="events_state_start",
+        ),
+        # past events, allEventsBills and auto_reminders filter on the state
+        # and the end time
+        IndexModel(
+            [("status.state", 1), ("end_at", -1)],
+            name="events_state_end",
+        ),
+        # keyset pagination of the events feed
+        IndexModel(
+            [("end_at", -1), ("_id", -1)],
+            name="events_end_time_id",
+        ),
+        # the clubid/collabclubs $or of a club's events
+        IndexModel(
+            [("clubid", 1), ("status.state", 1), ("start_at", 1)],
+            name="events_club_state_start",
+        ),
+        IndexModel(
+            [("collabclubs", 1), ("status.state", 1), ("start_at", 1)],
+            name="events_collabclubs_state_start",
+        ),
+        # location is an array, the dates are not, so they can share a
+        # compound index
+        IndexModel(
+            [("location", 1), ("status.state", 1), ("start_at", 1)],
+            name="events_location_state_start",
+        ),
+        # prefix search on the words of the event names
+        IndexModel([("search_terms", 1)], name="events_search_terms"),
+        # bill reminders of auto_reminders
+        IndexModel(
+            [("bills_status.state", 1), ("end_at", -1)],
+            name="events_bills_state_end",
+        ),
+    ],
+    "holidays": [
+        IndexModel([("date", 1)], unique=True, name="one_holiday_on_day"),
+    ],
+    "event_reports": [
+        IndexModel([("event_id", 1)], unique=True, name="unique_event_id"),
+    ],
+    "occupancy": [
+        # availableRooms and clashingEvents, a range scan per room
+        IndexModel(
+            [("room", 1), ("start", 1), ("end", 1)],
+            name="occupancy_room_interval",
+        ),
+        IndexModel([("eventid", 1)], name="occupancy_eventid"),
+    ],
+    "scheduler_locks": [
+        # a lease left behind by a crashed instance is removed once expired
+        IndexModel(
+            [("expires_at", 1)],
+            expireAfterSeconds=0,
+            name="scheduler_locks_expiry",
+        ),
+    ],
+    "scheduler_runs": [
+        IndexModel(
+            [("job", 1), ("scheduled_for", -1)],
+            name="scheduler_runs_job_scheduled",
+        ),
+        # run history is kept for 90 days
+        IndexModel(
+            [("started_at", 1)],
+            expireAfterSeconds=90 * 24 * 60 * 60,
+            name="scheduler_runs_expiry",
+        ),
+    ],
+    "mail_outbox": [
+        # mails due for a (re)try, and mails whose sender stopped
+        IndexModel(
+            [("status", 1), ("next_attempt_at", 1)],
+            name="mail_outbox_status_due",
+        ),
+        IndexModel(
+            [("status", 1), ("locked_until", 1)],
+            name="mail_outbox_status_locked",
+        ),
+        # the idempotency key of a mail is released once the window after
+        # it is queued is over, see outbox.enqueueMail
+        IndexModel(
+            [("dedupe_key", 1)],
+            unique=True,
+            partialFilterExpression={"dedupe_key": {"$exists": True}},
+            name="mail_outbox_dedupe_key",
+        ),
+        # sent mails are kept a week, dead letters until removed by hand
+        IndexModel(
+            [("sent_at", 1)],
+            expireAfterSeconds=7 * 24 * 60 * 60,
+            name="mail_outbox_sent_expiry",
+        ),
+    ],
+    "finance_rollups": [
+        # the rollups of a club, latest fiscal year first
+        IndexModel(
+            [("clubid", 1), ("fiscal_year", -1)],
+            name="finance_rollups_club_year",
+        ),
+    ],
+    "response_cache": [
+        # shared entries are dropped once they expire
+        IndexModel(
+            [("expires_at", 1)],
+            expireAfterSeconds=0,
+            name="response_cache_expiry",
+        ),
+    ],
+}
+
+
+def _index_key(key) -> List[Tuple[str, Any]]:
+    # live keys may come back as a list of pairs with float directions
+    pairs = key.items() if isinstance(key, dict) else key
+    return [
+        (field, int(value) if isinstance(value, (int, float)) else value)
+        for field, value in pairs
+    ]
+
+
+async def diff_indexes() -> Dict[str, Dict[str, List[str]]]:
+    """
+    Compares the declared indexes with the live indexes of each collection.
+
+    Returns:
+        (Dict[str, Dict[str, List[str]]]): per collection, the names of the
+            indexes that are missing, undeclared (present only in the
+            database) and changed (same name but different keys/options).
     """
-    Create MongoDB indexes for events-related collections
-    if they don't already exist.
+    report = {}
+    for collection, models in INDEXES.items():
+        live = await db[collection].index_information()
+        declared = {model.document["name"]: model.document for model in models}
 
-    This function creates the following indexes:
+        missing, changed = [], []
+        for name, spec in declared.items():
+            if name not in live:
+                missing.append(name)
+                continue
+            same_key = _index_key(spec["key"]) == _index_key(live[name]["key"])
+            same_unique = bool(spec.get("unique")) == bool(
+                live[name].get("unique")
+            )
+            if not (same_key and same_unique):
+                changed.append(name)
+
+        undeclared = [
+            name for name in live if name != "_id_" and name not in declared
+        ]
+        report[collection] = {
+            "missing": missing,
+            "undeclared": undeclared,
+            "changed": changed,
+        }
+    return report
 
-    - 'one_holiday_on_day': A unique index on the 'date' field in the holidays
-        collection to ensure only one holiday can exist per day.
 
-    - 'unique_event_code': A unique index on the 'code' field in the events
-        collection to ensure event codes are unique.
+async def create_index() -> None:
+    """
+    Create the declared MongoDB indexes (see INDEXES) for events-related
+    collections if they don't already exist.
+
+    Existing indexes are matched by name and never dropped or rebuilt, use
+    scripts/indexes.py to find changed or undeclared ones. Each collection is
+    handled on its own, so a failure on one does not stop the others.
 
-    - 'unique_event_id': A unique index on the 'event_id' field in the
-        event_reports collection to ensure there's only one report per event
+    It is run as a background task on startup, the database builds indexes
+    without holding locks for the whole build, so requests are served while
+    a build is in progress.
 
     Returns:
         (None): This function does not return any value.
     """
-    try:
-        # check if the holidays index exists
-        if "one_holiday_on_day" not in (await holidaysdb.index_information()):
-            # create the index
-            await holidaysdb.create_index(
-                [("date", 1)], unique=True, name="one_holiday_on_day"
-            )
-        if "unique_event_code" not in (await eventsdb.index_information()):
-            await eventsdb.create_index(
-                [("code", 1)], unique=True, name="unique_event_code"
-            )
-        if "unique_event_id" not in (
-            await event_reportsdb.index_information()
-        ):
-            await event_reportsdb.create_index(
-                [("event_id", 1)], unique=True, name="unique_event_id"
-            )
-    except Exception:
-        pass
+    for collection, models in INDEXES.items():
+        try:
+            existing = await db[collection].index_information()
+            missing = [
+                model
+                for model in models
+                if model.document["name"] not in existing
+            ]
+            if missing:
+                await db[collection].create_indexes(missing)
+        except Exception as e:
+            print(f"Failed to create indexes on {collection}: {e}")
@@ -0,0 +1,393 @@
+"""
+Events Export Module.
+
+Builds the events CSV export shared by the downloadEventsData query and the
+streaming export route. Events are read from a cursor limited to the
+requested fields and written out a few rows at a time, so the memory used
+does not grow with the size of the export.
+
+Attributes:
+    HEADER_MAPPING (dict): CSV column names of the exportable fields.
+    CSV_CHUNK_ROWS (int): Number of rows written per streamed chunk.
+                          Defaults to 200.
+    JWT_SECRET (str | None): Secret of the session tokens issued to the
+                             clients, shared with the gateway.
+    router (fastapi.APIRouter): Router with the streaming export route.
+"""
+
+import csv
+import io
+import os
+from datetime import UTC, date, datetime, time
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import jwt
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from mtypes import (
+    Event_Full_Location,
+    Event_Full_State_Status,
+    Event_State_Status,
+)
+from otypes import InputDataReportDetails
+from utils import getClubs, iterEventsWithSorting
+
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "200"))
+JWT_SECRET = os.getenv("JWT_SECRET")
+
+HEADER_MAPPING = {
+    "code": "Event Code",
+    "name": "Event Name",
+    "clubid": "Club",
+    "datetimeperiod.0": "StartDate",
+    "datetimeperiod.1": "EndDate",
+    "description": "Description",
+    "audience": "Audience",
+    "population": "Audience Count",
+    "mode": "Mode",
+    "location": "Venue",
+    "budget": "Budget",
+    "poster": "Poster URL",
+    "status": "Status",
+    "equipment": "Equipment",
+    "additional": "Additional Requests",
+    "event_report_submitted": "Event Report Submitted",
+}
+
+# extra stored fields needed to render an exported field
+PROJECTION_MAPPING = {
+    "datetimeperiod.0": ["datetimeperiod"],
+    "datetimeperiod.1": ["datetimeperiod"],
+    "clubid": ["clubid", "collabclubs"],
+    "location": ["location", "otherLocation"],
+    "status": ["status.state"],
+}
+
+
+async def prepareEventsExport(
+    details: InputDataReportDetails, user: dict | None, cookies: dict | None
+) -> Tuple[dict | None, List[str], Dict[str, str]]:
+    """
+    Checks the export request and builds the search space of the events to
+    export.
+
+    CC and SLO cannot see deleted and incomplete events. Public can see only
+    approved events.
+
+    Args:
+        details (otypes.InputDataReportDetails): The details of the events
+                                                to be exported.
+        user (dict | None): The user requesting the export.
+        cookies (dict | None): The cookies of the user.
+
+    Returns:
+        (Tuple[dict | None, List[str], Dict[str, str]]): The search space,
+            None if no event is to be exported, the CSV column names and the
+            names of the clubs by cid.
+
+    Raises:
+        Exception: You do not have permission to access this resource.
+        Exception: Invalid status.
+    """
+    if user is None:
+        raise Exception("You do not have permission to access this resource.")
+
+    if details.status not in ["pending", "approved", "all"]:
+        raise Exception("Invalid status")
+
+    allclubs = await getClubs(cookies, user)
+    club_names = {club["cid"]: club["name"] for club in allclubs}
+
+    fieldnames = [
+        HEADER_MAPPING.get(field.lower(), field)
+        for field in details.fields
+        if field != "status"
+    ]
+    if details.status != "approved":
+        fieldnames.append(HEADER_MAPPING["status"])
+
+    if not details.clubid:
+        return None, fieldnames, club_names
+
+    searchspace: dict[str, Any] = {}
+
+    clubid = details.clubid
+    if details.clubid == "allclubs":
+        if user["role"] in ["cc", "slo"]:
+            clubid = None
+        else:
+            clubid = user["uid"]
+
+    if clubid is not None:
+        searchspace["$or"] = [
+            {"clubid": clubid},
+            {"collabclubs": {"$in": [clubid]}},
+        ]
+    else:
+        searchspace["clubid"] = {"$in": list(club_names.keys())}
+
+    # filter by date
+    if details.dateperiod:
+        datetime_start = datetime.combine(
+            details.dateperiod[0], time.min, tzinfo=UTC
+        )
+        datetime_end = datetime.combine(
+            details.dateperiod[1], time.max, tzinfo=UTC
+        )
+        searchspace["start_at"] = {
+            "$gte": datetime_start,
+            "$lte": datetime_end,
+        }
+
+    if user["role"] not in ["cc", "slo"] or details.status == "approved":
+        searchspace["status.state"] = {
+            "$in": [
+                Event_State_Status.approved.value,
+            ]
+        }
+    else:
+        to_exclude = [
+            Event_State_Status.incomplete.value,
+        ]
+        if details.status == "pending":
+            to_exclude.append(Event_State_Status.approved.value)
+        if user["role"] == "slo":
+            to_exclude.append(Event_State_Status.pending_cc.value)
+        else:
+            to_exclude.append(Event_State_Status.deleted.value)
+
+        searchspace["status.state"] = {
+            "$nin": to_exclude,
+        }
+
+    return searchspace, fieldnames, club_names
+
+
+def exportProjection(fields: List[str]) -> dict:
+    """
+    Builds the projection of the stored fields needed to export the given
+    fields.
+
+    Args:
+        fields (List[str]): The exported fields.
+
+    Returns:
+        (dict): The projection.
+    """
+    projection = {}
+    for field in fields:
+        if field.startswith("$"):
+            continue
+        for stored_field in PROJECTION_MAPPING.get(field, [field]):
+            projection[stored_field] = 1
+    return projection
+
+
+def exportRow(
+    event: dict,
+    fields: List[str],
+    fieldnames: List[str],
+    club_names: Dict[str, str],
+) -> dict:
+    """
+    Builds the CSV row of an event.
+
+    Args:
+        event (dict): The event.
+        fields (List[str]): The exported fields.
+        fieldnames (List[str]): The CSV column names.
+        club_names (Dict[str, str]): The names of the clubs by cid.
+
+    Returns:
+        (dict): The row, by column name.
+    """
+    event_data = {}
+    for field in fields:
+        mapped_field = HEADER_MAPPING.get(field, field)
+        if mapped_field not in fieldnames:
+            continue
+
+        value = event.get(field)
+
+        if field in ["datetimeperiod.0", "datetimeperiod.1"]:
+            value = event["datetimeperiod"]
+            value = (
+                value[0].split("T")[0]
+                if field == "datetimeperiod.0"
+                else value[1].split("T")[0]
+            )
+        elif field == "clubid":
+            value = club_names.get(value, None)
+
+            collab_clubs = event.get("collabclubs", [])
+            collab_club_names = [value] if value else []
+            for cid in collab_clubs:
+                club_name = club_names.get(cid, None)
+                if club_name:
+                    collab_club_names.append(club_name)
+            value = ", ".join(collab_club_names)
+        elif field == "location":
+            value = event.get(field, [])
+            if len(value) >= 1:
+                value = ", ".join(
+                    getattr(Event_Full_Location, loc)
+                    if loc != "other"
+                    else (event.get("otherLocation") or "other")
+                    for loc in value
+                )
+        elif field == "budget":
+            if isinstance(value, list):
+                budget_items = [
+                    f"{item['description']} {'(Advance)' if item['advance'] else ''}: {item['amount']}"  # noqa: E501
+                    for item in value
+                ]
+                value = ", ".join(budget_items)
+        elif field == "status":
+            status_value = event.get(field, {})
+            value = status_value.get("state", None)
+
+            if value:
+                value = getattr(Event_Full_State_Status, value)
+        elif field == "event_report_submitted":
+            if value is None:
+                value = "No Event Report Required"
+            else:
+                value = "Yes" if value else "No"
+
+        if value in [None, "", []]:
+            value = "No " + mapped_field
+
+        event_data[mapped_field] = value
+
+    return event_data
+
+
+async def iterEventsCSV(
+    searchspace: dict | None,
+    fields: List[str],
+    fieldnames: List[str],
+    club_names: Dict[str, str],
+) -> AsyncIterator[str]:
+    """
+    Streams the CSV export of the events matching the search space, most
+    recent first, in chunks of CSV_CHUNK_ROWS rows.
+
+    Args:
+        searchspace (dict | None): The search space, None for a header only
+                                   export.
+        fields (List[str]): The exported fields.
+        fieldnames (List[str]): The CSV column names.
+        club_names (Dict[str, str]): The names of the clubs by cid.
+
+    Yields:
+        (str): a chunk of the CSV file
+    """
+    buffer = io.StringIO()
+    csv_writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    csv_writer.writeheader()
+
+    if searchspace is not None:
+        rows = 0
+        async for event in iterEventsWithSorting(
+            searchspace, date_filter=True, projection=exportProjection(fields)
+        ):
+            csv_writer.writerow(
+                exportRow(event, fields, fieldnames, club_names)
+            )
+            rows += 1
+            if rows % CSV_CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+
+    yield buffer.getvalue()
+    buffer.close()
+
+
+def sessionUser(token: str | None) -> dict | None:
+    """
+    Verifies a session token, the HS256 JWT of the Authorization cookie
+    checked by the gateway for the GraphQL requests.
+
+    Args:
+        token (str | None): The token.
+
+    Returns:
+        (dict | None): The user of the token, None if it is missing, not
+                       signed with JWT_SECRET or expired.
+    """
+    if not token or not JWT_SECRET:
+        return None
+
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+
+
+router = APIRouter()
+
+
+@router.get("/export/events")
+async def exportEvents(
+    request: Request,
+    status: str,
+    fields: List[str] = Query(...),
+    clubid: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+) -> StreamingResponse:
+    """
+    Streams the events as a CSV file, same criteria and columns as the
+    downloadEventsData query.
+
+    The route is served to the clients directly, not through the gateway,
+    so the user and cookies headers are not trusted: the user is read from
+    the session token of the Authorization cookie, verified as the gateway
+    does.
+
+    Args:
+        request (fastapi.Request): The request.
+        status (str): Status of the events, pending, approved or all.
+        fields (List[str]): Fields of the events to export.
+        clubid (str | None): ID of the club, allclubs for all of them.
+                             Defaults to None.
+        start (date | None): First day of the events. Defaults to None.
+        end (date | None): Last day of the events. Defaults to None.
+
+    Returns:
+        (fastapi.responses.StreamingResponse): The CSV file.
+
+    Raises:
+        HTTPException: 401, Not authenticated.
+        HTTPException: 403, You do not have permission to access this
+                       resource.
+        HTTPException: 400, Invalid status.
+    """
+    user = sessionUser(request.cookies.get("Authorization"))
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    details = InputDataReportDetails(
+        clubid=clubid,
+        dateperiod=[start, end] if start and end else None,
+        fields=fields,
+        status=status,
+    )
+
+    try:
+        searchspace, fieldnames, club_names = await prepareEventsExport(
+            details, user, dict(request.cookies)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=400 if str(e) == "Invalid status" else 403,
+            detail=str(e),
+        )
+
+    return StreamingResponse(
+        iterEventsCSV(searchspace, fields, fieldnames, club_names),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="events.csv"'},
+    )
@@ -0,0 +1,282 @@
+"""
+Finance Rollups Module.
+
+Keeps the `finance_rollups` collection, one document per (club, fiscal
+year) with the totals of the approved events of the club starting in that
+fiscal year that have a budget or sponsors: the number of events, their
+total budget, amount used and sponsor amount, and the number of events per
+bills state. Finance summaries are a single read by _id instead of a scan
+of the events.
+
+Each event adds its contribution to the rollup of its club and fiscal year.
+The mutations that can change one (progressEvent, editEvent, deleteEvent,
+addBill, updateBillsStatus) compute the contribution of the event before
+and after their write and call syncFinanceRollups, which applies the
+difference with $inc. updateEventsCid moves whole clubs and rebuilds their
+rollups. scripts/rollups.py rebuilds the whole collection and
+checks it against the events.
+
+Attributes:
+    ROLLUP_FIELDS (List[str]): summed fields of a rollup, besides the bills
+                               state counts.
+"""
+
+from datetime import UTC, datetime
+from typing import Dict, Iterable, List
+
+from pymongo import DeleteMany, ReplaceOne
+
+from db import eventsdb, finance_rollupsdb
+from mtypes import Event_State_Status, timezone
+from utils import FISCAL_START_MONTH, toUTCDatetime
+
+ROLLUP_FIELDS = ["events", "budget", "amount_used", "sponsor"]
+
+# stored fields of an event needed for its contribution
+CONTRIBUTION_PROJECTION = {
+    "clubid": 1,
+    "status.state": 1,
+    "start_at": 1,
+    "datetimeperiod": 1,
+    "budget": 1,
+    "sponsor": 1,
+    "bills_status.state": 1,
+}
+
+
+def fiscalYear(time: str | datetime) -> int:
+    """
+    Fiscal year of a time, April to March in IST, named by the year in which
+    it starts.
+
+    Args:
+        time (str | datetime): the time, see toUTCDatetime
+
+    Returns:
+        (int): the fiscal year
+    """
+    local = toUTCDatetime(time).astimezone(timezone)
+    return local.year - (1 if local.month < FISCAL_START_MONTH else 0)
+
+
+def rollupId(clubid: str, fiscal_year: int) -> str:
+    """
+    _id of the rollup of a club and fiscal year.
+    """
+    return f"{clubid}:{fiscal_year}"
+
+
+def financeContribution(event: dict | None) -> dict | None:
+    """
+    Contribution of an event to the rollup of its club and fiscal year.
+
+    Args:
+        event (dict | None): the event, with at least the fields of
+                             CONTRIBUTION_PROJECTION
+
+    Returns:
+        (dict | None): the _id, clubid and fiscal_year of the rollup and the
+                       values to add to it, None if the event does not count
+    """
+    if event is None:
+        return None
+    if event["status"]["state"] != Event_State_Status.approved.value:
+        return None
+    budget = event.get("budget") or []
+    sponsor = event.get("sponsor") or []
+    if not budget and not sponsor:
+        return None
+
+    start = event.get("start_at") or event["datetimeperiod"][0]
+    fiscal_year = fiscalYear(start)
+    values = {
+        "events": 1,
+        "budget": sum(item.get("amount") or 0 for item in budget),
+        "amount_used": sum(item.get("amount_used") or 0 for item in budget),
+        "sponsor": sum(item.get("amount") or 0 for item in sponsor),
+    }
+    state = (event.get("bills_status") or {}).get("state")
+    if state is not None:
+        values[f"bills.{state}"] = 1
+
+    return {
+        "_id": rollupId(event["clubid"], fiscal_year),
+        "clubid": event["clubid"],
+        "fiscal_year": fiscal_year,
+        "values": values,
+    }
+
+
+def _deltas(before: dict | None, after: dict | None) -> Dict[str, dict]:
+    deltas: Dict[str, dict] = {}
+    for contribution, sign in ((before, -1), (after, 1)):
+        if contribution is None:
+            continue
+        delta = deltas.setdefault(
+            contribution["_id"],
+            {
+                "clubid": contribution["clubid"],
+                "fiscal_year": contribution["fiscal_year"],
+                "values": {},
+            },
+        )
+        for field, value in contribution["values"].items():
+            delta["values"][field] = (
+                delta["values"].get(field, 0) + sign * value
+            )
+    return deltas
+
+
+async def syncFinanceRollups(before: dict | None, after: dict | None) -> None:
+    """
+    Applies the change of the contribution of an event to the rollups.
+
+    Errors are logged and swallowed, the mutation that changed the event has
+    already succeeded; a rebuild fixes any drift.
+
+    Args:
+        before (dict | None): contribution of the event before the write,
+                              see financeContribution
+        after (dict | None): contribution of the event after the write
+    """
+    try:
+        for _id, delta in _deltas(before, after).items():
+            values = {
+                field: value
+                for field, value in delta["values"].items()
+                if value != 0
+            }
+            if not values:
+                continue
+            await finance_rollupsdb.update_one(
+                {"_id": _id},
+                {
+                    "$inc": values,
+                    "$set": {"updated_at": datetime.now(UTC)},
+                    "$setOnInsert": {
+                        "clubid": delta["clubid"],
+                        "fiscal_year": delta["fiscal_year"],
+                    },
+                },
+                upsert=True,
+            )
+    except Exception as e:
+        print(f"Error syncing finance rollups: {e}")
+
+
+async def computeFinanceRollups(
+    clubids: Iterable[str] | None = None,
+) -> Dict[str, dict]:
+    """
+    Computes the rollups from the events.
+
+    Args:
+        clubids (Iterable[str] | None): only the rollups of these clubs.
+                                        Defaults to None, all clubs.
+
+    Returns:
+        (Dict[str, dict]): the rollup documents by _id
+    """
+    searchspace: dict = {"status.state": Event_State_Status.approved.value}
+    if clubids is not None:
+        searchspace["clubid"] = {"$in": list(clubids)}
+
+    rollups: Dict[str, dict] = {}
+    async for event in eventsdb.find(searchspace, CONTRIBUTION_PROJECTION):
+        contribution = financeContribution(event)
+        if contribution is None:
+            continue
+        rollup = rollups.setdefault(
+            contribution["_id"],
+            {
+                "_id": contribution["_id"],
+                "clubid": contribution["clubid"],
+                "fiscal_year": contribution["fiscal_year"],
+                **{field: 0 for field in ROLLUP_FIELDS},
+                "bills": {},
+            },
+        )
+        for field, value in contribution["values"].items():
+            if field.startswith("bills."):
+                state = field.removeprefix("bills.")
+                rollup["bills"][state] = rollup["bills"].get(state, 0) + value
+            else:
+                rollup[field] += value
+    return rollups
+
+
+async def rebuildFinanceRollups(clubids: Iterable[str] | None = None) -> int:
+    """
+    Replaces the rollups with the ones computed from the events, stale ones
+    are dropped.
+
+    Args:
+        clubids (Iterable[str] | None): only the rollups of these clubs.
+                                        Defaults to None, all clubs.
+
+    Returns:
+        (int): number of rollups written
+    """
+    if clubids is not None:
+        clubids = list(clubids)
+    rollups = await computeFinanceRollups(clubids)
+
+    now = datetime.now(UTC)
+    stale: dict = {"_id": {"$nin": list(rollups)}}
+    if clubids is not None:
+        stale["clubid"] = {"$in": clubids}
+    await finance_rollupsdb.bulk_write(
+        [
+            ReplaceOne(
+                {"_id": _id}, {**rollup, "updated_at": now}, upsert=True
+            )
+            for _id, rollup in rollups.items()
+        ]
+        + [DeleteMany(stale)],
+        ordered=True,
+    )
+    return len(rollups)
+
+
+async def checkFinanceRollups(tolerance: float = 0.01) -> List[dict]:
+    """
+    Compares the stored rollups with the ones computed from the events.
+
+    Args:
+        tolerance (float): largest difference of amounts taken as equal, the
+                           stored ones are sums of float deltas.
+
+    Returns:
+        (List[dict]): the _id, stored and expected values of every rollup
+                      that differs, missing or stale ones included
+    """
+    expected = await computeFinanceRollups()
+    stored = {
+        rollup["_id"]: rollup async for rollup in finance_rollupsdb.find({})
+    }
+
+    mismatches = []
+    for _id in sorted(set(expected) | set(stored)):
+        want = expected.get(_id)
+        have = stored.get(_id)
+        if want is not None and have is not None:
+            same_totals = all(
+                abs((have.get(field) or 0) - want[field]) <= tolerance
+                for field in ROLLUP_FIELDS
+            )
+            have_bills = {
+                state: count
+                for state, count in (have.get("bills") or {}).items()
+                if count
+            }
+            if same_totals and have_bills == want["bills"]:
+                continue
+        elif (
+            have is not None
+            and not any(have.get(field) for field in ROLLUP_FIELDS)
+            and not any((have.get("bills") or {}).values())
+        ):
+            # emptied by the deltas
+            continue
+        mismatches.append({"_id": _id, "stored": have, "expected": want})
+    return mismatches
@@ -0,0 +1,156 @@
+"""
+Inter-service HTTP Client Module.
+
+This module holds the process-wide pooled `httpx.AsyncClient` used for all
+calls from the events subgraph to the gateway and the other internal
+services. The client is opened in the FastAPI lifespan (see `main.py`) and
+reused by every request, so GraphQL hops to the gateway share keep-alive
+connections instead of paying TCP setup and teardown on each call.
+
+Cookies are never stored on the shared client; they are injected per request
+as a `Cookie` header, so one user's cookies can never leak into another
+user's request.
+
+Attributes:
+    GATEWAY_URL (str): URL of the GraphQL gateway.
+    HTTP_MAX_CONNECTIONS (int): Maximum number of concurrent connections in
+                                the pool. Defaults to 100.
+    HTTP_MAX_KEEPALIVE_CONNECTIONS (int): Maximum number of idle keep-alive
+                                          connections. Defaults to 20.
+    HTTP_KEEPALIVE_EXPIRY (float): Seconds an idle connection is kept alive.
+                                   Defaults to 30.
+    HTTP_TIMEOUT (float): Default timeout in seconds for a single call.
+                          Defaults to 10.
+    HTTP2 (bool): Whether to negotiate HTTP/2. Defaults to False.
+"""
+
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from os import getenv
+
+from httpx import AsyncClient, Limits, Response, Timeout
+
+GATEWAY_URL = getenv("GATEWAY_URL", "http://gateway/graphql")
+
+HTTP_MAX_CONNECTIONS = int(getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+HTTP_KEEPALIVE_EXPIRY = float(getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(getenv("HTTP_TIMEOUT", "10"))
+HTTP2 = getenv("HTTP2", "False").lower() in ("true", "1", "t")
+
+_client: AsyncClient | None = None
+
+
+def _new_client() -> AsyncClient:
+    return AsyncClient(
+        limits=Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=Timeout(HTTP_TIMEOUT),
+        http2=HTTP2,
+        # reject every Set-Cookie, the shared client must stay stateless
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+    )
+
+
+async def init_http_client() -> None:
+    """
+    Opens the shared client, called on application startup.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _new_client()
+
+
+async def close_http_client() -> None:
+    """
+    Closes the shared client and its pooled connections, called on
+    application shutdown.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> AsyncClient:
+    """
+    Returns the shared client, opening it lazily when used outside of the
+    FastAPI lifespan (e.g. from scripts).
+
+    Returns:
+        (httpx.AsyncClient): the pooled client.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _new_client()
+    return _client
+
+
+def _cookie_header(cookies: dict | None) -> dict:
+    if not cookies:
+        return {}
+    return {
+        "Cookie": "; ".join(f"{key}={value}" for key, value in cookies.items())
+    }
+
+
+async def post(
+    url: str,
+    cookies: dict | None = None,
+    timeout: float | None = None,
+    **kwargs,
+) -> Response:
+    """
+    Makes a POST request through the shared client.
+
+    Args:
+        url (str): URL to post to.
+        cookies (dict | None): cookies to send with this request only.
+                               Defaults to None.
+        timeout (float | None): timeout in seconds for this call. Defaults
+                                to HTTP_TIMEOUT.
+        **kwargs: passed on to `httpx.AsyncClient.post`.
+
+    Returns:
+        (httpx.Response): response of the request.
+    """
+    headers = {**kwargs.pop("headers", {}), **_cookie_header(cookies)}
+    return await get_http_client().post(
+        url,
+        headers=headers,
+        timeout=timeout if timeout is not None else HTTP_TIMEOUT,
+        **kwargs,
+    )
+
+
+async def gateway_request(
+    query: str,
+    variables: dict | None = None,
+    cookies: dict | None = None,
+    timeout: float | None = None,
+) -> dict:
+    """
+    Sends a GraphQL operation to the gateway through the shared client.
+
+    Args:
+        query (str): the GraphQL document.
+        variables (dict | None): the operation variables. Defaults to None.
+        cookies (dict | None): cookies to send with this request only.
+                               Defaults to None.
+        timeout (float | None): timeout in seconds for this call. Defaults
+                                to HTTP_TIMEOUT.
+
+    Returns:
+        (dict): decoded JSON body of the response.
+    """
+    payload: dict = {"query": query}
+    if variables is not None:
+        payload["variables"] = variables
+    response = await post(
+        GATEWAY_URL, cookies=cookies, timeout=timeout, json=payload
+    )
+    return response.json()
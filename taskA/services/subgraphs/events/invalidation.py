@@ -0,0 +1,176 @@
+"""
+Cache Invalidation Bus Module.
+
+In-process caches subscribe to the collections they are built from and are
+notified whenever one of them changes, whatever the process or service that
+changed it, so every worker and replica drops stale entries together.
+
+The bus follows a change stream over the subscribed collections of the
+database shared by the subgraphs. The stream is resumed from the last token
+it returned after an error, so no change is missed while it reconnects; if
+the token can not be resumed anymore every subscriber is notified, as any
+change may have been lost. The token is kept in the process only, the
+caches of a new process start empty.
+
+Change streams need a replica set. On a standalone server the bus polls the
+`cache_invalidations` collection instead, a version per collection bumped
+by publish. Writers publish after their writes in both modes, so a
+deployment can move between the two.
+
+Attributes:
+    INVALIDATION_POLL_INTERVAL (float): Seconds between two polls of the
+                                        fallback. Defaults to 2.
+    INVALIDATION_RETRY_INTERVAL (float): Seconds before a failed stream is
+                                         opened again. Defaults to 5.
+    invalidation_bus (InvalidationBus): The bus of this process.
+"""
+
+import asyncio
+import inspect
+import os
+from typing import Any, Awaitable, Callable, Dict, List
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from db import cache_invalidationsdb, db
+
+INVALIDATION_POLL_INTERVAL = float(
+    os.getenv("INVALIDATION_POLL_INTERVAL", "2")
+)
+INVALIDATION_RETRY_INTERVAL = float(
+    os.getenv("INVALIDATION_RETRY_INTERVAL", "5")
+)
+
+# change streams are not supported by standalone servers
+CHANGE_STREAMS_UNSUPPORTED = {40573}
+# the resume token is no longer in the oplog
+RESUME_TOKEN_LOST = {260, 280, 286}
+
+Subscriber = Callable[[str], Awaitable[Any] | Any]
+
+
+class InvalidationBus:
+    """
+    Notifies the subscribers of a collection when it changes.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+        self._resume_token: dict | None = None
+        self.mode: str | None = None
+
+    def subscribe(self, collection: str, callback: Subscriber) -> None:
+        """
+        Registers a callback run with the name of the collection whenever it
+        changes.
+
+        Args:
+            collection (str): name of the collection.
+            callback (Callable[[str], Awaitable[Any] | Any]): the callback,
+                                                               sync or async.
+        """
+        self._subscribers.setdefault(collection, []).append(callback)
+
+    async def publish(self, collection: str) -> None:
+        """
+        Records a change of the collection for the processes polling it,
+        called by the writers after their write.
+
+        Args:
+            collection (str): name of the collection.
+        """
+        try:
+            await cache_invalidationsdb.update_one(
+                {"_id": collection}, {"$inc": {"version": 1}}, upsert=True
+            )
+        except Exception as e:
+            # the write is done, pollers catch up on the next publish
+            print(f"Could not publish the invalidation of {collection}: {e}")
+
+    async def notify(self, collection: str) -> None:
+        """
+        Runs the subscribers of the collection, a failing subscriber does
+        not stop the others.
+
+        Args:
+            collection (str): name of the collection.
+        """
+        for callback in self._subscribers.get(collection, []):
+            try:
+                result = callback(collection)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"Invalidation of {collection} failed: {e}")
+
+    async def notifyAll(self) -> None:
+        """
+        Runs the subscribers of every collection.
+        """
+        for collection in list(self._subscribers):
+            await self.notify(collection)
+
+    async def run(self) -> None:
+        """
+        Follows the changes until cancelled, with the change stream if the
+        server supports it and by polling otherwise.
+        """
+        if not self._subscribers:
+            return
+
+        while True:
+            try:
+                await self._watch()
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    break
+                if e.code in RESUME_TOKEN_LOST:
+                    self._resume_token = None
+                    await self.notifyAll()
+                else:
+                    print(f"Invalidation stream failed: {e}")
+            except PyMongoError as e:
+                print(f"Invalidation stream failed: {e}")
+            await asyncio.sleep(INVALIDATION_RETRY_INTERVAL)
+
+        await self._poll()
+
+    async def _watch(self) -> None:
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": list(self._subscribers)}}},
+            {"$project": {"ns": 1}},
+        ]
+        async with await db.watch(
+            pipeline, resume_after=self._resume_token
+        ) as stream:
+            self.mode = "stream"
+            while stream.alive:
+                change = await stream.try_next()
+                # the token also moves while there are no changes
+                self._resume_token = stream.resume_token
+                if change is not None:
+                    await self.notify(change["ns"]["coll"])
+
+    async def _poll(self) -> None:
+        self.mode = "poll"
+        collections = list(self._subscribers)
+        versions: Dict[str, int] | None = None
+        while True:
+            try:
+                current = {
+                    document["_id"]: document["version"]
+                    async for document in cache_invalidationsdb.find(
+                        {"_id": {"$in": collections}}
+                    )
+                }
+                if versions is not None:
+                    for collection in collections:
+                        if current.get(collection) != versions.get(collection):
+                            await self.notify(collection)
+                versions = current
+            except PyMongoError as e:
+                print(f"Invalidation poll failed: {e}")
+            await asyncio.sleep(INVALIDATION_POLL_INTERVAL)
+
+
+invalidation_bus = InvalidationBus()
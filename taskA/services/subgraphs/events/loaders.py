@@ -0,0 +1,215 @@
+"""
+Request Loaders Module.
+
+DataLoaders batching and deduplicating the lookups of users, members and
+clubs made while resolving one GraphQL operation. They are created per
+request on first use, see `otypes.Context.loaders`, so nothing is shared
+between users and the results live only as long as the request.
+
+All the keys requested in the same tick are fetched with a single gateway
+request: users through `usersByList`, clubs from the club directory
+(`allClubs`) with the clubs it does not list queried together, and members
+through aliased `member` fields of one document. `member` and `club` are
+non-null fields, a key that does not exist nulls the data of the whole
+document, so a batch answered with errors is fetched again one key at a
+time.
+
+Each loader counts the loads it served, how many were cache hits, and the
+upstream requests and keys it fetched; the counts are returned in the
+`extensions` of the response in debug mode.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from strawberry.dataloader import DataLoader
+from strawberry.extensions import SchemaExtension
+
+from httpclient import gateway_request
+from utils import club_directory, getClubDetails, getMember
+
+
+class CountingDataLoader(DataLoader):
+    """
+    DataLoader keeping statistics of its loads and upstream fetches.
+    """
+
+    def __init__(
+        self,
+        load_fn: Callable[[List[Any]], Awaitable[Sequence[Any]]],
+        stats: Dict[str, int],
+        **kwargs,
+    ):
+        self.stats = stats
+
+        async def counted_load_fn(keys: List[Any]) -> Sequence[Any]:
+            self.stats["batches"] += 1
+            self.stats["keys"] += len(keys)
+            return await load_fn(keys)
+
+        super().__init__(counted_load_fn, **kwargs)
+
+    def load(self, key: Any) -> Awaitable[Any]:
+        self.stats["loads"] += 1
+        if self.cache and self.cache_map.get(key) is not None:
+            self.stats["hits"] += 1
+        return super().load(key)
+
+
+def _aliasedQuery(
+    name: str, field: str, input_type: str, selection: str, count: int
+) -> str:
+    variables = ", ".join(f"$k{i}: {input_type}!" for i in range(count))
+    fields = "\n".join(
+        f"k{i}: {field}({name}: $k{i}) {{ {selection} }}" for i in range(count)
+    )
+    return f"query ({variables}) {{\n{fields}\n}}"
+
+
+class Loaders:
+    """
+    The loaders of a request.
+
+    Attributes:
+        user (CountingDataLoader): (userProfile, userMeta) by uid, None for
+                                   unknown users, as utils.getUser.
+        member (CountingDataLoader): member by (cid, uid), None if not a
+                                     member, as utils.getMember.
+        club (CountingDataLoader): club details by cid, empty for unknown
+                                   clubs, as utils.getClubDetails.
+        stats (Dict[str, Dict[str, int]]): statistics by loader.
+    """
+
+    def __init__(self, cookies: dict | None = None):
+        self.cookies = cookies
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.user = self._loader("user", self._loadUsers)
+        self.member = self._loader("member", self._loadMembers)
+        self.club = self._loader("club", self._loadClubs)
+
+    def _loader(self, name: str, load_fn) -> CountingDataLoader:
+        self.stats[name] = {"loads": 0, "hits": 0, "batches": 0, "keys": 0}
+        return CountingDataLoader(load_fn, self.stats[name])
+
+    async def _loadUsers(
+        self, uids: List[str]
+    ) -> List[Tuple[dict, dict] | None]:
+        # profiles come in bulk from usersByList, the phones of each user
+        # from aliased userMeta fields of the same request
+        variables = ", ".join(f"$k{i}: UserInput!" for i in range(len(uids)))
+        metas = "\n".join(
+            f"k{i}: userMeta(userInput: $k{i}) {{ phone }}"
+            for i in range(len(uids))
+        )
+        query = f"""
+            query UsersByList($userInputs: [UserInput!]!, {variables}) {{
+                usersByList(userInputs: $userInputs) {{
+                    firstName
+                    lastName
+                    email
+                    rollno
+                }}
+                {metas}
+            }}
+        """
+        userInputs = [{"uid": uid} for uid in uids]
+        try:
+            response = await gateway_request(
+                query,
+                {
+                    "userInputs": userInputs,
+                    **{f"k{i}": user for i, user in enumerate(userInputs)},
+                },
+                cookies=self.cookies,
+            )
+            data = response["data"]
+            profiles = data["usersByList"]
+        except Exception:
+            return [None] * len(uids)
+
+        return [
+            (profile, data.get(f"k{i}")) if profile else None
+            for i, profile in enumerate(profiles)
+        ]
+
+    async def _loadMembers(
+        self, keys: List[Tuple[str, str]]
+    ) -> List[dict | None]:
+        query = _aliasedQuery(
+            "memberInput",
+            "member",
+            "SimpleMemberInput",
+            "_id cid poc uid",
+            len(keys),
+        )
+        variables = {
+            f"k{i}": {"cid": cid, "uid": uid, "rid": None}
+            for i, (cid, uid) in enumerate(keys)
+        }
+        try:
+            response = await gateway_request(
+                query, variables, cookies=self.cookies
+            )
+        except Exception:
+            return [None] * len(keys)
+        if response.get("errors") and len(keys) > 1:
+            # one of them is not a member, the others may be
+            return list(
+                await asyncio.gather(
+                    *(getMember(cid, uid, self.cookies) for cid, uid in keys)
+                )
+            )
+        data = response.get("data") or {}
+        return [data.get(f"k{i}") for i in range(len(keys))]
+
+    async def _loadClubs(self, cids: List[str]) -> List[dict]:
+        # active clubs are in the directory, others (e.g. deleted clubs)
+        # are queried together
+        directory = await club_directory.get()
+        clubs = {cid: dict(directory[cid]) for cid in cids if cid in directory}
+
+        missing = [cid for cid in cids if cid not in clubs]
+        if missing:
+            query = _aliasedQuery(
+                "clubInput",
+                "club",
+                "SimpleClubInput",
+                "cid name email category",
+                len(missing),
+            )
+            variables = {
+                f"k{i}": {"cid": cid} for i, cid in enumerate(missing)
+            }
+            try:
+                response = await gateway_request(
+                    query, variables, cookies=self.cookies
+                )
+            except Exception:
+                response = {}
+            if response.get("errors") and len(missing) > 1:
+                # one of them does not exist, the others may
+                details = await asyncio.gather(
+                    *(getClubDetails(cid, self.cookies) for cid in missing)
+                )
+            else:
+                data = response.get("data") or {}
+                details = [data.get(f"k{i}") for i in range(len(missing))]
+            for cid, club in zip(missing, details):
+                clubs[cid] = club or {}
+
+        return [clubs[cid] for cid in cids]
+
+
+class LoaderStatsExtension(SchemaExtension):
+    """
+    Adds the statistics of the loaders used by the operation to the
+    `extensions` of the response, used in debug mode only.
+    """
+
+    def get_results(self) -> Dict[str, Any]:
+        context = self.execution_context.context
+        # the loaders are a cached property, only set if they were used
+        loaders = getattr(context, "__dict__", {}).get("loaders")
+        if loaders is None:
+            return {}
+        return {"loaderStats": loaders.stats}
@@ -1,15 +1,13 @@
 import os
 from typing import List
 
-from httpx import AsyncClient
-
+from httpclient import gateway_request
 from utils import convert_to_html
 
 inter_communication_secret = os.getenv("INTER_COMMUNICATION_SECRET")
 
 
-# API call to send mail notification
-async def triggerMail(
+async def sendMail(
     uid: str,
     subject: str,
     body: str,
@@ -28,38 +26,74 @@ async def triggerMail(
         toRecipients (List[str]): The list of to recipients.
         ccRecipients (List[str]): The list of cc recipients.
         cookies (dict): The cookies. Defaults to None.
+
+    Raises:
+        Exception: Couldn't find cookie, cannot send email without cookies!
+        Exception: The errors returned by the interfaces service.
     """
+    if not cookies:
+        raise Exception(
+            "Couldn't find cookie, cannot send email without cookies!"
+        )
 
-    try:
-        query = """
-            mutation Mutation($mailInput: MailInput!, $interCommunicationSecret: String) {
-                sendMail(mailInput: $mailInput, interCommunicationSecret: $interCommunicationSecret)
-            }
-        """  # noqa: E501
-        variables = {
-            "mailInput": {
-                "body": convert_to_html(body),
-                "subject": subject,
-                "uid": uid,
-                "toRecipients": toRecipients,
-                "ccRecipients": ccRecipients,
-                "htmlBody": True,
-            },
-            "interCommunicationSecret": inter_communication_secret,
+    query = """
+        mutation Mutation($mailInput: MailInput!, $interCommunicationSecret: String) {
+            sendMail(mailInput: $mailInput, interCommunicationSecret: $interCommunicationSecret)
         }
+    """  # noqa: E501
+    variables = {
+        "mailInput": {
+            "body": convert_to_html(body),
+            "subject": subject,
+            "uid": uid,
+            "toRecipients": toRecipients,
+            "ccRecipients": ccRecipients,
+            "htmlBody": True,
+        },
+        "interCommunicationSecret": inter_communication_secret,
+    }
+
+    response = await gateway_request(query, variables, cookies=cookies)
+    if response.get("errors"):
+        raise Exception(
+            "; ".join(error.get("message", "") for error in response["errors"])
+        )
+
+
+# API call to send mail notification
+async def triggerMail(
+    uid: str,
+    subject: str,
+    body: str,
+    cookies: dict | None = None,
+    toRecipients: List[str] = [],
+    ccRecipients: List[str] = [],
+) -> bool:
+    """
+    Sends a mail right away, see sendMail, without raising.
 
-        # print("mailbody:", body)
+    Mutations queue their mails in the outbox instead, see outbox.py.
 
-        if cookies:
-            async with AsyncClient(cookies=cookies) as client:
-                await client.post(
-                    "http://gateway/graphql",
-                    json={"query": query, "variables": variables},
-                )
-        else:
-            raise Exception(
-                "Couldn't find cookie, cannot send email without cookies!"
-            )
+    Args:
+        uid (str): The user id.
+        subject (str): The subject of the email.
+        body (str): The body of the email.
+        toRecipients (List[str]): The list of to recipients.
+        ccRecipients (List[str]): The list of cc recipients.
+        cookies (dict): The cookies. Defaults to None.
 
+    Returns:
+        (bool): Whether the mail was handed to the interfaces service.
+    """
+    try:
+        await sendMail(
+            uid,
+            subject,
+            body,
+            cookies=cookies,
+            toRecipients=toRecipients,
+            ccRecipients=ccRecipients,
+        )
     except Exception:
-        return None
+        return False
+    return True
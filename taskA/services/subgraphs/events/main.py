@@ -14,6 +14,7 @@ Attributes:
     app (FastAPI): The FastAPI application instance.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from os import getenv
 
@@ -24,12 +25,21 @@ from strawberry.tools import create_type
 
 from auto_reminders import init_event_reminder_system
 from db import create_index
+from exports import router as export_router
+from httpclient import close_http_client, init_http_client
+from invalidation import invalidation_bus
+from loaders import LoaderStatsExtension
 
 # import queries, mutations, PyObjectId and Context scalars
 from mtypes import PyObjectId
 from mutations import mutations
 from otypes import Context, PyObjectIdType
+from outbox import runOutboxWorker
+from profiling import PhaseTimingsExtension
 from queries import queries
+from response_cache import events_cache
+from response_cache import router as cache_router
+from utils import club_directory, invalidateRoleEmails
 
 # create query types
 Query = create_type("Query", queries)
@@ -43,17 +53,20 @@ async def get_context() -> Context:
     return Context()
 
 
+# check whether running in debug mode
+DEBUG = getenv("GLOBAL_DEBUG", "False").lower() in ("true", "1", "t")
+
 # initialize federated schema
 schema = strawberry.federation.Schema(
     query=Query,
     mutation=Mutation,
     enable_federation_2=True,
     scalar_overrides={PyObjectId: PyObjectIdType},
+    # phase timings and loader statistics in the response, see
+    # profiling.py and loaders.py
+    extensions=[PhaseTimingsExtension, LoaderStatsExtension] if DEBUG else [],
 )
 
-# check whether running in debug mode
-DEBUG = getenv("GLOBAL_DEBUG", "False").lower() in ("true", "1", "t")
-
 # serve API with FastAPI router
 gql_app = GraphQLRouter(schema, graphiql=True, context_getter=get_context)
 
@@ -61,10 +74,24 @@ gql_app = GraphQLRouter(schema, graphiql=True, context_getter=get_context)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    await create_index()
+    await init_http_client()
+    # indexes are built in the background, startup does not wait on them
+    index_task = asyncio.create_task(create_index())
     init_event_reminder_system()
+    # sends the mails queued by the mutations
+    outbox_task = asyncio.create_task(runOutboxWorker())
+    # drops the caches built from the collections other processes change
+    invalidation_bus.subscribe("clubs", lambda _: club_directory.invalidate())
+    invalidation_bus.subscribe("events", lambda _: events_cache.clearLocal())
+    invalidation_bus.subscribe("users", lambda _: invalidateRoleEmails())
+    invalidation_task = asyncio.create_task(invalidation_bus.run())
     yield
     # shutdown
+    if not index_task.done():
+        index_task.cancel()
+    outbox_task.cancel()
+    invalidation_task.cancel()
+    await close_http_client()
 
 
 app = FastAPI(
@@ -74,3 +101,5 @@ app = FastAPI(
     lifespan=lifespan,
 )
 app.include_router(gql_app, prefix="/graphql")
+app.include_router(export_router)
+app.include_router(cache_router)
@@ -0,0 +1,324 @@
+"""
+Data Migrations Module.
+
+A migration is a numbered module of scripts/migrations, named
+`<number>_<name>.py`, defining a `migration` object. Each one walks a
+collection in `_id` order, a batch at a time, and returns for every document
+the fields to set, which are written with buffered unordered bulk writes of
+partial `$set` updates.
+
+Runs are recorded in the `migrations` collection, one document per
+migration number with its status, statistics and checkpoint, the `_id` of
+the last document of the last written batch. An interrupted run resumes
+after its checkpoint, a completed migration is not run again unless forced.
+A run whose updates did not all succeed ends as `partial` and is run again,
+from the start, by the next run of the pending migrations.
+
+Migrations share the database with the live service, the runner sleeps
+between batches to keep to MIGRATION_RATE documents a second.
+
+Attributes:
+    MIGRATIONS_DIR (str): Directory of the numbered migration modules.
+    MIGRATION_BATCH_SIZE (int): Documents read and written per batch.
+                                Defaults to 500.
+    MIGRATION_RATE (float): Documents processed per second at most, 0 for no
+                            limit. Defaults to 1000.
+"""
+
+import abc
+import asyncio
+import importlib.util
+import os
+import re
+import time
+from datetime import UTC, datetime
+from typing import Any, Dict, List
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from db import db, migrationsdb
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scripts", "migrations"
+)
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))
+MIGRATION_RATE = float(os.getenv("MIGRATION_RATE", "1000"))
+
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.py$")
+
+
+class Migration(abc.ABC):
+    """
+    Base class of the migrations.
+
+    Subclasses set the collection, the filter and projection of the
+    documents to read, and implement update. prepare runs once before the
+    first batch of every run, resumed runs included.
+    """
+
+    number: int = 0
+    name: str = ""
+    description: str = ""
+    collection: str = "events"
+    query: Dict[str, Any] = {}
+    projection: Dict[str, Any] | None = None
+
+    async def prepare(self, writer: "BulkWriter") -> None:
+        """
+        Runs before the first batch, to load what update needs.
+
+        Args:
+            writer (BulkWriter): the writer of the run, for writes that must
+                                 be done before the batches.
+        """
+
+    @abc.abstractmethod
+    def update(self, document: dict) -> dict | None:
+        """
+        Fields to set on a document.
+
+        Args:
+            document (dict): the document, with the projected fields.
+
+        Returns:
+            (dict | None): the fields to set, None to leave it unchanged.
+        """
+
+    def filter(self, document: dict) -> dict:
+        """
+        Filter of the update of a document, a subclass may add the values
+        it read so that a document changed since is left alone.
+
+        Args:
+            document (dict): the document, with the projected fields.
+
+        Returns:
+            (dict): the filter
+        """
+        return {"_id": document["_id"]}
+
+
+class BulkWriter:
+    """
+    Buffers updates and writes them with unordered bulk writes, or only
+    counts them in a dry run.
+    """
+
+    def __init__(self, collection: str, dry_run: bool = False):
+        self.collection = db[collection]
+        self.dry_run = dry_run
+        self._buffer: List[UpdateOne] = []
+        self.stats = {"updates": 0, "modified": 0, "failed": 0}
+
+    def add(self, filter: dict, fields: dict) -> None:
+        """
+        Queues a partial update of the given fields.
+
+        Args:
+            filter (dict): filter of the document.
+            fields (dict): the fields to set.
+        """
+        self.stats["updates"] += 1
+        if not self.dry_run:
+            self._buffer.append(UpdateOne(filter, {"$set": fields}))
+
+    async def flush(self) -> None:
+        """
+        Writes the queued updates, the failed ones are counted and printed.
+        """
+        if not self._buffer:
+            return
+        requests, self._buffer = self._buffer, []
+        try:
+            result = await self.collection.bulk_write(requests, ordered=False)
+            self.stats["modified"] += result.modified_count
+        except BulkWriteError as e:
+            self.stats["modified"] += e.details["nModified"]
+            self.stats["failed"] += len(e.details["writeErrors"])
+            for error in e.details["writeErrors"][:5]:
+                print(f"  failed: {error['errmsg']}")
+
+
+class RateLimiter:
+    """
+    Sleeps as needed to keep to a number of documents a second.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._started = time.monotonic()
+        self._count = 0
+
+    async def wait(self, count: int) -> None:
+        """
+        Accounts for processed documents, sleeping if ahead of the rate.
+
+        Args:
+            count (int): number of documents just processed.
+        """
+        self._count += count
+        if self.rate <= 0:
+            return
+        ahead = self._count / self.rate - (time.monotonic() - self._started)
+        if ahead > 0:
+            await asyncio.sleep(ahead)
+
+
+def loadMigrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """
+    Loads the migrations of the directory.
+
+    Args:
+        directory (str): directory of the migration modules.
+
+    Returns:
+        (List[Migration]): the migrations, by number.
+    """
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if match is None:
+            continue
+        spec = importlib.util.spec_from_file_location(
+            f"migration_{match.group(2)}", os.path.join(directory, filename)
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        migration = module.migration
+        migration.number = int(match.group(1))
+        migration.name = match.group(2)
+        migrations.append(migration)
+
+    numbers = [migration.number for migration in migrations]
+    if len(numbers) != len(set(numbers)):
+        raise ValueError("Two migrations have the same number")
+    return sorted(migrations, key=lambda migration: migration.number)
+
+
+async def runMigration(
+    migration: Migration,
+    dry_run: bool = False,
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    rate: float = MIGRATION_RATE,
+    restart: bool = False,
+) -> Dict[str, Any]:
+    """
+    Runs a migration from its checkpoint, or from the start. The run is
+    recorded as done, or as partial if some updates failed.
+
+    A dry run reads everything and counts the updates, without writing
+    documents or recording anything.
+
+    Args:
+        migration (Migration): the migration.
+        dry_run (bool): count the updates without writing them.
+        batch_size (int): documents per batch.
+        rate (float): documents per second at most, 0 for no limit.
+        restart (bool): ignore the checkpoint of an interrupted run.
+
+    Returns:
+        (Dict[str, Any]): statistics of the run.
+    """
+    record = await migrationsdb.find_one({"_id": migration.number}) or {}
+    checkpoint = None if restart else record.get("checkpoint")
+
+    writer = BulkWriter(migration.collection, dry_run)
+    limiter = RateLimiter(rate)
+    stats = {"scanned": 0, "batches": 0}
+    started = time.monotonic()
+
+    if not dry_run:
+        await migrationsdb.update_one(
+            {"_id": migration.number},
+            {
+                "$set": {
+                    "name": migration.name,
+                    "status": "running",
+                    "started_at": datetime.now(UTC),
+                    "checkpoint": checkpoint,
+                },
+                "$unset": {"finished_at": "", "error": ""},
+            },
+            upsert=True,
+        )
+    if checkpoint is not None:
+        print(f"Resuming after {checkpoint}")
+
+    try:
+        await migration.prepare(writer)
+        await writer.flush()
+
+        while True:
+            query = dict(migration.query)
+            if checkpoint is not None:
+                query = {"$and": [query, {"_id": {"$gt": checkpoint}}]}
+            batch = (
+                await writer.collection.find(query, migration.projection)
+                .sort("_id", 1)
+                .limit(batch_size)
+                .to_list(length=None)
+            )
+            if not batch:
+                break
+
+            for document in batch:
+                fields = migration.update(document)
+                if fields:
+                    writer.add(migration.filter(document), fields)
+            await writer.flush()
+
+            checkpoint = batch[-1]["_id"]
+            stats["scanned"] += len(batch)
+            stats["batches"] += 1
+            if not dry_run:
+                await migrationsdb.update_one(
+                    {"_id": migration.number},
+                    {
+                        "$set": {
+                            "checkpoint": checkpoint,
+                            "stats": {**stats, **writer.stats},
+                        }
+                    },
+                )
+            print(
+                f"  {stats['scanned']} scanned, "
+                f"{writer.stats['updates']} updates"
+            )
+            await limiter.wait(len(batch))
+    except BaseException as e:
+        if not dry_run:
+            await migrationsdb.update_one(
+                {"_id": migration.number},
+                {"$set": {"status": "failed", "error": repr(e)}},
+            )
+        raise
+
+    stats.update(writer.stats)
+    stats["seconds"] = round(time.monotonic() - started, 2)
+    if not dry_run:
+        record = {
+            "status": "done",
+            "finished_at": datetime.now(UTC),
+            # failed updates are behind the checkpoint, a rerun starts over
+            "checkpoint": None,
+            "stats": stats,
+        }
+        if writer.stats["failed"]:
+            record["status"] = "partial"
+            record["error"] = f"{writer.stats['failed']} updates failed"
+        await migrationsdb.update_one(
+            {"_id": migration.number}, {"$set": record}
+        )
+    return stats
+
+
+async def migrationStatus() -> Dict[int, dict]:
+    """
+    Recorded runs of the migrations.
+
+    Returns:
+        (Dict[int, dict]): the records, by migration number.
+    """
+    return {record["_id"]: record async for record in migrationsdb.find({})}
@@ -8,7 +8,6 @@ from db import event_reportsdb, eventsdb
 from models import EventReport
 from mtypes import Event_State_Status, timezone
 from otypes import EventReportType, Info, InputEventReport
-from utils import getMember
 
 
 @strawberry.mutation
@@ -45,9 +44,7 @@ async def addEventReport(
     event = await eventsdb.find_one(
         {
             "_id": eventid,
-            "datetimeperiod.1": {
-                "$lt": datetime.now(timezone).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-            },
+            "end_at": {"$lt": datetime.now(timezone)},
             "status.state": Event_State_Status.approved.value,
         }
     )
@@ -68,7 +65,7 @@ async def addEventReport(
     # Check if submitted_by is valid
     cid = event["clubid"]
     uid = details.submitted_by
-    if not await getMember(cid, uid, info.context.cookies):
+    if not await info.context.loaders.member.load((cid, uid)):
         raise ValueError("Submitted by is not a valid member")
 
     report_dict = jsonable_encoder(details.to_pydantic())
@@ -128,9 +125,7 @@ async def editEventReport(
     event = await eventsdb.find_one(
         {
             "_id": eventid,
-            "datetimeperiod.1": {
-                "$lt": datetime.now(timezone).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-            },
+            "end_at": {"$lt": datetime.now(timezone)},
             "status.state": Event_State_Status.approved.value,
         }
     )
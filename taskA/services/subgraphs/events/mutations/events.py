@@ -19,6 +19,7 @@ the event is `pending_room`, else skip to next.
 - Once the event is over, the club or CC can change the state to `completed`.
 """  # noqa: E501
 
+import asyncio
 import os
 from datetime import datetime, timedelta
 
@@ -27,7 +28,11 @@ from fastapi.encoders import jsonable_encoder
 from prettytable import PrettyTable
 
 from db import eventsdb
-from mailing import triggerMail
+from finance_rollups import (
+    financeContribution,
+    rebuildFinanceRollups,
+    syncFinanceRollups,
+)
 from mailing_templates import (
     APPROVED_EVENT_BODY_FOR_CLUB,
     CLUB_EVENT_SUBJECT,
@@ -56,15 +61,20 @@ from mtypes import (
     SponsorType,
     timezone,
 )
+from occupancy import syncEventOccupancy
 from otypes import EventType, Info, InputEditEventDetails, InputEventDetails
+from outbox import enqueueMail
+from profiling import PhaseTimer, prefetch
+from response_cache import invalidateEvents
 from utils import (
+    club_directory,
     delete_file,
-    getClubDetails,
+    eventDateFields,
     getEventCode,
     getEventLink,
-    getMember,
     getRoleEmails,
     getUser,
+    searchTerms,
 )
 
 inter_communication_secret_global = os.getenv("INTER_COMMUNICATION_SECRET")
@@ -113,7 +123,7 @@ async def createEvent(details: InputEventDetails, info: Info) -> EventType:
         raise Exception("Start time cannot be after end time.")
 
     # Check if the club exists
-    club_details = await getClubDetails(details.clubid, info.context.cookies)
+    club_details = await info.context.loaders.club.load(details.clubid)
     if len(club_details.keys()) == 0:
         raise Exception("Club does not exist.")
 
@@ -196,8 +206,8 @@ async def createEvent(details: InputEventDetails, info: Info) -> EventType:
         event_instance.collabclubs = details.collabclubs
 
     # Check POC Details Exist or not
-    # if not await getMember(
-    #     details.clubid, details.poc, cookies=info.context.cookies
+    # if not await info.context.loaders.member.load(
+    #     (details.clubid, details.poc)
     # ):
     #     raise Exception("Member Details for POC does not exist")
 
@@ -234,8 +244,16 @@ async def createEvent(details: InputEventDetails, info: Info) -> EventType:
         event_instance.club_category = ClubBodyCategoryType.club
 
     created_id = (
-        await eventsdb.insert_one(jsonable_encoder(event_instance))
+        await eventsdb.insert_one(
+            {
+                **jsonable_encoder(event_instance),
+                **eventDateFields(event_instance.datetimeperiod),
+                "search_terms": searchTerms(event_instance.name),
+            }
+        )
     ).inserted_id
+    await syncEventOccupancy(created_id)
+    await invalidateEvents()
     created_event = Event.model_validate(
         await eventsdb.find_one({"_id": created_id})
     )
@@ -293,6 +311,7 @@ async def editEvent(details: InputEditEventDetails, info: Info) -> EventType:
     event_ref = await eventsdb.find_one({"_id": details.eventid})
     if not event_ref:
         raise Exception("Event does not exist.")
+    finances_before = financeContribution(event_ref)
 
     # if the update is done by CC, set state to approved
     # else set status to incomplete
@@ -349,8 +368,8 @@ async def editEvent(details: InputEditEventDetails, info: Info) -> EventType:
     if details.poc is not None and event_ref.get("poc", None) != details.poc:
         updates["poc"] = details.poc
         # Check POC Details Exist or not
-        if not await getMember(
-            details.clubid, details.poc, cookies=info.context.cookies
+        if not await info.context.loaders.member.load(
+            (details.clubid, details.poc)
         ):
             raise Exception("Member Details for POC does not exist")
     if details.description is not None:
@@ -419,10 +438,17 @@ async def editEvent(details: InputEditEventDetails, info: Info) -> EventType:
     }
 
     updation = {"$set": jsonable_encoder(updates)}
+    if "datetimeperiod" in updates:
+        # keep the native date fields in sync
+        updation["$set"].update(eventDateFields(updates["datetimeperiod"]))
+    if "name" in updates:
+        updation["$set"]["search_terms"] = searchTerms(updates["name"])
 
     upd_ref = await eventsdb.update_one(query, updation)
     if upd_ref.matched_count == 0:
         raise Exception("You do not have permission to access this resource.")
+    await syncEventOccupancy(details.eventid)
+    await invalidateEvents()
 
     if old_poster_file:
         try:
@@ -430,227 +456,49 @@ async def editEvent(details: InputEditEventDetails, info: Info) -> EventType:
         except Exception as e:
             print(f"Error deleting poster file {old_poster_file}\nError: {e}")
     event_ref = await eventsdb.find_one({"_id": details.eventid})
+    await syncFinanceRollups(finances_before, financeContribution(event_ref))
     return EventType.from_pydantic(Event.model_validate(event_ref))
 
 
-@strawberry.mutation
-async def progressEvent(
-    eventid: str,
-    info: Info,
-    cc_progress_budget: bool | None = None,
-    cc_progress_room: bool | None = None,
-    cc_approver: str | None = None,
+# roles whose emails are mailed when an event progresses to a state
+PROGRESS_MAIL_ROLES = {
+    Event_State_Status.pending_cc.value: ["cc"],
+    Event_State_Status.pending_budget.value: ["cc", "slo", "slc"],
+    Event_State_Status.pending_room.value: ["cc", "slo"],
+    Event_State_Status.approved.value: [],
+}
+
+
+def progressEventMails(
+    updated_event_instance: Event,
+    clubDetails: dict,
+    poc: tuple,
+    role_emails: dict,
     slc_members_for_email: list[str] | None = None,
-) -> EventType:
+) -> list[dict]:
     """
-    progress the event state status for different users
+    Composes the mails sent when an event progresses, without any remote
+    call.
 
     Args:
-        eventid (str): event id
-        info (otypes.Info): info object
-        cc_progress_budget (bool | None, optional): progress budget.
-                                            Defaults to None.
-        cc_progress_room (bool | None, optional): progress room.
-                                         Defaults to None.
-        cc_approver (str | None, optional): cc approver. Defaults to None.
-        slc_members_for_email (list[str] | None, optional): list of SLC members
-                                                   for email. Defaults to None.
+        updated_event_instance (models.Event): the progressed event
+        clubDetails (dict): details of the club of the event
+        poc (tuple): profile and phone of the POC of the event
+        role_emails (dict): emails of the roles in PROGRESS_MAIL_ROLES of
+                            the new state, by role
+        slc_members_for_email (list[str] | None): SLC members to mail.
+                                                  Defaults to None.
 
     Returns:
-        (otypes.EventType): event object
-
-    Raises:
-        Exception: Club does not exist.
-        Exception: CC Approver is required to progress event.
-        Exception: POC does not exist.
-    """  # noqa: E501
-
-    # user = info.context.user
-    user = {
-        "role": "cc",
-        "uid": "idk"
-    }
-
-    event_ref = await eventsdb.find_one({"_id": eventid})
-    if event_ref is None or user is None:
-        raise noaccess_error
-    event_instance = Event.model_validate(event_ref)
-
-    mail_uid = user["uid"]
-    clubDetails = await getClubDetails(
-        event_instance.clubid, info.context.cookies
-    )
-    if len(clubDetails.keys()) == 0:
-        raise Exception("Club does not exist.")
-    else:
-        mail_club = clubDetails["email"]
-        clubname = clubDetails["name"]
-
-    # get current time
-    current_time = datetime.now(timezone)
-    time_str = current_time.strftime("%d-%m-%Y %I:%M %p")
-
-    is_admin = event_instance.club_category == ClubBodyCategoryType.admin
-    is_body = event_instance.club_category == ClubBodyCategoryType.body
-
-    if event_instance.status.state == Event_State_Status.incomplete:
-        if user["role"] != "club" or user["uid"] != event_instance.clubid:
-            raise noaccess_error
-        new_state = Event_State_Status.pending_cc.value
-        if is_body:
-            new_state = Event_State_Status.pending_room.value
-        elif is_admin:
-            new_state = Event_State_Status.approved.value
-
-        updation = {
-            "budget": is_admin,
-            # or sum([b.amount for b in event_instance.budget]) == 0,
-            "room": is_admin,
-            #   or len(event_instance.location) == 0,
-            "state": new_state,
-            "cc_approver": None,
-            "slc_approver": None,
-            "slo_approver": user["uid"] if is_admin else None,
-            "creation_time": time_str,
-            "submission_time": time_str,
-            "cc_approver_time": "Not Approved",
-            "slc_approver_time": "Not Approved",
-            "slo_approver_time": time_str if is_admin else "Not Approved",
-        }
-
-    elif event_instance.status.state == Event_State_Status.pending_cc:
-        if user["role"] != "cc":
-            raise noaccess_error
-        updation = {
-            "budget": event_instance.status.budget,
-            # or sum([b.amount for b in event_instance.budget]) == 0,
-            "room": event_instance.status.room,
-            #   or len(event_instance.location) == 0,
-            "cc_approver": user["uid"],
-            "slc_approver": event_instance.status.slc_approver,
-            "slo_approver": event_instance.status.slo_approver,
-            "cc_approver_time": time_str,
-            "slc_approver_time": event_instance.status.slc_approver_time,
-            "slo_approver_time": event_instance.status.slo_approver_time,
-            "creation_time": event_instance.status.creation_time,
-            "submission_time": event_instance.status.submission_time,
-        }
-        if cc_progress_budget is not None:
-            updation["budget"] = cc_progress_budget
-        if cc_progress_room is not None:
-            updation["room"] = cc_progress_room
-        if cc_approver is not None:
-            updation["cc_approver"] = cc_approver
-        else:
-            raise Exception("CC Approver is required to progress the event.")
-
-        if not updation["budget"]:
-            updation["state"] = Event_State_Status.pending_budget.value
-        elif not updation["room"]:
-            # if budget is approved
-            updation["slc_approver_time"] = None
-            updation["state"] = Event_State_Status.pending_room.value
-        else:
-            # if both are approved
-            updation["slc_approver_time"] = None
-            updation["slo_approver_time"] = None
-            updation["state"] = Event_State_Status.approved.value
-
-    elif event_instance.status.state == Event_State_Status.pending_budget:
-        if user["role"] != "slc":
-            raise noaccess_error
-        assert event_instance.status.budget is False
-        updation = {
-            "budget": True,
-            "room": event_instance.status.room,
-            #   | len(event_instance.location) == 0,
-            "slc_approver": user["uid"],
-            "slo_approver": event_instance.status.slo_approver,
-            "cc_approver": event_instance.status.cc_approver,
-            "cc_approver_time": event_instance.status.cc_approver_time,
-            "slc_approver_time": time_str,
-            "slo_approver_time": event_instance.status.slo_approver_time,
-            "creation_time": event_instance.status.creation_time,
-            "submission_time": event_instance.status.submission_time,
-        }
-
-        if not updation["room"]:
-            updation["state"] = Event_State_Status.pending_room.value
-        else:
-            updation["slo_approver_time"] = time_str
-            updation["state"] = Event_State_Status.approved.value
-
-    elif event_instance.status.state == Event_State_Status.pending_room:
-        if user["role"] != "slo":
-            raise noaccess_error
-        assert event_instance.status.budget or is_body
-        assert event_instance.status.room is False
-        updation = {
-            "budget": event_instance.status.budget or is_body,
-            "room": True,
-            "state": Event_State_Status.approved.value,
-            "slo_approver": user["uid"],
-            "slc_approver": event_instance.status.slc_approver,
-            "cc_approver": event_instance.status.cc_approver,
-            "cc_approver_time": event_instance.status.cc_approver_time,
-            "slc_approver_time": event_instance.status.slc_approver_time,
-            "slo_approver_time": time_str,
-            "creation_time": event_instance.status.creation_time,
-            "submission_time": event_instance.status.submission_time,
-        }
-
-    elif event_instance.status.state == Event_State_Status.approved:
-        if user["role"] != "cc" and (
-            user["role"] != "club" or user["uid"] != event_instance.clubid
-        ):
-            raise noaccess_error
-
-        updation = {
-            "budget": event_instance.status.budget,
-            "room": event_instance.status.room,
-            "state": Event_State_Status.approved.value,
-            "creation_time": event_instance.status.creation_time,
-            "submission_time": event_instance.status.submission_time,
-            "cc_approver": event_instance.status.cc_approver,
-            "slc_approver": event_instance.status.slc_approver,
-            "slo_approver": event_instance.status.slo_approver,
-            "cc_approver_time": event_instance.status.cc_approver_time,
-            "slc_approver_time": event_instance.status.slc_approver_time,
-            "slo_approver_time": event_instance.status.slo_approver_time,
-        }
-
-    # Unchanged Values
-    updation["last_updated_time"] = event_instance.status.last_updated_time
-    updation["last_updated_by"] = event_instance.status.last_updated_by
-    updation["deleted_time"] = event_instance.status.deleted_time
-    updation["deleted_by"] = event_instance.status.deleted_by
-
-    # poc = await getUser(event_instance.poc, info.context.cookies)
-    # if not poc:
-    #     raise Exception("POC does not exist.")
-
-    # Mock POC data for local testing
-    poc = (
-        {
-            "firstName": "Test",
-            "lastName": "User",
-            "email": "testuser@iiit.ac.in",
-            "rollno": "2021101345",
-        },
-        {"phone": "1234567890"}
-    )
-
-    upd_ref = await eventsdb.update_one(
-        {"_id": eventid}, {"$set": {"status": updation}}
+        (list[dict]): the mails, with their subject, body and recipients
+    """
+    mail_club = clubDetails["email"]
+    clubname = clubDetails["name"]
+    is_body = (
+        updated_event_instance.club_category == ClubBodyCategoryType.body
     )
-    if upd_ref.matched_count == 0:
-        raise noaccess_error
-
-    event_ref = await eventsdb.find_one({"_id": eventid})
-    updated_event_instance = Event.model_validate(event_ref)
+    mails = []
 
-    ## trigger mail notification
-    # Data Preparation for the mailing
     mail_event_title = updated_event_instance.name
     mail_eventlink = getEventLink(updated_event_instance.code)
     mail_description = updated_event_instance.description
@@ -776,7 +624,7 @@ async def progressEvent(
     mail_to = []
     cc_to = []
     if updated_event_instance.status.state == Event_State_Status.pending_cc:
-        mail_to = await getRoleEmails("cc")
+        mail_to = role_emails["cc"]
 
         # Mail to club also for the successful submission of the event
         mail_to_club = [
@@ -804,20 +652,20 @@ async def progressEvent(
             poc_phone=poc_phone,
         )
 
-        await triggerMail(
-            mail_uid,
-            mail_subject_club,
-            mail_body_club,
-            toRecipients=mail_to_club,
-            ccRecipients=[poc_email],
-            cookies=info.context.cookies,
+        mails.append(
+            {
+                "subject": mail_subject_club,
+                "body": mail_body_club,
+                "toRecipients": mail_to_club,
+                "ccRecipients": [poc_email],
+            }
         )
     elif (
         updated_event_instance.status.state
         == Event_State_Status.pending_budget
     ):
-        cc_to = await getRoleEmails("cc") + await getRoleEmails("slo")
-        slc_emails = await getRoleEmails("slc")
+        cc_to = role_emails["cc"] + role_emails["slo"]
+        slc_emails = role_emails["slc"]
 
         if slc_members_for_email is not None:
             mail_to = []
@@ -844,8 +692,8 @@ async def progressEvent(
     elif (
         updated_event_instance.status.state == Event_State_Status.pending_room
     ):
-        cc_to = await getRoleEmails("cc") + ([mail_club] if is_body else [])
-        mail_to = await getRoleEmails("slo")
+        cc_to = role_emails["cc"] + ([mail_club] if is_body else [])
+        mail_to = role_emails["slo"]
         mail_body = PROGRESS_EVENT_BODY_FOR_SLO.safe_substitute(
             event_id=updated_event_instance.code,
             club=clubname,
@@ -882,14 +730,262 @@ async def progressEvent(
         )
 
     if len(mail_to):
-        await triggerMail(
-            mail_uid,
-            mail_subject,
-            mail_body,
-            toRecipients=mail_to,
-            ccRecipients=cc_to,
-            cookies=info.context.cookies,
+        mails.append(
+            {
+                "subject": mail_subject,
+                "body": mail_body,
+                "toRecipients": mail_to,
+                "ccRecipients": cc_to,
+            }
+        )
+    return mails
+
+
+@strawberry.mutation
+async def progressEvent(
+    eventid: str,
+    info: Info,
+    cc_progress_budget: bool | None = None,
+    cc_progress_room: bool | None = None,
+    cc_approver: str | None = None,
+    slc_members_for_email: list[str] | None = None,
+) -> EventType:
+    """
+    progress the event state status for different users
+
+    Args:
+        eventid (str): event id
+        info (otypes.Info): info object
+        cc_progress_budget (bool | None, optional): progress budget.
+                                            Defaults to None.
+        cc_progress_room (bool | None, optional): progress room.
+                                         Defaults to None.
+        cc_approver (str | None, optional): cc approver. Defaults to None.
+        slc_members_for_email (list[str] | None, optional): list of SLC members
+                                                   for email. Defaults to None.
+
+    Returns:
+        (otypes.EventType): event object
+
+    Raises:
+        Exception: Club does not exist.
+        Exception: CC Approver is required to progress event.
+        Exception: POC does not exist.
+    """  # noqa: E501
+
+    # user = info.context.user
+    user = {
+        "role": "cc",
+        "uid": "idk"
+    }
+
+    timer = PhaseTimer("progressEvent", info)
+
+    event_ref = await eventsdb.find_one({"_id": eventid})
+    if event_ref is None or user is None:
+        raise noaccess_error
+    event_instance = Event.model_validate(event_ref)
+    finances_before = financeContribution(event_ref)
+    timer.lap("load")
+
+    # compute the transition, no remote calls
+    # get current time
+    current_time = datetime.now(timezone)
+    time_str = current_time.strftime("%d-%m-%Y %I:%M %p")
+
+    is_admin = event_instance.club_category == ClubBodyCategoryType.admin
+    is_body = event_instance.club_category == ClubBodyCategoryType.body
+
+    if event_instance.status.state == Event_State_Status.incomplete:
+        if user["role"] != "club" or user["uid"] != event_instance.clubid:
+            raise noaccess_error
+        new_state = Event_State_Status.pending_cc.value
+        if is_body:
+            new_state = Event_State_Status.pending_room.value
+        elif is_admin:
+            new_state = Event_State_Status.approved.value
+
+        updation = {
+            "budget": is_admin,
+            # or sum([b.amount for b in event_instance.budget]) == 0,
+            "room": is_admin,
+            #   or len(event_instance.location) == 0,
+            "state": new_state,
+            "cc_approver": None,
+            "slc_approver": None,
+            "slo_approver": user["uid"] if is_admin else None,
+            "creation_time": time_str,
+            "submission_time": time_str,
+            "cc_approver_time": "Not Approved",
+            "slc_approver_time": "Not Approved",
+            "slo_approver_time": time_str if is_admin else "Not Approved",
+        }
+
+    elif event_instance.status.state == Event_State_Status.pending_cc:
+        if user["role"] != "cc":
+            raise noaccess_error
+        updation = {
+            "budget": event_instance.status.budget,
+            # or sum([b.amount for b in event_instance.budget]) == 0,
+            "room": event_instance.status.room,
+            #   or len(event_instance.location) == 0,
+            "cc_approver": user["uid"],
+            "slc_approver": event_instance.status.slc_approver,
+            "slo_approver": event_instance.status.slo_approver,
+            "cc_approver_time": time_str,
+            "slc_approver_time": event_instance.status.slc_approver_time,
+            "slo_approver_time": event_instance.status.slo_approver_time,
+            "creation_time": event_instance.status.creation_time,
+            "submission_time": event_instance.status.submission_time,
+        }
+        if cc_progress_budget is not None:
+            updation["budget"] = cc_progress_budget
+        if cc_progress_room is not None:
+            updation["room"] = cc_progress_room
+        if cc_approver is not None:
+            updation["cc_approver"] = cc_approver
+        else:
+            raise Exception("CC Approver is required to progress the event.")
+
+        if not updation["budget"]:
+            updation["state"] = Event_State_Status.pending_budget.value
+        elif not updation["room"]:
+            # if budget is approved
+            updation["slc_approver_time"] = None
+            updation["state"] = Event_State_Status.pending_room.value
+        else:
+            # if both are approved
+            updation["slc_approver_time"] = None
+            updation["slo_approver_time"] = None
+            updation["state"] = Event_State_Status.approved.value
+
+    elif event_instance.status.state == Event_State_Status.pending_budget:
+        if user["role"] != "slc":
+            raise noaccess_error
+        assert event_instance.status.budget is False
+        updation = {
+            "budget": True,
+            "room": event_instance.status.room,
+            #   | len(event_instance.location) == 0,
+            "slc_approver": user["uid"],
+            "slo_approver": event_instance.status.slo_approver,
+            "cc_approver": event_instance.status.cc_approver,
+            "cc_approver_time": event_instance.status.cc_approver_time,
+            "slc_approver_time": time_str,
+            "slo_approver_time": event_instance.status.slo_approver_time,
+            "creation_time": event_instance.status.creation_time,
+            "submission_time": event_instance.status.submission_time,
+        }
+
+        if not updation["room"]:
+            updation["state"] = Event_State_Status.pending_room.value
+        else:
+            updation["slo_approver_time"] = time_str
+            updation["state"] = Event_State_Status.approved.value
+
+    elif event_instance.status.state == Event_State_Status.pending_room:
+        if user["role"] != "slo":
+            raise noaccess_error
+        assert event_instance.status.budget or is_body
+        assert event_instance.status.room is False
+        updation = {
+            "budget": event_instance.status.budget or is_body,
+            "room": True,
+            "state": Event_State_Status.approved.value,
+            "slo_approver": user["uid"],
+            "slc_approver": event_instance.status.slc_approver,
+            "cc_approver": event_instance.status.cc_approver,
+            "cc_approver_time": event_instance.status.cc_approver_time,
+            "slc_approver_time": event_instance.status.slc_approver_time,
+            "slo_approver_time": time_str,
+            "creation_time": event_instance.status.creation_time,
+            "submission_time": event_instance.status.submission_time,
+        }
+
+    elif event_instance.status.state == Event_State_Status.approved:
+        if user["role"] != "cc" and (
+            user["role"] != "club" or user["uid"] != event_instance.clubid
+        ):
+            raise noaccess_error
+
+        updation = {
+            "budget": event_instance.status.budget,
+            "room": event_instance.status.room,
+            "state": Event_State_Status.approved.value,
+            "creation_time": event_instance.status.creation_time,
+            "submission_time": event_instance.status.submission_time,
+            "cc_approver": event_instance.status.cc_approver,
+            "slc_approver": event_instance.status.slc_approver,
+            "slo_approver": event_instance.status.slo_approver,
+            "cc_approver_time": event_instance.status.cc_approver_time,
+            "slc_approver_time": event_instance.status.slc_approver_time,
+            "slo_approver_time": event_instance.status.slo_approver_time,
+        }
+
+    # Unchanged Values
+    updation["last_updated_time"] = event_instance.status.last_updated_time
+    updation["last_updated_by"] = event_instance.status.last_updated_by
+    updation["deleted_time"] = event_instance.status.deleted_time
+    updation["deleted_by"] = event_instance.status.deleted_by
+    mail_roles = PROGRESS_MAIL_ROLES.get(updation["state"], [])
+    timer.lap("transition")
+
+    # prefetch everything the mails need at once, before writing
+    clubDetails, *emails = await prefetch(
+        info.context.loaders.club.load(event_instance.clubid),
+        # info.context.loaders.user.load(event_instance.poc),
+        *(getRoleEmails(role) for role in mail_roles),
+    )
+    role_emails = dict(zip(mail_roles, emails))
+    if len(clubDetails.keys()) == 0:
+        raise Exception("Club does not exist.")
+
+    # if not poc:
+    #     raise Exception("POC does not exist.")
+
+    # Mock POC data for local testing
+    poc = (
+        {
+            "firstName": "Test",
+            "lastName": "User",
+            "email": "testuser@iiit.ac.in",
+            "rollno": "2021101345",
+        },
+        {"phone": "1234567890"}
+    )
+    timer.lap("prefetch")
+
+    upd_ref = await eventsdb.update_one(
+        {"_id": eventid}, {"$set": {"status": updation}}
+    )
+    if upd_ref.matched_count == 0:
+        raise noaccess_error
+    await syncEventOccupancy(eventid)
+    await invalidateEvents()
+
+    event_ref = await eventsdb.find_one({"_id": eventid})
+    await syncFinanceRollups(finances_before, financeContribution(event_ref))
+    updated_event_instance = Event.model_validate(event_ref)
+    timer.lap("write")
+
+    mails = progressEventMails(
+        updated_event_instance,
+        clubDetails,
+        poc,
+        role_emails,
+        slc_members_for_email,
+    )
+    timer.lap("compose")
+
+    await asyncio.gather(
+        *(
+            enqueueMail(user["uid"], key=f"progressEvent:{eventid}", **mail)
+            for mail in mails
         )
+    )
+    timer.lap("dispatch")
+    timer.log(eventid)
+
     return EventType.from_pydantic(updated_event_instance)
 
 
@@ -925,10 +1021,14 @@ async def deleteEvent(eventid: str, info: Info) -> EventType:
         # if user is not an admin, they can only delete their own events
         query["clubid"] = user["uid"]
 
+    timer = PhaseTimer("deleteEvent", info)
+
     event_ref = await eventsdb.find_one(query)
     if event_ref is None:
         raise noaccess_error
     event_instance = Event.model_validate(event_ref)
+    finances_before = financeContribution(event_ref)
+    timer.lap("load")
 
     updation = event_ref["status"]
     updation["state"] = Event_State_Status.deleted.value
@@ -938,27 +1038,38 @@ async def deleteEvent(eventid: str, info: Info) -> EventType:
     updation["deleted_time"] = datetime.now(timezone).strftime(
         "%d-%m-%Y %I:%M %p"
     )
+    send_mail = event_instance.status.state not in [
+        Event_State_Status.deleted,
+        Event_State_Status.incomplete,
+    ]
+    mail_roles = ["cc"] if send_mail and user["role"] != "cc" else []
+    timer.lap("transition")
 
-    clubDetails = await getClubDetails(
-        event_instance.clubid, info.context.cookies
+    clubDetails, *emails = await prefetch(
+        info.context.loaders.club.load(event_instance.clubid),
+        *(getRoleEmails(role) for role in mail_roles),
     )
+    role_emails = dict(zip(mail_roles, emails))
     if len(clubDetails.keys()) == 0:
         raise Exception("Club does not exist.")
     else:
         mail_club = clubDetails["email"]
         clubname = clubDetails["name"]
+    timer.lap("prefetch")
 
     event_ref = await eventsdb.update_one(
         query, {"$set": {"status": updation}}
     )
     if event_ref.matched_count == 0:
         raise noaccess_error
+    await syncEventOccupancy(eventid)
+    await syncFinanceRollups(finances_before, None)
+    await invalidateEvents()
+    timer.lap("write")
 
     # Send the event deleted email.
-    if event_instance.status.state not in [
-        Event_State_Status.deleted,
-        Event_State_Status.incomplete,
-    ]:
+    mail = None
+    if send_mail:
         if user["role"] == "cc":
             mail_to = [
                 mail_club,
@@ -973,11 +1084,17 @@ async def deleteEvent(eventid: str, info: Info) -> EventType:
                 eventlink=getEventLink(event_instance.code),
                 deleted_by="Clubs Council",
             )
+
+            mail = {
+                "subject": mail_subject,
+                "body": mail_body,
+                "toRecipients": mail_to,
+            }
         elif user["role"] == "slo":
             mail_to = [
                 mail_club,
             ]
-            cc_to = await getRoleEmails("cc")
+            cc_to = role_emails["cc"]
             mail_subject = DELETE_EVENT_SUBJECT.safe_substitute(
                 event_id=event_instance.code,
                 event=event_instance.name,
@@ -989,16 +1106,14 @@ async def deleteEvent(eventid: str, info: Info) -> EventType:
                 deleted_by="Student Life Office",
             )
 
-            await triggerMail(
-                user["uid"],
-                mail_subject,
-                mail_body,
-                toRecipients=mail_to,
-                ccRecipients=cc_to,
-                cookies=info.context.cookies,
-            )
+            mail = {
+                "subject": mail_subject,
+                "body": mail_body,
+                "toRecipients": mail_to,
+                "ccRecipients": cc_to,
+            }
         elif user["role"] == "club":
-            mail_to = await getRoleEmails("cc")
+            mail_to = role_emails["cc"]
             mail_subject = DELETE_EVENT_SUBJECT.safe_substitute(
                 event_id=event_instance.code,
                 event=event_instance.name,
@@ -1009,13 +1124,17 @@ async def deleteEvent(eventid: str, info: Info) -> EventType:
                 eventlink=getEventLink(event_instance.code),
             )
 
-            await triggerMail(
-                user["uid"],
-                mail_subject,
-                mail_body,
-                toRecipients=mail_to,
-                cookies=info.context.cookies,
-            )
+            mail = {
+                "subject": mail_subject,
+                "body": mail_body,
+                "toRecipients": mail_to,
+            }
+    timer.lap("compose")
+
+    if mail is not None:
+        await enqueueMail(user["uid"], key=f"deleteEvent:{eventid}", **mail)
+    timer.lap("dispatch")
+    timer.log(eventid)
 
     event_ref = await eventsdb.find_one({"_id": eventid})
     return EventType.from_pydantic(Event.model_validate(event_ref))
@@ -1052,20 +1171,14 @@ async def rejectEvent(
         "_id": eventid,
     }
 
+    timer = PhaseTimer("rejectEvent", info)
+
     event_ref = await eventsdb.find_one(query)
     if event_ref is None:
         raise noaccess_error
 
     event_instance = Event.model_validate(event_ref)
-
-    clubDetails = await getClubDetails(
-        event_instance.clubid, info.context.cookies
-    )
-    if len(clubDetails.keys()) == 0:
-        raise Exception("Club does not exist.")
-    else:
-        mail_club = clubDetails["email"]
-        clubname = clubDetails["name"]
+    timer.lap("load")
 
     if event_instance.status.state != Event_State_Status.pending_cc:
         raise Exception("Cannot reset event that has progressed beyond CC.")
@@ -1075,12 +1188,26 @@ async def rejectEvent(
     status["budget"] = False
     status["room"] = False
     status["submission_time"] = None
+    timer.lap("transition")
+
+    (clubDetails,) = await prefetch(
+        info.context.loaders.club.load(event_instance.clubid)
+    )
+    if len(clubDetails.keys()) == 0:
+        raise Exception("Club does not exist.")
+    else:
+        mail_club = clubDetails["email"]
+        clubname = clubDetails["name"]
+    timer.lap("prefetch")
 
     upd_ref = await eventsdb.update_one(
         {"_id": eventid}, {"$set": {"status": status}}
     )
     if upd_ref.matched_count == 0:
         raise noaccess_error
+    await syncEventOccupancy(eventid)
+    await invalidateEvents()
+    timer.lap("write")
 
     # Send email to Club for allowing edits
     mail_to = [mail_club]
@@ -1095,15 +1222,18 @@ async def rejectEvent(
         reason=reason,
         deleted_by="Clubs Council",
     )
+    timer.lap("compose")
 
     # Mail to the club regarding the rejected event
-    await triggerMail(
+    await enqueueMail(
         user["uid"],
         mail_subject,
         mail_body,
         toRecipients=mail_to,
-        cookies=info.context.cookies,
+        key=f"rejectEvent:{eventid}",
     )
+    timer.lap("dispatch")
+    timer.log(eventid)
 
     return EventType.from_pydantic(Event.model_validate(event_ref))
 
@@ -1147,9 +1277,39 @@ async def updateEventsCid(
     }
 
     upd_ref = await eventsdb.update_many({"clubid": old_cid}, updation)
+    try:
+        await rebuildFinanceRollups([old_cid, new_cid])
+    except Exception as e:
+        print(f"Error rebuilding finance rollups of {old_cid}: {e}")
+    await invalidateEvents()
     return upd_ref.modified_count
 
 
+@strawberry.mutation
+async def invalidateEventsClubCache(
+    inter_communication_secret: str | None = None,
+) -> bool:
+    """
+    Drops the club directory of this service, called by the clubs service
+    whenever a club is created, edited, deleted or restarted.
+
+    Args:
+        inter_communication_secret (str | None): secret for authentication.
+                                                Default is None.
+
+    Returns:
+        (bool): True if the directory was invalidated.
+
+    Raises:
+        Exception: Authentication Error! Invalid secret!
+    """
+    if inter_communication_secret != inter_communication_secret_global:
+        raise Exception("Authentication Error! Invalid secret!")
+
+    club_directory.invalidate()
+    return True
+
+
 # register all mutations
 mutations = [
     createEvent,
@@ -1158,4 +1318,5 @@ mutations = [
     deleteEvent,
     rejectEvent,
     updateEventsCid,
+    invalidateEventsClubCache,
 ]
@@ -3,7 +3,7 @@ from datetime import datetime
 import strawberry
 
 from db import eventsdb
-from mailing import triggerMail
+from finance_rollups import financeContribution, syncFinanceRollups
 from mailing_templates import (
     BILL_SUBMISSION_BODY_FOR_SLO,
     BILL_SUBMISSION_SUBJECT,
@@ -19,9 +19,9 @@ from mtypes import (
     timezone,
 )
 from otypes import Info, InputBillsStatus, InputBillsUpload
+from outbox import enqueueMail
 from utils import (
     delete_file,
-    getClubDetails,
     getEventFinancesLink,
     getEventLink,
     getRoleEmails,
@@ -62,7 +62,7 @@ async def updateBillsStatus(
         {
             "_id": details.eventid,
             "status.state": Event_State_Status.approved.value,  # type: ignore
-            "datetimeperiod.1": {"$lt": time_str},
+            "end_at": {"$lt": current_time},
             "budget": {
                 "$exists": True,
                 "$ne": [],
@@ -73,7 +73,7 @@ async def updateBillsStatus(
         raise ValueError("Event not found.")
 
     mail_to = (
-        await getClubDetails(event["clubid"], info.context.cookies)
+        await info.context.loaders.club.load(event["clubid"])
     ).get("email", None)
     if not mail_to:
         raise ValueError("Club email not found")
@@ -91,9 +91,11 @@ async def updateBillsStatus(
     if upd_ref.modified_count == 0:
         raise ValueError("Bills status not updated")
 
+    finances_before = financeContribution(event)
     event = await eventsdb.find_one({"_id": details.eventid})
     if not event:
         raise ValueError("Event not found")
+    await syncFinanceRollups(finances_before, financeContribution(event))
 
     cc_to = await getRoleEmails("cc")
 
@@ -107,7 +109,7 @@ async def updateBillsStatus(
         comment=details.slo_comment,
         eventlink=getEventLink(event["code"]),
     )
-    await triggerMail(
+    await enqueueMail(
         mail_uid,
         mail_subject,
         mail_body,
@@ -115,7 +117,7 @@ async def updateBillsStatus(
             mail_to,
         ],
         ccRecipients=cc_to,
-        cookies=info.context.cookies,
+        key=f"updateBillsStatus:{details.eventid}",
     )
     return Bills_Status(**event["bills_status"])
 
@@ -148,7 +150,7 @@ async def addBill(details: InputBillsUpload, info: Info) -> bool:
         {
             "_id": details.eventid,
             "status.state": Event_State_Status.approved.value,  # type: ignore
-            "datetimeperiod.1": {"$lt": time_str},
+            "end_at": {"$lt": current_time},
             "budget": {
                 "$exists": True,
                 "$ne": [],
@@ -218,9 +220,11 @@ async def addBill(details: InputBillsUpload, info: Info) -> bool:
         except Exception as e:
             print(f"Error deleting file: {e}")
 
+    finances_before = financeContribution(event)
     event = await eventsdb.find_one({"_id": details.eventid})
     if not event:
         raise ValueError("Event not found")
+    await syncFinanceRollups(finances_before, financeContribution(event))
 
     event_instance = Event.model_validate(event)
     total_budget = sum(item.amount for item in event_instance.budget)
@@ -229,7 +233,7 @@ async def addBill(details: InputBillsUpload, info: Info) -> bool:
     )
 
     clubname = (
-        await getClubDetails(event["clubid"], info.context.cookies)
+        await info.context.loaders.club.load(event["clubid"])
     ).get("name", None)
     cc_to = await getRoleEmails("cc")
     slo_emails = await getRoleEmails("slo")
@@ -253,13 +257,13 @@ async def addBill(details: InputBillsUpload, info: Info) -> bool:
         eventfinancelink=getEventFinancesLink(event_instance.id),
     )
 
-    await triggerMail(
+    await enqueueMail(
         mail_uid,
         mail_subject,
         mail_body,
         toRecipients=slo_emails,
         ccRecipients=cc_to,
-        cookies=info.context.cookies,
+        key=f"addBill:{details.eventid}",
     )
 
     return True
@@ -0,0 +1,159 @@
+"""
+Room Occupancy Module.
+
+Keeps the `occupancy` collection, one document per (room, approved event)
+holding the event's interval, indexed on (room, start, end). Room
+availability and clash checks are index range scans on it instead of
+reading every overlapping event and unioning their locations.
+
+The longest interval ever stored is kept in the counters collection, so an
+overlap query bounds the start from both sides, (start of the slot minus
+that duration, end of the slot), and stays a bounded range scan per room.
+
+The mutations that can change an event's state, rooms or timings call
+syncEventOccupancy after writing the event; scripts/rebuild_occupancy.py
+rebuilds the whole collection from the events.
+
+Attributes:
+    MAX_DURATION_ID (str): _id of the longest interval document in the
+                           counters collection.
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Set
+
+from pymongo import DeleteMany, InsertOne
+
+from db import countersdb, eventsdb, occupancydb
+from mtypes import Event_State_Status
+from utils import eventDateFields
+
+MAX_DURATION_ID = "occupancy_max_duration"
+
+
+def occupancyDocuments(event: dict) -> List[dict]:
+    """
+    Builds the occupancy documents of an event, none if it is not approved.
+
+    Args:
+        event (dict): the event, with at least its status, location and
+                      datetimeperiod
+
+    Returns:
+        (List[dict]): one document per room of the event
+    """
+    if event["status"]["state"] != Event_State_Status.approved.value:
+        return []
+
+    dates = eventDateFields(event["datetimeperiod"])
+    return [
+        {
+            "_id": f"{event['_id']}:{room}",
+            "eventid": event["_id"],
+            "room": room,
+            "start": dates["start_at"],
+            "end": dates["end_at"],
+        }
+        for room in set(event.get("location") or [])
+    ]
+
+
+async def syncEventOccupancy(eventid: str) -> None:
+    """
+    Rewrites the occupancy documents of an event from its current state.
+
+    Errors are logged and swallowed, the mutation that changed the event has
+    already succeeded; a rebuild fixes any drift.
+
+    Args:
+        eventid (str): id of the event
+    """
+    try:
+        event = await eventsdb.find_one(
+            {"_id": eventid},
+            {"status.state": 1, "location": 1, "datetimeperiod": 1},
+        )
+        documents = occupancyDocuments(event) if event is not None else []
+        if documents:
+            await updateMaxDuration(documents)
+        await occupancydb.bulk_write(
+            [DeleteMany({"eventid": eventid})]
+            + [InsertOne(document) for document in documents],
+            ordered=True,
+        )
+    except Exception as e:
+        print(f"Error syncing occupancy of event {eventid}: {e}")
+
+
+async def updateMaxDuration(documents: List[dict]) -> None:
+    """
+    Raises the stored longest interval to cover the given documents, it is
+    never lowered outside of a rebuild.
+
+    Args:
+        documents (List[dict]): occupancy documents
+    """
+    seconds = max(
+        (document["end"] - document["start"]).total_seconds()
+        for document in documents
+    )
+    await countersdb.update_one(
+        {"_id": MAX_DURATION_ID},
+        {"$max": {"seconds": seconds}},
+        upsert=True,
+    )
+
+
+async def _overlapping(start: datetime, end: datetime, touching: bool) -> dict:
+    counter = await countersdb.find_one({"_id": MAX_DURATION_ID})
+    earliest = start - timedelta(seconds=counter["seconds"] if counter else 0)
+    if touching:
+        return {
+            "start": {"$gte": earliest, "$lte": end},
+            "end": {"$gte": start},
+        }
+    return {"start": {"$gte": earliest, "$lt": end}, "end": {"$gt": start}}
+
+
+async def occupiedRooms(
+    start: datetime, end: datetime, rooms: List[str]
+) -> Set[str]:
+    """
+    Returns the rooms with an approved event overlapping the given interval,
+    events that only touch it are counted too.
+
+    Args:
+        start (datetime): start of the interval
+        end (datetime): end of the interval
+        rooms (List[str]): rooms to check
+
+    Returns:
+        (Set[str]): occupied rooms
+    """
+    return set(
+        await occupancydb.distinct(
+            "room",
+            {"room": {"$in": rooms}, **(await _overlapping(start, end, True))},
+        )
+    )
+
+
+async def clashingEventIds(
+    start: datetime, end: datetime, rooms: List[str]
+) -> List[str]:
+    """
+    Returns the ids of approved events in any of the given rooms that
+    overlap the given interval, events that only touch it do not clash.
+
+    Args:
+        start (datetime): start of the interval
+        end (datetime): end of the interval
+        rooms (List[str]): rooms to check
+
+    Returns:
+        (List[str]): ids of the clashing events
+    """
+    return await occupancydb.distinct(
+        "eventid",
+        {"room": {"$in": rooms}, **(await _overlapping(start, end, False))},
+    )
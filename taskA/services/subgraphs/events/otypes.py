@@ -49,6 +49,16 @@ class Context(BaseContext):
         cookies = json.loads(self.request.headers.get("cookies", "{}"))
         return cookies
 
+    @cached_property
+    def loaders(self):
+        """
+        DataLoaders of users, members and clubs for this request.
+        """
+        # imported here as loaders depends on utils, which imports otypes
+        from loaders import Loaders
+
+        return Loaders(self.cookies)
+
 
 Info: TypeAlias = _Info[Context, RootValueType]
 """custom info Type for user metadata"""
@@ -78,6 +88,23 @@ class EventType:
     pass
 
 
+@strawberry.type
+class EventsPageType:
+    """
+    Type for returning a page of the events feed with its cursor.
+
+    Attributes:
+        events (List[otypes.EventType]): Events of the page.
+        endCursor (str | None): Cursor of the last event of the page, passed
+                                as after to fetch the next page.
+        hasNextPage (bool): Whether more events follow this page.
+    """
+
+    events: List[EventType]
+    endCursor: str | None
+    hasNextPage: bool
+
+
 @strawberry.type
 class RoomInfo:
     """
@@ -125,6 +152,82 @@ class BillsStatusType:
     eventReportSubmitted: str
 
 
+@strawberry.type
+class BillsStateCountType:
+    """
+    Type for returning the number of events in a bills state.
+
+    Attributes:
+        state (mtypes.Bills_State_Status): State of the bills.
+        count (int): Number of events in the state.
+    """
+
+    state: Bills_State_Status
+    count: int
+
+
+@strawberry.type
+class ClubBillsTotalsType:
+    """
+    Type for returning the budget totals of a club over a fiscal year.
+
+    Attributes:
+        clubid (str): ID of the club organizing the events.
+        fiscalYear (int): Year in which the fiscal year starts, in April.
+        events (int): Number of events.
+        budget (float): Total budget of the events.
+        amountUsed (float): Total amount used in the events.
+    """
+
+    clubid: str
+    fiscalYear: int
+    events: int
+    budget: float
+    amountUsed: float
+
+
+@strawberry.type
+class BillsSummaryType:
+    """
+    Type for returning the totals of the bills dashboard.
+
+    Attributes:
+        states (List[otypes.BillsStateCountType]): Events per bills state.
+        clubs (List[otypes.ClubBillsTotalsType]): Totals per club and fiscal
+                                                  year.
+    """
+
+    states: List[BillsStateCountType]
+    clubs: List[ClubBillsTotalsType]
+
+
+@strawberry.type
+class ClubFinanceSummaryType:
+    """
+    Type for returning the finance totals of a club over a fiscal year, of
+    its approved events with a budget or sponsors.
+
+    Attributes:
+        clubid (str): ID of the club organizing the events.
+        fiscalYear (int): Year in which the fiscal year starts, in April.
+        events (int): Number of events.
+        budget (float): Total budget of the events.
+        amountUsed (float): Total amount used in the events.
+        sponsor (float): Total amount of the sponsors of the events.
+        bills (List[otypes.BillsStateCountType]): Events per bills state.
+        updatedTime (datetime | None): Time of the last update of the totals.
+    """
+
+    clubid: str
+    fiscalYear: int
+    events: int
+    budget: float
+    amountUsed: float
+    sponsor: float
+    bills: List[BillsStateCountType]
+    updatedTime: datetime | None
+
+
 @strawberry.type
 class CSVResponse:
     """
@@ -0,0 +1,328 @@
+"""
+Mail Outbox Module.
+
+Mutations do not send their mails themselves, they queue them in the
+`mail_outbox` collection right after their write and return. A background
+worker, started with the application, drains the outbox in batches and
+sends the mails with the bot cookie.
+
+A mail that fails is retried with an exponential backoff, up to
+MAIL_MAX_ATTEMPTS times, and is then left in the `dead` state with its last
+error for an admin to look at. A mail claimed by a worker that stopped
+before finishing it is claimed again once its lock expires, so delivery is
+at least once.
+
+Each mail holds the idempotency key of its content, recipients and the
+caller's key, unique among the mails queued in the last
+MAIL_IDEMPOTENCY_WINDOW seconds, so a retried mutation does not queue the
+same mail twice. The key of an older mail is released when the same mail is
+queued again.
+
+Attributes:
+    MAIL_BATCH_SIZE (int): Mails claimed and sent together by the worker.
+                           Defaults to 20.
+    MAIL_MAX_ATTEMPTS (int): Attempts before a mail is dead-lettered.
+                             Defaults to 8.
+    MAIL_BACKOFF_BASE (float): Seconds before the first retry, doubled on
+                               every attempt. Defaults to 30.
+    MAIL_BACKOFF_MAX (float): Longest wait between two attempts in seconds.
+                              Defaults to 3600.
+    MAIL_LOCK_TIMEOUT (float): Seconds a claimed mail stays locked to its
+                               worker. Defaults to 120.
+    MAIL_POLL_INTERVAL (float): Seconds the idle worker waits before
+                                looking for due retries. Defaults to 10.
+    MAIL_IDEMPOTENCY_WINDOW (int): Seconds within which the same mail is
+                                   queued only once. Defaults to 300.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import uuid
+from datetime import UTC, datetime, timedelta
+from typing import List
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from db import mail_outboxdb
+from mailing import sendMail
+from scheduling import INSTANCE_ID
+from utils import get_bot_cookie
+
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "8"))
+MAIL_BACKOFF_BASE = float(os.getenv("MAIL_BACKOFF_BASE", "30"))
+MAIL_BACKOFF_MAX = float(os.getenv("MAIL_BACKOFF_MAX", "3600"))
+MAIL_LOCK_TIMEOUT = float(os.getenv("MAIL_LOCK_TIMEOUT", "120"))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", "10"))
+MAIL_IDEMPOTENCY_WINDOW = int(os.getenv("MAIL_IDEMPOTENCY_WINDOW", "300"))
+
+# set when a mail is queued by this process, wakes up the idle worker
+_mail_queued = asyncio.Event()
+
+
+def mailIdempotencyKey(
+    key: str,
+    uid: str,
+    subject: str,
+    body: str,
+    toRecipients: List[str],
+    ccRecipients: List[str],
+) -> str:
+    """
+    Builds the idempotency key of a mail, the same for the same mail.
+
+    Args:
+        key (str): the caller's key, e.g. the mutation and the event id
+        uid (str): The user id.
+        subject (str): The subject of the email.
+        body (str): The body of the email.
+        toRecipients (List[str]): The list of to recipients.
+        ccRecipients (List[str]): The list of cc recipients.
+
+    Returns:
+        (str): the idempotency key
+    """
+    content = json.dumps(
+        [
+            key,
+            uid,
+            subject,
+            body,
+            sorted(toRecipients),
+            sorted(ccRecipients),
+        ]
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+async def enqueueMail(
+    uid: str,
+    subject: str,
+    body: str,
+    toRecipients: List[str] = [],
+    ccRecipients: List[str] = [],
+    key: str = "",
+) -> str:
+    """
+    Queues a mail in the outbox, it is sent by the outbox worker. The same
+    mail queued within MAIL_IDEMPOTENCY_WINDOW is not queued again.
+
+    Args:
+        uid (str): The user id.
+        subject (str): The subject of the email.
+        body (str): The body of the email.
+        toRecipients (List[str]): The list of to recipients.
+        ccRecipients (List[str]): The list of cc recipients.
+        key (str): the caller's part of the idempotency key. Defaults to "".
+
+    Returns:
+        (str): id of the queued mail
+    """
+    dedupe_key = mailIdempotencyKey(
+        key, uid, subject, body, toRecipients, ccRecipients
+    )
+    now = datetime.now(UTC)
+    window_start = now - timedelta(seconds=MAIL_IDEMPOTENCY_WINDOW)
+    mail = {
+        "_id": uuid.uuid4().hex,
+        "dedupe_key": dedupe_key,
+        "key": key,
+        "uid": uid,
+        "subject": subject,
+        "body": body,
+        "toRecipients": list(toRecipients),
+        "ccRecipients": list(ccRecipients),
+        "status": "pending",
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now,
+    }
+    while True:
+        try:
+            await mail_outboxdb.insert_one(mail)
+            break
+        except DuplicateKeyError:
+            queued = await mail_outboxdb.find_one(
+                {
+                    "dedupe_key": dedupe_key,
+                    "created_at": {"$gte": window_start},
+                },
+                {"_id": 1},
+            )
+            if queued is not None:
+                # already queued by a previous attempt of the same request
+                return queued["_id"]
+            # the same mail queued before the window, release its key
+            await mail_outboxdb.update_one(
+                {
+                    "dedupe_key": dedupe_key,
+                    "created_at": {"$lt": window_start},
+                },
+                {"$unset": {"dedupe_key": ""}},
+            )
+    _mail_queued.set()
+    return mail["_id"]
+
+
+def retryDelay(attempts: int) -> float:
+    """
+    Seconds to wait before the next attempt of a mail, exponential with
+    jitter.
+
+    Args:
+        attempts (int): attempts made so far
+
+    Returns:
+        (float): the delay
+    """
+    delay = min(MAIL_BACKOFF_BASE * 2 ** (attempts - 1), MAIL_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1)
+
+
+async def claimMails(limit: int = MAIL_BATCH_SIZE) -> List[dict]:
+    """
+    Locks up to limit due mails to this worker, mails whose worker stopped
+    included.
+
+    Args:
+        limit (int): maximum number of mails. Defaults to MAIL_BATCH_SIZE.
+
+    Returns:
+        (List[dict]): the claimed mails
+    """
+    mails = []
+    while len(mails) < limit:
+        now = datetime.now(UTC)
+        mail = await mail_outboxdb.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "sending", "locked_until": {"$lte": now}},
+                ]
+            },
+            {
+                "$set": {
+                    "status": "sending",
+                    "owner": INSTANCE_ID,
+                    "locked_until": now + timedelta(seconds=MAIL_LOCK_TIMEOUT),
+                }
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if mail is None:
+            break
+        mails.append(mail)
+    return mails
+
+
+async def _deliver(mail: dict, cookies: dict | None, error: str | None) -> str:
+    if error is None:
+        try:
+            await sendMail(
+                mail["uid"],
+                mail["subject"],
+                mail["body"],
+                cookies=cookies,
+                toRecipients=mail["toRecipients"],
+                ccRecipients=mail["ccRecipients"],
+            )
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+    now = datetime.now(UTC)
+    owned = {"_id": mail["_id"], "owner": INSTANCE_ID, "status": "sending"}
+
+    if error is None:
+        await mail_outboxdb.update_one(
+            owned,
+            {
+                "$set": {"status": "sent", "sent_at": now},
+                "$inc": {"attempts": 1},
+                "$unset": {"locked_until": ""},
+            },
+        )
+        return "sent"
+
+    attempts = mail.get("attempts", 0) + 1
+    if attempts >= MAIL_MAX_ATTEMPTS:
+        status = "dead"
+        update = {"status": status, "dead_at": now, "last_error": error}
+        print(f"Mail {mail['_id']} dead-lettered: {error}")
+    else:
+        status = "pending"
+        update = {
+            "status": status,
+            "last_error": error,
+            "next_attempt_at": now + timedelta(seconds=retryDelay(attempts)),
+        }
+    await mail_outboxdb.update_one(
+        owned,
+        {
+            "$set": update,
+            "$inc": {"attempts": 1},
+            "$unset": {"locked_until": ""},
+        },
+    )
+    return "dead" if status == "dead" else "retried"
+
+
+async def drainOutbox() -> dict:
+    """
+    Sends one batch of due mails.
+
+    Returns:
+        (dict): number of mails sent, retried later and dead-lettered
+    """
+    summary = {"sent": 0, "retried": 0, "dead": 0}
+    mails = await claimMails()
+    if not mails:
+        return summary
+
+    cookies, error = None, None
+    try:
+        cookies = await get_bot_cookie()
+    except Exception as e:
+        error = f"Could not get the bot cookie: {e}"
+
+    results = await asyncio.gather(
+        *(_deliver(mail, cookies, error) for mail in mails),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            # the mail stays locked and is claimed again once expired
+            print(f"Error updating the mail outbox: {result}")
+        else:
+            summary[result] += 1
+    return summary
+
+
+async def runOutboxWorker() -> None:
+    """
+    Drains the outbox until cancelled, sleeping while nothing is due.
+    """
+    while True:
+        try:
+            summary = await drainOutbox()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Mail outbox worker error: {e}")
+            summary = None
+
+        if summary and any(summary.values()):
+            # there may be more due mails
+            continue
+
+        _mail_queued.clear()
+        try:
+            await asyncio.wait_for(
+                _mail_queued.wait(), timeout=MAIL_POLL_INTERVAL
+            )
+        except asyncio.TimeoutError:
+            pass
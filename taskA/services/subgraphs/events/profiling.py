@@ -0,0 +1,118 @@
+"""
+Mutation Profiling Module.
+
+The state transition mutations run in phases: load the event, compute the
+transition, prefetch the remote data it needs concurrently, write, compose
+the mails and dispatch them. PhaseTimer measures each phase; the breakdown
+is logged when PHASE_TIMINGS is enabled and returned in the `extensions`
+of the GraphQL response in debug mode.
+
+Attributes:
+    PHASE_TIMINGS (bool): Whether to log the phase timings of the mutations.
+                          Defaults to False.
+    PREFETCH_TIMEOUT (float): Seconds the prefetch phase of a mutation may
+                              take, shared by all its calls. Defaults to 10.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Dict, List
+
+from strawberry.extensions import SchemaExtension
+
+PHASE_TIMINGS = os.getenv("PHASE_TIMINGS", "False").lower() in (
+    "true",
+    "1",
+    "t",
+)
+PREFETCH_TIMEOUT = float(os.getenv("PREFETCH_TIMEOUT", "10"))
+
+
+class PhaseTimer:
+    """
+    Measures the phases of a mutation, in milliseconds. A phase ends with a
+    call to lap and the next one starts right away.
+    """
+
+    def __init__(self, name: str, info=None):
+        self.name = name
+        self.phases: Dict[str, float] = {}
+        self._context = info.context if info is not None else None
+        self._started = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        """
+        Ends a phase.
+
+        Args:
+            phase (str): name of the phase.
+        """
+        now = time.perf_counter()
+        elapsed = (now - self._started) * 1000
+        self.phases[phase] = round(self.phases.get(phase, 0) + elapsed, 3)
+        self._started = now
+        self._publish()
+
+    def _publish(self) -> None:
+        # phases recorded so far are kept even if a later phase raises
+        if self._context is not None:
+            timings = getattr(self._context, "phase_timings", None)
+            if timings is None:
+                timings = {}
+                self._context.phase_timings = timings
+            timings[self.name] = dict(self.phases)
+
+    def log(self, subject: str = "") -> None:
+        """
+        Logs the phase breakdown if PHASE_TIMINGS is enabled.
+
+        Args:
+            subject (str): what the mutation worked on, e.g. the event id.
+                           Defaults to "".
+        """
+        if not PHASE_TIMINGS:
+            return
+        breakdown = ", ".join(
+            f"{name}={elapsed}ms" for name, elapsed in self.phases.items()
+        )
+        print(f"{self.name} {subject}: {breakdown}")
+
+
+async def prefetch(
+    *calls: Awaitable[Any], timeout: float = PREFETCH_TIMEOUT
+) -> List[Any]:
+    """
+    Runs independent remote calls concurrently under one shared timeout.
+
+    Args:
+        *calls (Awaitable[Any]): the calls
+        timeout (float): seconds for all of them. Defaults to
+                         PREFETCH_TIMEOUT.
+
+    Returns:
+        (List[Any]): their results, in order
+
+    Raises:
+        Exception: Timed out fetching the details needed for this action.
+    """
+    try:
+        return await asyncio.wait_for(asyncio.gather(*calls), timeout)
+    except asyncio.TimeoutError:
+        raise Exception(
+            "Timed out fetching the details needed for this action."
+        )
+
+
+class PhaseTimingsExtension(SchemaExtension):
+    """
+    Adds the phase timings of the mutations that ran to the `extensions` of
+    the response, used in debug mode only.
+    """
+
+    def get_results(self) -> Dict[str, Any]:
+        context = self.execution_context.context
+        timings = getattr(context, "phase_timings", None)
+        if not timings:
+            return {}
+        return {"phaseTimings": timings}
@@ -0,0 +1,207 @@
+"""
+Projection Module.
+
+Builds MongoDB projections from the fields selected in a GraphQL query, so
+list resolvers only read the fields the client asked for, and builds
+EventType objects from those partial documents without a full pydantic
+validation of every event.
+
+Attributes:
+    EVENT_STORED_FIELDS (dict): stored fields needed to resolve an EventType
+                                field, by python field name, when they
+                                differ from the field itself.
+"""
+
+import dataclasses
+from datetime import datetime
+from typing import Dict, Iterable, List, Sequence, Set
+
+from strawberry.types.nodes import SelectedField
+
+from models import Event
+from mtypes import Bills_Status, BudgetType, Event_Status, SponsorType
+from otypes import EventType, Info
+
+EVENT_STORED_FIELDS: Dict[str, List[str]] = {
+    "id": ["_id"],
+}
+
+
+def _selectionNames(selections: Iterable) -> Set[str] | None:
+    names: Set[str] = set()
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            names.add(selection.name)
+        else:
+            # fragment spreads and inline fragments
+            inner = _selectionNames(selection.selections)
+            if inner is None:
+                return None
+            names |= inner
+    return names
+
+
+def selectedFieldNames(
+    info: Info, type_, path: Sequence[str] = ()
+) -> Set[str] | None:
+    """
+    Returns the python names of the fields of a type selected by the query.
+
+    Args:
+        info (otypes.Info): The info of the resolver.
+        type_ (type): The strawberry type returned by the resolver, or found
+                      at path.
+        path (Sequence[str]): GraphQL names of the fields leading from the
+                              resolver's field to the type. Defaults to ().
+
+    Returns:
+        (Set[str] | None): The selected fields, None if they could not be
+                           determined.
+    """
+    if not info.selected_fields:
+        return None
+
+    selections = info.selected_fields[0].selections
+    for name in path:
+        for selection in selections:
+            if isinstance(selection, SelectedField) and selection.name == name:
+                selections = selection.selections
+                break
+        else:
+            return None
+
+    graphql_names = _selectionNames(selections)
+    if graphql_names is None:
+        return None
+
+    name_converter = info.schema.config.name_converter
+    python_names = {
+        name_converter.get_graphql_name(field): field.python_name
+        for field in type_.__strawberry_definition__.fields
+    }
+    # __typename and unknown fields need nothing from the database
+    return {
+        python_names[name] for name in graphql_names if name in python_names
+    }
+
+
+def selectionProjection(
+    info: Info,
+    type_,
+    stored_fields: Dict[str, List[str]],
+    path: Sequence[str] = (),
+) -> dict | None:
+    """
+    Builds the inclusion projection of the stored fields needed to resolve
+    the selected fields of a type.
+
+    Args:
+        info (otypes.Info): The info of the resolver.
+        type_ (type): The strawberry type returned by the resolver, or found
+                      at path.
+        stored_fields (Dict[str, List[str]]): The stored fields of a field,
+                                              when they differ from the
+                                              field itself.
+        path (Sequence[str]): GraphQL names of the fields leading from the
+                              resolver's field to the type. Defaults to ().
+
+    Returns:
+        (dict | None): The projection, None to read whole documents.
+    """
+    fields = selectedFieldNames(info, type_, path)
+    if fields is None:
+        return None
+
+    projection = {"_id": 1}
+    for field in fields:
+        for stored_field in stored_fields.get(field, [field]):
+            projection[stored_field] = 1
+    return projection
+
+
+def eventProjection(info: Info, path: Sequence[str] = ()) -> dict | None:
+    """
+    Builds the projection of the event fields selected by the query.
+
+    Args:
+        info (otypes.Info): The info of the resolver.
+        path (Sequence[str]): GraphQL names of the fields leading to the
+                              events. Defaults to ().
+
+    Returns:
+        (dict | None): The projection, None to read whole documents.
+    """
+    return selectionProjection(info, EventType, EVENT_STORED_FIELDS, path)
+
+
+def _dataclassFromDocument(cls, value: dict | None):
+    if value is None:
+        return None
+    names = {field.name for field in dataclasses.fields(cls)}
+    return cls(**{key: item for key, item in value.items() if key in names})
+
+
+def _datetimeperiod(value) -> tuple:
+    return tuple(
+        datetime.fromisoformat(item) if isinstance(item, str) else item
+        for item in value
+    )
+
+
+# converters of the stored values of nested types, other fields are served
+# as stored
+_EVENT_CONVERTERS = {
+    "datetimeperiod": _datetimeperiod,
+    "status": lambda value: _dataclassFromDocument(Event_Status, value),
+    "bills_status": lambda value: _dataclassFromDocument(Bills_Status, value),
+    "budget": lambda value: [
+        _dataclassFromDocument(BudgetType, item) for item in value
+    ],
+    "sponsor": lambda value: [
+        _dataclassFromDocument(SponsorType, item) for item in value
+    ],
+}
+
+_EVENT_FIELDS = dataclasses.fields(EventType)
+
+
+def eventTypeFromDocument(event: dict, projection: dict | None) -> EventType:
+    """
+    Builds an EventType from a stored event.
+
+    Documents read with a projection are converted field by field without
+    validation, fields that were not read are left unset and must not be
+    resolved. Whole documents, or documents that can not be converted, go
+    through the full validation of the Event model.
+
+    Args:
+        event (dict): The stored event.
+        projection (dict | None): The projection the event was read with.
+
+    Returns:
+        (otypes.EventType): The event.
+    """
+    if projection is None:
+        return EventType.from_pydantic(Event.model_validate(event))
+
+    try:
+        values = {}
+        for field in _EVENT_FIELDS:
+            key = "_id" if field.name == "id" else field.name
+            if key in event:
+                value = event[key]
+                converter = _EVENT_CONVERTERS.get(field.name)
+                values[field.name] = (
+                    converter(value)
+                    if converter and value is not None
+                    else value
+                )
+            elif field.default is not dataclasses.MISSING:
+                values[field.name] = field.default
+            elif field.default_factory is not dataclasses.MISSING:
+                values[field.name] = field.default_factory()
+            else:
+                values[field.name] = None
+        return EventType(**values)
+    except (TypeError, ValueError):
+        return EventType.from_pydantic(Event.model_validate(event))
@@ -1,21 +1,21 @@
-import csv
-import io
-from typing import Any, List
+from datetime import datetime
+from typing import Any, List, Tuple
 
 import strawberry
 
 from db import eventsdb
+from exports import iterEventsCSV, prepareEventsExport
 
 # import all models and types
 from models import Event
 from mtypes import (
-    Event_Full_Location,
-    Event_Full_State_Status,
     Event_Location,
     Event_State_Status,
 )
+from occupancy import clashingEventIds, occupiedRooms
 from otypes import (
     CSVResponse,
+    EventsPageType,
     EventType,
     Info,
     InputDataReportDetails,
@@ -23,7 +23,17 @@ from otypes import (
     RoomListType,
     timelot_type,
 )
-from utils import eventsWithSorting, getClubs, trim_public_events
+from projections import eventProjection, eventTypeFromDocument
+from response_cache import cacheKey, events_cache
+from utils import (
+    eventDateFields,
+    eventsPageWithSorting,
+    eventsWithSorting,
+    getClubs,
+    publicEventsProjection,
+    toUTCDatetime,
+    trim_public_events,
+)
 
 
 @strawberry.field
@@ -31,8 +41,11 @@ async def event(eventid: str, info: Info) -> EventType:
     """
     Fetches an event with the given id
 
-    It runs the trim_public_events function to trim of sensitive information
-    from the event if for public view.
+    For public view the sensitive information of the event is not read from
+    the database, see the publicEventsProjection function. A club viewing
+    another club's event gets it trimmed by trim_public_events.
+
+    Public reads are served from the events response cache.
 
     Args:
         eventid (str): The id of the event to be fetched.
@@ -51,9 +64,19 @@ async def event(eventid: str, info: Info) -> EventType:
         "role" : "cc",
         "uid" : "idk"
     }
-    event = await eventsdb.find_one({"_id": eventid})
+    # viewers with no role never see the hidden fields, they are not read
+    public = user is None or user["role"] not in ["club", "cc", "slc", "slo"]
+    if public:
+        event = await events_cache.cached(
+            cacheKey("event", eventid),
+            lambda: eventsdb.find_one(
+                {"_id": eventid}, publicEventsProjection()
+            ),
+        )
+    else:
+        event = await eventsdb.find_one({"_id": eventid})
 
-    allclubs = await getClubs(info.context.cookies)
+    allclubs = await getClubs(info.context.cookies, user)
     list_allclubs = list()
     for club in allclubs:
         list_allclubs.append(club["cid"])
@@ -88,16 +111,12 @@ async def event(eventid: str, info: Info) -> EventType:
             "Can not access event. Either it does not exist or user does not have perms."  # noqa: E501
         )
 
-    if (
-        user is None
-        or user["role"] not in ["club", "cc", "slc", "slo"]
-        or (
-            user["role"] == "club"
-            and user["uid"] != event["clubid"]
-            and (
-                event.get("collabclubs", None) is None
-                or user["uid"] not in event["collabclubs"]
-            )
+    if not public and (
+        user["role"] == "club"
+        and user["uid"] != event["clubid"]
+        and (
+            event.get("collabclubs", None) is None
+            or user["uid"] not in event["collabclubs"]
         )
     ):
         trim_public_events(event)
@@ -108,7 +127,8 @@ async def event(eventid: str, info: Info) -> EventType:
 @strawberry.field
 async def eventid(code: str, info: Info) -> str:
     """
-    method returns eventid of the event with the given event code
+    method returns eventid of the event with the given event code, served
+    from the events response cache
 
     Args:
         code (str): The code of the event to be fetched.
@@ -121,7 +141,10 @@ async def eventid(code: str, info: Info) -> str:
         Exception: Event with given code does not exist.
     """
 
-    event = await eventsdb.find_one({"code": code})
+    event = await events_cache.cached(
+        cacheKey("eventid", code),
+        lambda: eventsdb.find_one({"code": code}, {"_id": 1}),
+    )
 
     if event is None:
         raise Exception("Event with given code does not exist.")
@@ -129,78 +152,48 @@ async def eventid(code: str, info: Info) -> str:
     return event["_id"]
 
 
-@strawberry.field
-async def events(
+async def eventsSearchSpace(
     info: Info,
+    user: dict | None,
     clubid: str | None = None,
-    name: str | None = None,
     public: bool | None = None,
     paginationOn: bool = False,
     limit: int | None = None,
-    skip: int = 0,
     timings: timelot_type | None = None,
     pastEventsLimit: int | None = None,
     location: List[Event_Location] | None = None,
-) -> List[EventType]:
+) -> Tuple[dict, bool, List[datetime] | None, int | None]:
     """
-    Returns a list of events as a search result that match the given criteria.
-
-    If public is set to True, then only public/approved events are returned.
-
-    If clubid is set, then only events of that club are returned.
-
-    If clubid is not set, then all events the user is authorized to see are
-    returned.
-
-    A non-logged in user has same visibility as public set to True.
-
-    If public set to True, then few fields of the event are hidden using the
-    trim_public_events function.
-
-    For public queries, either paginationOn must be True or pastEventsLimit
-    must be set. If paginationOn is True, then limit must be set.
-    If paginationOn is False, limit is None and pastEventsLimit is None, then
-    pastEventsLimit is set to 4 months for public users and users with no
-    special roles.
+    Builds the search space of the events feed for the given user, shared by
+    the events and eventsPage queries.
 
     Args:
         info (otypes.Info): The context information of user for the request.
+        user (dict | None): The user making the request.
         clubid (str | None): The id of the club whose events are to be
                              fetched. Defaults to None.
-        name (str | None): The name of the event to be searched according to.
-                           Defaults to None.
         public (bool | None): Whether to return only public events. Defaults
                               to None.
         paginationOn (bool): Whether to use pagination. Defaults to False.
         limit (int | None): The maximum number of events to return. Defaults
-                            to None. Must be set if paginationOn is True.
-        skip (int): The number of events to skip. Defaults to 0. Value lt
-                    0 returns all upcoming and current events, while
-                    value ge 0 skips that many events. Ignored if
-                    paginationOn is False.
+                            to None.
         timings (otypes.timelot_type | None): The time period for which the
                                               events are to be fetched.
                                               Defaults to None.
+        pastEventsLimit (int | None): Time Limit for the past events to
+                                      be fetched in months. Defaults to None.
         location (List[mtypes.Event_Location] | None): The locations of the
                                                        events to be fetched.
                                                        Defaults to None.
-        pastEventsLimit (int | None): Time Limit for the past events to
-                                      be fetched in months. Defaults to None.
 
     Returns:
-        (List[otypes.EventType]): A list of events that match the given
-                                  criteria.
+        (Tuple[dict, bool, List[datetime] | None, int | None]): The search
+            space, whether the access is restricted, the timings in UTC and
+            the past events limit.
 
     Raises:
         Exception: Pagination limit is required.
     """
-
-    # user = info.context.user
-    user = {
-        "role" : "cc",
-        "uid" : "idk"
-    }
-
     restrictAccess = True
     restrictFullAccess = True
     sloAccess = False
@@ -242,7 +235,7 @@ async def events(
             {"collabclubs": {"$in": [clubid]}},
         ]
     else:
-        allclubs = await getClubs(info.context.cookies)
+        allclubs = await getClubs(info.context.cookies, user)
         list_allclubs = list()
         for club in allclubs:
             list_allclubs.append(club["cid"])
@@ -276,33 +269,264 @@ async def events(
     if location is not None:
         searchspace["location"] = {"$in": location}
 
-    timings_str: List[str] | None = None
+    timings_utc: List[datetime] | None = None
     if timings is not None:
-        timings_str = [
-            timings[0].strftime("%Y-%m-%dT%H:%M:%S+00:00"),
-            timings[1].strftime("%Y-%m-%dT%H:%M:%S+00:00"),
-        ]
+        # the instants of the bounds, whatever the offset they were given in
+        timings_utc = [toUTCDatetime(timings[0]), toUTCDatetime(timings[1])]
 
-    events = await eventsWithSorting(
-        searchspace,
-        date_filter=False,
-        pagination=paginationOn,
-        name=name,
-        skip=skip,
-        limit=limit,
-        timings=timings_str,
-        pastEventsLimit=pastEventsLimit,
+    return searchspace, restrictAccess, timings_utc, pastEventsLimit
+
+
+@strawberry.field
+async def events(
+    info: Info,
+    clubid: str | None = None,
+    name: str | None = None,
+    public: bool | None = None,
+    paginationOn: bool = False,
+    limit: int | None = None,
+    skip: int = 0,
+    timings: timelot_type | None = None,
+    pastEventsLimit: int | None = None,
+    location: List[Event_Location] | None = None,
+) -> List[EventType]:
+    """
+    Returns a list of events as a search result that match the given criteria.
+
+    If public is set to True, then only public/approved events are returned.
+
+    If clubid is set, then only events of that club are returned.
+
+    If clubid is not set, then all events the user is authorized to see are
+    returned.
+
+    A non-logged in user has same visibility as public set to True.
+
+    If public set to True, then few fields of the event are not read from the
+    database, see the publicEventsProjection function.
+
+    Public results are served from the events response cache, keyed by the
+    resolved search space and the selected fields.
+
+    For public queries, either paginationOn must be True or pastEventsLimit
+    must be set. If paginationOn is True, then limit must be set.
+    If paginationOn is False, limit is None and pastEventsLimit is None, then
+    pastEventsLimit is set to 4 months for public users and users with no
+    special roles.
+
+    Args:
+        info (otypes.Info): The context information of user for the request.
+        clubid (str | None): The id of the club whose events are to be
+                             fetched. Defaults to None.
+        name (str | None): The name of the event to be searched according to.
+                           Defaults to None.
+        public (bool | None): Whether to return only public events. Defaults
+                              to None.
+        paginationOn (bool): Whether to use pagination. Defaults to False.
+        limit (int | None): The maximum number of events to return. Defaults
+                            to None. Must be set if paginationOn is True.
+        skip (int): The number of events to skip. Defaults to 0. Value lt
+                    0 returns all upcoming and current events, while
+                    value ge 0 skips that many events. Ignored if
+                    paginationOn is False.
+        timings (otypes.timelot_type | None): The time period for which the
+                                              events are to be fetched.
+                                              Defaults to None.
+        location (List[mtypes.Event_Location] | None): The locations of the
+                                                       events to be fetched.
+                                                       Defaults to None.
+        pastEventsLimit (int | None): Time Limit for the past events to
+                                      be fetched in months. Defaults to None.
+
+    Returns:
+        (List[otypes.EventType]): A list of events that match the given
+                                  criteria.
+
+    Raises:
+        Exception: Pagination limit is required.
+    """
+
+    # user = info.context.user
+    user = {
+        "role" : "cc",
+        "uid" : "idk"
+    }
+
+    searchspace, restrictAccess, timings_utc, pastEventsLimit = (
+        await eventsSearchSpace(
+            info,
+            user,
+            clubid=clubid,
+            public=public,
+            paginationOn=paginationOn,
+            limit=limit,
+            timings=timings,
+            pastEventsLimit=pastEventsLimit,
+            location=location,
+        )
     )
 
-    # hides few fields from public viewers
-    if restrictAccess or public:
-        for event in events:
-            trim_public_events(event)
+    # only read the selected fields
+    projection = eventProjection(info)
+
+    async def fetchEvents() -> List[dict]:
+        return await eventsWithSorting(
+            searchspace,
+            date_filter=False,
+            pagination=paginationOn,
+            name=name,
+            skip=skip,
+            limit=limit,
+            timings=timings_utc,
+            pastEventsLimit=pastEventsLimit,
+            projection=projection,
+            # hides few fields from public viewers
+            public=bool(restrictAccess or public),
+        )
 
-    return [
-        EventType.from_pydantic(Event.model_validate(event))
-        for event in events
-    ]
+    if restrictAccess:
+        # the same for every public viewer
+        events = await events_cache.cached(
+            cacheKey(
+                "events",
+                searchspace,
+                paginationOn,
+                name,
+                skip,
+                limit,
+                timings_utc,
+                pastEventsLimit,
+                projection,
+            ),
+            fetchEvents,
+        )
+    else:
+        events = await fetchEvents()
+
+    return [eventTypeFromDocument(event, projection) for event in events]
+
+
+@strawberry.field
+async def eventsPage(
+    info: Info,
+    limit: int,
+    clubid: str | None = None,
+    name: str | None = None,
+    public: bool | None = None,
+    skip: int = 0,
+    after: str | None = None,
+    timings: timelot_type | None = None,
+    pastEventsLimit: int | None = None,
+    location: List[Event_Location] | None = None,
+) -> EventsPageType:
+    """
+    Returns one page of the events feed, same criteria as the paginated
+    events query.
+
+    Past events are paged with an opaque cursor on their end time and id,
+    pass the endCursor of a page as after to fetch the next one. The cost of
+    a page does not depend on its depth and pages do not shift when events
+    are added. A skip lt 0 returns all upcoming and current events, as in
+    the events query.
+
+    Public pages are served from the events response cache, as in the events
+    query.
+
+    Args:
+        info (otypes.Info): The context information of user for the request.
+        limit (int): The maximum number of events to return.
+        clubid (str | None): The id of the club whose events are to be
+                             fetched. Defaults to None.
+        name (str | None): The name of the event to be searched according to.
+                           Defaults to None.
+        public (bool | None): Whether to return only public events. Defaults
+                              to None.
+        skip (int): The number of events to skip, ignored if after is set.
+                    Defaults to 0.
+        after (str | None): The endCursor of the previous page. Defaults to
+                            None.
+        timings (otypes.timelot_type | None): The time period for which the
+                                              events are to be fetched.
+                                              Defaults to None.
+        pastEventsLimit (int | None): Time Limit for the past events to
+                                      be fetched in months. Defaults to None.
+        location (List[mtypes.Event_Location] | None): The locations of the
+                                                       events to be fetched.
+                                                       Defaults to None.
+
+    Returns:
+        (otypes.EventsPageType): The events of the page with its cursor.
+
+    Raises:
+        Exception: Pagination limit is required.
+        Exception: Invalid cursor.
+    """
+
+    user = info.context.user
+
+    searchspace, restrictAccess, timings_utc, pastEventsLimit = (
+        await eventsSearchSpace(
+            info,
+            user,
+            clubid=clubid,
+            public=public,
+            paginationOn=True,
+            limit=limit,
+            timings=timings,
+            pastEventsLimit=pastEventsLimit,
+            location=location,
+        )
+    )
+
+    # only read the selected fields
+    projection = eventProjection(info, path=["events"])
+
+    async def fetchPage() -> list:
+        return list(
+            await eventsPageWithSorting(
+                searchspace,
+                name=name,
+                skip=skip,
+                limit=limit,
+                after=after,
+                timings=timings_utc,
+                pastEventsLimit=pastEventsLimit,
+                projection=projection,
+                # hides few fields from public viewers
+                public=bool(restrictAccess or public),
+            )
+        )
+
+    try:
+        if restrictAccess:
+            # the same for every public viewer
+            page = await events_cache.cached(
+                cacheKey(
+                    "eventsPage",
+                    searchspace,
+                    name,
+                    skip,
+                    limit,
+                    after,
+                    timings_utc,
+                    pastEventsLimit,
+                    projection,
+                ),
+                fetchPage,
+            )
+        else:
+            page = await fetchPage()
+    except ValueError as e:
+        raise Exception(str(e))
+    events, endCursor, hasNextPage = page
+
+    return EventsPageType(
+        events=[
+            eventTypeFromDocument(event, projection) for event in events
+        ],
+        endCursor=endCursor,
+        hasNextPage=hasNextPage,
+    )
 
 
 @strawberry.field
@@ -352,16 +576,30 @@ async def clashingEvents(
         event["location"] = [
             loc for loc in event["location"] if loc != "other"
         ]
-        searchspace["location"] = {"$in": event["location"]}
+        # clashes in the same rooms come from the occupancy index, only
+        # those events are then read and sorted
+        dates = eventDateFields(event["datetimeperiod"])
+        searchspace["_id"] = {
+            "$in": await clashingEventIds(
+                dates["start_at"], dates["end_at"], event["location"]
+            )
+        }
+        timings = None
+    else:
+        timings = event["datetimeperiod"]
+
+    # only read the selected fields
+    projection = eventProjection(info)
 
     events = await eventsWithSorting(
         searchspace,
         date_filter=False,
-        timings=event["datetimeperiod"],
+        timings=timings,
+        projection=projection,
     )
 
     return [
-        EventType.from_pydantic(Event.model_validate(event))
+        eventTypeFromDocument(event, projection)
         for event in events
         if event["_id"] != id
     ]
@@ -393,6 +631,9 @@ async def incompleteEvents(clubid: str, info: Info) -> List[EventType]:
     if not user or user["role"] != "club" or user["uid"] != clubid:
         raise Exception("You do not have permission to access this resource.")
 
+    # only read the selected fields
+    projection = eventProjection(info)
+
     events = (
         await eventsdb.find(
             {
@@ -401,16 +642,14 @@ async def incompleteEvents(clubid: str, info: Info) -> List[EventType]:
                     {"collabclubs": {"$in": [clubid]}},
                 ],
                 "status.state": Event_State_Status.incomplete.value,
-            }
+            },
+            projection,
         )
-        .sort("datetimeperiod.0", 1)
+        .sort("start_at", 1)
         .to_list(length=None)
     )
 
-    return [
-        EventType.from_pydantic(Event.model_validate(event))
-        for event in events
-    ]
+    return [eventTypeFromDocument(event, projection) for event in events]
 
 
 # @strawberry.field
@@ -533,16 +772,16 @@ async def pendingEvents(clubid: str | None, info: Info) -> List[EventType]:
                 },
             ]
 
+    # only read the selected fields
+    projection = eventProjection(info)
+
     events = (
-        await eventsdb.find(searchspace)
-        .sort("datetimeperiod.0", 1)
+        await eventsdb.find(searchspace, projection)
+        .sort("start_at", 1)
         .to_list(length=None)
     )
 
-    return [
-        EventType.from_pydantic(Event.model_validate(event))
-        for event in events
-    ]
+    return [eventTypeFromDocument(event, projection) for event in events]
 
 
 @strawberry.field
@@ -576,33 +815,22 @@ async def availableRooms(
         raise Exception("You do not have permission to access this resource.")
 
     assert timeslot[0] < timeslot[1], "Invalid timeslot"
-    timeslot_str = [
-        timeslot[0].strftime("%Y-%m-%dT%H:%M:%S+00:00"),
-        timeslot[1].strftime("%Y-%m-%dT%H:%M:%S+00:00"),
-    ]
+    timeslot_start, timeslot_end = (
+        toUTCDatetime(timeslot[0]),
+        toUTCDatetime(timeslot[1]),
+    )
 
-    approved_events = await eventsdb.find(
-        {
-            "status.state": Event_State_Status.approved.value,
-            "datetimeperiod.0": {"$lte": timeslot_str[1]},
-            "datetimeperiod.1": {"$gte": timeslot_str[0]},
-        },
-        {
-            "location": 1,
-        },
-    ).to_list(length=None)
+    all_rooms = list(Event_Location.__members__.values())
 
-    occupied_rooms = set()
-    for approved_event in approved_events:
-        occupied_rooms.update(approved_event["location"])
+    occupied_rooms = await occupiedRooms(
+        timeslot_start, timeslot_end, [room.value for room in all_rooms]
+    )
 
     if eventid is not None:
         event = await eventsdb.find_one({"_id": eventid}, {"location": 1})
         if event is not None:
             occupied_rooms.difference_update(event["location"])
 
-    all_rooms = list(Event_Location.__members__.values())
-
     return RoomListType(
         locations=[
             RoomInfo(
@@ -622,7 +850,8 @@ async def downloadEventsData(
     Returns all the events as a CSVResponse according to the details provided.
 
     This function is similar to the events method, but it returns all the
-    events as a CSVResponse.
+    events as a CSVResponse. Large exports should use the streaming
+    /export/events route instead, see exports.py.
     It sends specific set of events on the basis of the details provided.
     If clubid is provided, it returns all the events of that club.
     If status is provided, it returns all the events with that status.
@@ -649,172 +878,18 @@ async def downloadEventsData(
         "uid" : "idk"
     }
 
-    if user is None:
-        raise Exception("You do not have permission to access this resource.")
-
-    if details.status not in ["pending", "approved", "all"]:
-        raise Exception("Invalid status")
-
-    all_events = list()
-    allclubs = await getClubs(info.context.cookies)
-    searchspace: dict[str, Any] = {}
-
-    if details.clubid:
-        clubid = details.clubid
-        if details.clubid == "allclubs":
-            if user["role"] in ["cc", "slo"]:
-                clubid = None
-            else:
-                clubid = user["uid"]
-        if user is not None:
-            if clubid is not None:
-                searchspace["$or"] = [
-                    {"clubid": clubid},
-                    {"collabclubs": {"$in": [clubid]}},
-                ]
-            else:
-                list_allclubs = [club["cid"] for club in allclubs]
-                searchspace["clubid"] = {"$in": list_allclubs}
-
-            # filter by date
-            if details.dateperiod:
-                datetime_start = details.dateperiod[0].strftime(
-                    "%Y-%m-%dT00:00:00+00:00"
-                )
-                datetime_end = details.dateperiod[1].strftime(
-                    "%Y-%m-%dT23:59:59+00:00"
-                )
-                searchspace["datetimeperiod.0"] = {
-                    "$gte": datetime_start,
-                    "$lte": datetime_end,
-                }
-
-            if (
-                user["role"] not in ["cc", "slo"]
-                or details.status == "approved"
-            ):
-                searchspace["status.state"] = {
-                    "$in": [
-                        Event_State_Status.approved.value,
-                    ]
-                }
-            else:
-                to_exclude = [
-                    Event_State_Status.incomplete.value,
-                ]
-                if details.status == "pending":
-                    to_exclude.append(Event_State_Status.approved.value)
-                if user["role"] == "slo":
-                    to_exclude.append(Event_State_Status.pending_cc.value)
-                else:
-                    to_exclude.append(Event_State_Status.deleted.value)
-                
-                searchspace["status.state"] = {
-                    "$nin": to_exclude,
-                }
-
-            all_events = await eventsWithSorting(searchspace, date_filter=True)
-
-    header_mapping = {
-        "code": "Event Code",
-        "name": "Event Name",
-        "clubid": "Club",
-        "datetimeperiod.0": "StartDate",
-        "datetimeperiod.1": "EndDate",
-        "description": "Description",
-        "audience": "Audience",
-        "population": "Audience Count",
-        "mode": "Mode",
-        "location": "Venue",
-        "budget": "Budget",
-        "poster": "Poster URL",
-        "status": "Status",
-        "equipment": "Equipment",
-        "additional": "Additional Requests",
-        "event_report_submitted": "Event Report Submitted",
-    }
-
-    # Prepare CSV content
-    csv_output = io.StringIO()
-    fieldnames = [
-        header_mapping.get(field.lower(), field)
-        for field in details.fields
-        if field != "status"
-    ]
-
-    if details.status != "approved":
-        fieldnames.append(header_mapping["status"])
-
-    club_names = dict()
-    for club in allclubs:
-        club_names[club["cid"]] = club["name"]
-
-    csv_writer = csv.DictWriter(csv_output, fieldnames=fieldnames)
-    csv_writer.writeheader()
-
-    for event in all_events:
-        event_data = {}
-        for field in details.fields:
-            mapped_field = header_mapping.get(field, field)
-            if mapped_field not in fieldnames:
-                continue
-
-            value = event.get(field)
-
-            if field in ["datetimeperiod.0", "datetimeperiod.1"]:
-                value = event["datetimeperiod"]
-                value = (
-                    value[0].split("T")[0]
-                    if field == "datetimeperiod.0"
-                    else value[1].split("T")[0]
-                )
-            elif field == "clubid":
-                value = club_names.get(value, None)
-
-                collab_clubs = event.get("collabclubs", [])
-                collab_club_names = [value] if value else []
-                for cid in collab_clubs:
-                    club_name = club_names.get(cid, None)
-                    if club_name:
-                        collab_club_names.append(club_name)
-                value = ", ".join(collab_club_names)
-            elif field == "location":
-                value = event.get(field, [])
-                if len(value) >= 1:
-                    value = ", ".join(
-                        getattr(Event_Full_Location, loc)
-                        if loc != "other"
-                        else (event.get("otherLocation") or "other")
-                        for loc in value
-                    )
-            elif field == "budget":
-                if isinstance(value, list):
-                    budget_items = [
-                        f"{item['description']} {'(Advance)' if item['advance'] else ''}: {item['amount']}"  # noqa: E501
-                        for item in value
-                    ]
-                    value = ", ".join(budget_items)
-            elif field == "status":
-                status_value = event.get(field, {})
-                value = status_value.get("state", None)
-
-                if value:
-                    value = getattr(Event_Full_State_Status, value)
-            elif field == "event_report_submitted":
-                if value is None:
-                    value = "No Event Report Required"
-                else:
-                    value = "Yes" if value else "No"
-
-            if value in [None, "", []]:
-                value = "No " + mapped_field
-
-            event_data[mapped_field] = value
-
-        csv_writer.writerow(event_data)
+    searchspace, fieldnames, club_names = await prepareEventsExport(
+        details, user, info.context.cookies
+    )
 
-    csv_content = csv_output.getvalue()
-    csv_output.close()
+    csv_content = "".join(
+        [
+            chunk
+            async for chunk in iterEventsCSV(
+                searchspace, details.fields, fieldnames, club_names
+            )
+        ]
+    )
 
     return CSVResponse(
         csvFile=csv_content,
@@ -827,6 +902,7 @@ async def downloadEventsData(
 queries = [
     event,
     events,
+    eventsPage,
     clashingEvents,
     eventid,
     incompleteEvents,
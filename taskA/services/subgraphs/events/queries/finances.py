@@ -3,9 +3,32 @@ from typing import List
 
 import strawberry
 
-from db import eventsdb
-from mtypes import Bills_Status, Event_State_Status, timezone
-from otypes import BillsStatusType, Info
+from db import eventsdb, finance_rollupsdb
+from finance_rollups import fiscalYear as getFiscalYear
+from finance_rollups import rollupId
+from mtypes import (
+    Bills_State_Status,
+    Bills_Status,
+    Event_State_Status,
+    timezone,
+)
+from otypes import (
+    BillsStateCountType,
+    BillsStatusType,
+    BillsSummaryType,
+    ClubBillsTotalsType,
+    ClubFinanceSummaryType,
+    Info,
+)
+from projections import selectionProjection
+from utils import FISCAL_START_MONTH, toUTCDatetime
+
+# stored fields of the BillsStatusType fields
+BILLS_STATUS_STORED_FIELDS = {
+    "eventid": ["_id"],
+    "eventname": ["name"],
+    "eventReportSubmitted": ["event_report_submitted"],
+}
 
 
 @strawberry.field
@@ -55,9 +78,7 @@ async def eventBills(eventid: str, info: Info) -> Bills_Status:
                   have access to it or it is not approved."
         )
 
-    if event["datetimeperiod"][1] > datetime.now(timezone).strftime(
-        "%Y-%m-%dT%H:%M:%S.%fZ"
-    ):
+    if toUTCDatetime(event["end_at"]) > datetime.now(timezone):
         raise ValueError(f"{event['name']} has not ended yet.")
 
     if (
@@ -73,16 +94,72 @@ async def eventBills(eventid: str, info: Info) -> Bills_Status:
     return Bills_Status(**event["bills_status"])
 
 
+def billsSearchSpace(
+    user: dict, state: Bills_State_Status | None = None
+) -> dict:
+    """
+    Search space of the past approved events with a budget and a bills
+    status, restricted to the events of the club for club users.
+
+    Args:
+        user (dict): The user details.
+        state (mtypes.Bills_State_Status | None): Only the events whose bills
+                                                  are in this state. Defaults
+                                                  to None.
+
+    Returns:
+        (dict): The search space
+    """
+    searchspace = {
+        "status.state": Event_State_Status.approved.value,
+        "end_at": {"$lt": datetime.now(timezone)},
+        "bills_status": {"$exists": True},
+        "budget": {
+            "$exists": True,
+            "$ne": [],
+        },  # Ensure the budget array exists and is not empty
+    }
+    if state is not None:
+        searchspace["bills_status.state"] = state.value
+
+    if user["role"] == "club":
+        searchspace.update(
+            {
+                "$or": [
+                    {"clubid": user["uid"]},
+                    {"collabclubs": {"$in": [user["uid"]]}},
+                ]
+            }
+        )
+    return searchspace
+
+
 @strawberry.field
-async def allEventsBills(info: Info) -> List[BillsStatusType]:
+async def allEventsBills(
+    info: Info,
+    state: Bills_State_Status | None = None,
+    limit: int | None = None,
+    after: str | None = None,
+) -> List[BillsStatusType]:
     """
     Get the bills status of all events
 
     This method is used to fetch the list of bills status of all past
-    approved events that have a budget and bills status.
+    approved events that have a budget and bills status, latest ended first.
+
+    The list is paged by keyset on the end time and id of the events, pass
+    the eventid of the last bills status of a page as after to fetch the
+    next one.
 
     Args:
         info (otypes.Info): The user details
+        state (mtypes.Bills_State_Status | None): Only the events whose bills
+                                                  are in this state. Defaults
+                                                  to None.
+        limit (int | None): The maximum number of bills status to return.
+                            Defaults to None, all of them.
+        after (str | None): The eventid of the last bills status of the
+                            previous page. Defaults to None.
 
     Returns:
         (List[otypes.BillsStatusType]): The list of bills status of all past
@@ -91,6 +168,7 @@ async def allEventsBills(info: Info) -> List[BillsStatusType]:
     Raises:
         ValueError: User not authenticated
         ValueError: User not authorized
+        ValueError: Invalid cursor
         ValueError: No events found
     """
 
@@ -102,47 +180,216 @@ async def allEventsBills(info: Info) -> List[BillsStatusType]:
     if user_role not in ["club", "cc", "slo"]:
         raise ValueError("User not authorized")
 
-    searchspace = {
-        "status.state": Event_State_Status.approved.value,
-        "datetimeperiod.1": {
-            "$lt": datetime.now(timezone).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-        },
-        "bills_status": {"$exists": True},
-        "budget": {
-            "$exists": True,
-            "$ne": [],
-        },  # Ensure the budget array exists and is not empty
-    }
+    searchspace = billsSearchSpace(user, state)
 
-    if user_role == "club":
-        searchspace.update(
+    if after is not None:
+        last = await eventsdb.find_one({"_id": after}, {"end_at": 1})
+        if not last or "end_at" not in last:
+            raise ValueError("Invalid cursor")
+        searchspace["$and"] = [
             {
                 "$or": [
-                    {"clubid": user["uid"]},
-                    {"collabclubs": {"$in": [user["uid"]]}},
+                    {"end_at": {"$lt": last["end_at"]}},
+                    {"end_at": last["end_at"], "_id": {"$lt": after}},
                 ]
             }
-        )
-    events = (
-        await eventsdb.find(searchspace)
-        .sort("datetimeperiod.1", -1)
-        .to_list(length=None)
+        ]
+
+    # only read the selected fields
+    projection = selectionProjection(
+        info, BillsStatusType, BILLS_STATUS_STORED_FIELDS
     )
 
-    if not events or len(events) == 0:
+    cursor = eventsdb.find(searchspace, projection).sort(
+        [("end_at", -1), ("_id", -1)]
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+    events = await cursor.to_list(length=None)
+
+    if after is None and not events:
         raise ValueError("No events found")
 
     return [
         BillsStatusType(
             eventid=event["_id"],
-            eventname=event["name"],
-            clubid=event["clubid"],
-            bills_status=Bills_Status(**event["bills_status"]),
+            eventname=event.get("name"),
+            clubid=event.get("clubid"),
+            bills_status=Bills_Status(**event["bills_status"])
+            if "bills_status" in event
+            else None,
             eventReportSubmitted=event.get("event_report_submitted", "old"),
         )
         for event in events
     ]
 
 
+@strawberry.field
+async def billsSummary(
+    info: Info, state: Bills_State_Status | None = None
+) -> BillsSummaryType:
+    """
+    Get the totals of the bills of all past approved events with a budget
+
+    The number of events per bills state, and the number of events with
+    their total budget and amount used per club and fiscal year, computed by
+    the database.
+
+    Args:
+        info (otypes.Info): The user details
+        state (mtypes.Bills_State_Status | None): Only the events whose bills
+                                                  are in this state. Defaults
+                                                  to None.
+
+    Returns:
+        (otypes.BillsSummaryType): The totals
+
+    Raises:
+        ValueError: User not authenticated
+        ValueError: User not authorized
+    """
+
+    user = info.context.user
+    if not user:
+        raise ValueError("User not authenticated")
+
+    user_role = user["role"]
+    if user_role not in ["club", "cc", "slo"]:
+        raise ValueError("User not authorized")
+
+    start = {"date": "$start_at", "timezone": str(timezone)}
+    pipeline = [
+        {"$match": billsSearchSpace(user, state)},
+        {
+            "$project": {
+                "clubid": 1,
+                "state": "$bills_status.state",
+                "budget": {"$sum": "$budget.amount"},
+                "amount_used": {"$sum": "$budget.amount_used"},
+                # April to March
+                "fiscal_year": {
+                    "$subtract": [
+                        {"$year": start},
+                        {
+                            "$cond": [
+                                {
+                                    "$lt": [
+                                        {"$month": start},
+                                        FISCAL_START_MONTH,
+                                    ]
+                                },
+                                1,
+                                0,
+                            ]
+                        },
+                    ]
+                },
+            }
+        },
+        {
+            "$facet": {
+                "states": [
+                    {"$group": {"_id": "$state", "count": {"$sum": 1}}},
+                    {"$sort": {"_id": 1}},
+                ],
+                "clubs": [
+                    {
+                        "$group": {
+                            "_id": {
+                                "clubid": "$clubid",
+                                "fiscal_year": "$fiscal_year",
+                            },
+                            "events": {"$sum": 1},
+                            "budget": {"$sum": "$budget"},
+                            "amount_used": {"$sum": "$amount_used"},
+                        }
+                    },
+                    {"$sort": {"_id.fiscal_year": -1, "_id.clubid": 1}},
+                ],
+            }
+        },
+    ]
+    cursor = await eventsdb.aggregate(pipeline)
+    summary = (await cursor.to_list(length=None))[0]
+
+    return BillsSummaryType(
+        states=[
+            BillsStateCountType(
+                state=Bills_State_Status(item["_id"]), count=item["count"]
+            )
+            for item in summary["states"]
+        ],
+        clubs=[
+            ClubBillsTotalsType(
+                clubid=item["_id"]["clubid"],
+                fiscalYear=item["_id"]["fiscal_year"],
+                events=item["events"],
+                budget=item["budget"],
+                amountUsed=item["amount_used"],
+            )
+            for item in summary["clubs"]
+        ],
+    )
+
+
+@strawberry.field
+async def clubFinanceSummary(
+    clubid: str, info: Info, fiscalYear: int | None = None
+) -> ClubFinanceSummaryType:
+    """
+    Get the finance totals of a club over a fiscal year
+
+    The totals of the approved events of the club with a budget or sponsors
+    are read from the finance rollups, kept up to date by the mutations, in
+    a single lookup.
+
+    Args:
+        clubid (str): The id of the club
+        info (otypes.Info): The user details
+        fiscalYear (int | None): The year in which the fiscal year starts.
+                                 Defaults to None, the current fiscal year.
+
+    Returns:
+        (otypes.ClubFinanceSummaryType): The totals
+
+    Raises:
+        ValueError: User not authenticated
+        ValueError: User not authorized
+    """
+
+    user = info.context.user
+    if not user:
+        raise ValueError("User not authenticated")
+
+    user_role = user["role"]
+    if user_role not in ["club", "cc", "slo"] or (
+        user_role == "club" and user["uid"] != clubid
+    ):
+        raise ValueError("User not authorized")
+
+    if fiscalYear is None:
+        fiscalYear = getFiscalYear(datetime.now(timezone))
+
+    rollup = (
+        await finance_rollupsdb.find_one({"_id": rollupId(clubid, fiscalYear)})
+        or {}
+    )
+
+    return ClubFinanceSummaryType(
+        clubid=clubid,
+        fiscalYear=fiscalYear,
+        events=rollup.get("events", 0),
+        budget=round(rollup.get("budget", 0), 2),
+        amountUsed=round(rollup.get("amount_used", 0), 2),
+        sponsor=round(rollup.get("sponsor", 0), 2),
+        bills=[
+            BillsStateCountType(state=Bills_State_Status(state), count=count)
+            for state, count in sorted((rollup.get("bills") or {}).items())
+            if count
+        ],
+        updatedTime=rollup.get("updated_at"),
+    )
+
+
 # register all queries for finances
-queries = [eventBills, allEventsBills]
+queries = [eventBills, allEventsBills, billsSummary, clubFinanceSummary]
@@ -0,0 +1,286 @@
+"""
+Response Cache Module.
+
+The public event reads, the events feed, `event` and `eventid`, are the
+same for every visitor of a kind. Their database reads are cached under a
+key built from the normalized query arguments: the resolved search space,
+the projection and the viewer's visibility.
+
+Entries belong to the version of their namespace, a counter kept in the
+`cache_versions` collection. The event mutations bump it right after their
+write, which makes all the entries of the older versions unreachable at
+once.
+A process reads the version again at most every CACHE_VERSION_REFRESH
+seconds, so the bump of another process is seen within that time, the bump
+of the same process immediately. CACHE_TTL bounds the age of an entry
+anyway, for the writes made outside the mutations (scripts, migrations)
+and for the feed whose time window moves.
+
+Entries are kept in an in-process LRU, and when CACHE_SHARED is enabled
+also in the `response_cache` collection, shared by all the instances and
+dropped by a TTL index.
+
+Attributes:
+    CACHE_ENABLED (bool): Whether the reads are cached. Defaults to True.
+    CACHE_SIZE (int): Entries kept in the in-process LRU. Defaults to 1024.
+    CACHE_TTL (float): Seconds an entry is served for. Defaults to 60.
+    CACHE_VERSION_REFRESH (float): Seconds a process trusts the version it
+                                   read last. Defaults to 1.
+    CACHE_SHARED (bool): Whether entries are also shared through Mongo.
+                         Defaults to False.
+    events_cache (ResponseCache): Cache of the event queries.
+    router (fastapi.APIRouter): Router with the metrics route.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict
+
+from cachetools import LRUCache
+from fastapi import APIRouter
+from pymongo import ReturnDocument
+
+from db import cache_versionsdb, response_cachedb
+from invalidation import invalidation_bus
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "True").lower() in (
+    "true",
+    "1",
+    "t",
+)
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))
+CACHE_VERSION_REFRESH = float(os.getenv("CACHE_VERSION_REFRESH", "1"))
+CACHE_SHARED = os.getenv("CACHE_SHARED", "False").lower() in (
+    "true",
+    "1",
+    "t",
+)
+
+
+def cacheKey(*parts: Any) -> str:
+    """
+    Key of the given query arguments, equal for equal arguments whatever
+    the order of the keys of their dicts.
+
+    Args:
+        *parts (Any): the arguments, JSON serializable or converted with str.
+
+    Returns:
+        (str): the key
+    """
+    normalized = json.dumps(
+        parts, sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Versioned two tier cache of query results.
+
+    Values are served as copies, the callers may change them.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int = CACHE_SIZE,
+        ttl: float = CACHE_TTL,
+        shared: bool = CACHE_SHARED,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: LRUCache = LRUCache(maxsize=maxsize)
+        self._version = 0
+        self._version_read_at = float("-inf")
+        self._metrics = {
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "bumps": 0,
+            "errors": 0,
+        }
+
+    async def version(self) -> int:
+        """
+        Current version of the namespace.
+
+        Returns:
+            (int): the version
+        """
+        now = time.monotonic()
+        if now - self._version_read_at >= CACHE_VERSION_REFRESH:
+            document = await cache_versionsdb.find_one({"_id": self.namespace})
+            self._setVersion(document["version"] if document else 0, now)
+        return self._version
+
+    def _setVersion(self, version: int, now: float) -> None:
+        if version != self._version:
+            # entries of the other versions can not be reached anymore
+            self._entries.clear()
+        self._version = version
+        self._version_read_at = now
+
+    async def bump(self) -> None:
+        """
+        Moves the namespace to a new version, invalidating all its entries.
+        """
+        document = await cache_versionsdb.find_one_and_update(
+            {"_id": self.namespace},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._metrics["bumps"] += 1
+        self._setVersion(document["version"], time.monotonic())
+
+    async def cached(
+        self, key: str, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Returns the cached value of the key, computing and caching it on a
+        miss. None values are not cached.
+
+        Args:
+            key (str): the key, see cacheKey.
+            compute (Callable[[], Awaitable[Any]]): computes the value.
+
+        Returns:
+            (Any): the value
+        """
+        if not CACHE_ENABLED:
+            return await compute()
+
+        try:
+            version = await self.version()
+        except Exception:
+            self._metrics["errors"] += 1
+            return await compute()
+        found, value = await self._get(version, key)
+        if found:
+            return copy.deepcopy(value)
+
+        self._metrics["misses"] += 1
+        value = await compute()
+        if value is not None and version == self._version:
+            await self._set(version, key, value)
+        return copy.deepcopy(value)
+
+    async def _get(self, version: int, key: str) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if time.monotonic() < expires_at:
+                self._metrics["hits"] += 1
+                return True, value
+            del self._entries[key]
+
+        if self.shared:
+            try:
+                document = await response_cachedb.find_one(
+                    {
+                        "_id": self._sharedId(version, key),
+                        "expires_at": {"$gt": datetime.now(UTC)},
+                    }
+                )
+            except Exception:
+                self._metrics["errors"] += 1
+                document = None
+            if document is not None:
+                self._metrics["shared_hits"] += 1
+                # the local copy lives no longer than the shared one
+                remaining = (
+                    document["expires_at"].replace(tzinfo=UTC)
+                    - datetime.now(UTC)
+                ).total_seconds()
+                self._entries[key] = (
+                    time.monotonic() + remaining,
+                    document["value"],
+                )
+                return True, document["value"]
+
+        return False, None
+
+    async def _set(self, version: int, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        if not self.shared:
+            return
+        try:
+            await response_cachedb.replace_one(
+                {"_id": self._sharedId(version, key)},
+                {
+                    "value": value,
+                    "expires_at": datetime.now(UTC)
+                    + timedelta(seconds=self.ttl),
+                },
+                upsert=True,
+            )
+        except Exception:
+            # too large or not storable, served from the process only
+            self._metrics["errors"] += 1
+
+    def clearLocal(self) -> None:
+        """
+        Drops the entries of this process and reads the version again on the
+        next lookup, run when the cached collection changes.
+        """
+        self._entries.clear()
+        self._version_read_at = float("-inf")
+
+    def _sharedId(self, version: int, key: str) -> str:
+        return f"{self.namespace}:{version}:{key}"
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Hit and miss counts of this process.
+
+        Returns:
+            (Dict[str, Any]): the counts, the hit ratio, the version and the
+                              number of entries in the process.
+        """
+        lookups = (
+            self._metrics["hits"]
+            + self._metrics["shared_hits"]
+            + self._metrics["misses"]
+        )
+        hits = self._metrics["hits"] + self._metrics["shared_hits"]
+        return {
+            **self._metrics,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "version": self._version,
+            "entries": len(self._entries),
+            "shared": self.shared,
+        }
+
+
+events_cache = ResponseCache("events")
+
+
+async def invalidateEvents() -> None:
+    """
+    Invalidates the cached event reads, called by the event mutations after
+    their write, and publishes the change on the invalidation bus.
+    """
+    try:
+        await events_cache.bump()
+    except Exception as e:
+        # the write is done, the entries still expire after CACHE_TTL
+        print(f"Could not invalidate the events cache: {e}")
+    await invalidation_bus.publish("events")
+
+
+router = APIRouter()
+
+
+@router.get("/cache/metrics")
+async def cacheMetrics() -> Dict[str, Any]:
+    """
+    Hit and miss metrics of the response caches of this process.
+    """
+    return {"events": events_cache.metrics()}
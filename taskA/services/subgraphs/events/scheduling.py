@@ -0,0 +1,346 @@
+"""
+Scheduled Jobs Module.
+
+Every instance of the events service runs the same scheduler, a Mongo lease
+makes sure each firing of a job runs on one of them only.
+
+A lease is a document of the `scheduler_locks` collection keyed by the job
+name, owned by one instance until it expires. The instance running the job
+renews it while the job runs and deletes it when done; a lease left behind
+by a crashed instance expires on its own and is removed by a TTL index.
+
+Each firing is recorded in `scheduler_runs`, keyed by the job and the
+scheduled time, with its duration, number of items processed and last
+error. A run is "failed" if the job raised or its summary has failed items
+and none sent, "partial" if some items failed, "success" otherwise. A
+firing that already succeeded is never run again, which also covers
+instances whose clocks fire a little apart. On startup, the last firing of
+each job within SCHEDULER_CATCHUP_WINDOW that has no successful run is run
+once, so a restart over a cron time does not skip it and a failed or
+partial firing is retried. A job records the items it has handled in the
+`sent_ids` of the run with recordSentItem and a retry skips the ones
+returned by sentItems, so only the failed items are sent again.
+
+Attributes:
+    INSTANCE_ID (str): Identifier of this process as a lease owner.
+    SCHEDULER_LEASE_TTL (int): Seconds a lease is held without renewal.
+                               Defaults to 300.
+    SCHEDULER_CATCHUP_WINDOW (int): Seconds a missed firing is still caught
+                                    up on startup. Defaults to 86400.
+"""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import UTC, datetime, timedelta
+from typing import Awaitable, Callable, Dict, Tuple
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.base import BaseTrigger
+from pymongo.errors import DuplicateKeyError
+
+from db import scheduler_locksdb, scheduler_runsdb
+
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+SCHEDULER_LEASE_TTL = int(os.getenv("SCHEDULER_LEASE_TTL", "300"))
+SCHEDULER_CATCHUP_WINDOW = int(os.getenv("SCHEDULER_CATCHUP_WINDOW", "86400"))
+
+Job = Callable[[], Awaitable[dict | None]]
+
+# name -> (job, trigger) of the jobs added with addLeasedJob
+_jobs: Dict[str, Tuple[Job, BaseTrigger]] = {}
+_background_tasks: set = set()
+# _id of the run of the firing being run by the current task
+_current_run: ContextVar[str | None] = ContextVar("current_run", default=None)
+
+
+async def acquireLease(name: str, ttl: int = SCHEDULER_LEASE_TTL) -> bool:
+    """
+    Takes the lease of a job if it is free, expired or already ours.
+
+    Args:
+        name (str): name of the job
+        ttl (int): seconds the lease is held. Defaults to
+                   SCHEDULER_LEASE_TTL.
+
+    Returns:
+        (bool): whether this instance holds the lease
+    """
+    now = datetime.now(UTC)
+    try:
+        # held by another instance: the filter does not match and the
+        # upsert collides with the existing _id
+        await scheduler_locksdb.update_one(
+            {
+                "_id": name,
+                "$or": [
+                    {"expires_at": {"$lte": now}},
+                    {"owner": INSTANCE_ID},
+                ],
+            },
+            {
+                "$set": {
+                    "owner": INSTANCE_ID,
+                    "acquired_at": now,
+                    "expires_at": now + timedelta(seconds=ttl),
+                }
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def renewLease(name: str, ttl: int = SCHEDULER_LEASE_TTL) -> bool:
+    """
+    Extends the lease of a job held by this instance.
+
+    Args:
+        name (str): name of the job
+        ttl (int): seconds the lease is held from now. Defaults to
+                   SCHEDULER_LEASE_TTL.
+
+    Returns:
+        (bool): whether the lease is still ours
+    """
+    result = await scheduler_locksdb.update_one(
+        {"_id": name, "owner": INSTANCE_ID},
+        {"$set": {"expires_at": datetime.now(UTC) + timedelta(seconds=ttl)}},
+    )
+    return result.matched_count == 1
+
+
+async def releaseLease(name: str) -> None:
+    """
+    Releases the lease of a job held by this instance.
+
+    Args:
+        name (str): name of the job
+    """
+    await scheduler_locksdb.delete_one({"_id": name, "owner": INSTANCE_ID})
+
+
+async def _keepLease(name: str) -> None:
+    while True:
+        await asyncio.sleep(SCHEDULER_LEASE_TTL / 3)
+        if not await renewLease(name):
+            print(f"{name}: lease lost while running")
+            return
+
+
+def lastFireTime(
+    trigger: BaseTrigger, now: datetime, window: int
+) -> datetime | None:
+    """
+    Returns the last time the trigger fired at or before now, within the
+    given window.
+
+    Args:
+        trigger (apscheduler.triggers.base.BaseTrigger): the trigger
+        now (datetime): the current time
+        window (int): seconds to look back
+
+    Returns:
+        (datetime | None): the last fire time, None if it did not fire in
+                           the window
+    """
+    last = None
+    fire_time = trigger.get_next_fire_time(
+        None, now - timedelta(seconds=window)
+    )
+    while fire_time is not None and fire_time <= now:
+        last = fire_time
+        fire_time = trigger.get_next_fire_time(
+            fire_time, fire_time + timedelta(microseconds=1)
+        )
+    return last
+
+
+def runId(name: str, scheduled_for: datetime) -> str:
+    return f"{name}:{scheduled_for.astimezone(UTC).isoformat()}"
+
+
+async def runLeasedJob(
+    name: str, scheduled_for: datetime | None = None
+) -> dict | None:
+    """
+    Runs a firing of a job if this instance gets its lease and the firing
+    has not succeeded yet, and records the run. A run whose summary has
+    failed items is recorded as failed, or partial if some were sent, and
+    is run again by a later attempt at the same firing.
+
+    Args:
+        name (str): name of the job, added with addLeasedJob
+        scheduled_for (datetime | None): the firing to run. Defaults to the
+                                         last fire time of the trigger.
+
+    Returns:
+        (dict | None): the run, None if it was not run by this instance
+    """
+    job, trigger = _jobs[name]
+    if scheduled_for is None:
+        scheduled_for = lastFireTime(
+            trigger, datetime.now(UTC), SCHEDULER_CATCHUP_WINDOW
+        ) or datetime.now(UTC)
+
+    if not await acquireLease(name):
+        return None
+
+    run_id = runId(name, scheduled_for)
+    keeper = None
+    try:
+        if await scheduler_runsdb.find_one(
+            {"_id": run_id, "status": "success"}, {"_id": 1}
+        ):
+            return None
+
+        started_at = datetime.now(UTC)
+        await scheduler_runsdb.update_one(
+            {"_id": run_id},
+            {
+                "$set": {
+                    "job": name,
+                    "scheduled_for": scheduled_for,
+                    "started_at": started_at,
+                    "owner": INSTANCE_ID,
+                    "status": "running",
+                },
+                "$inc": {"attempts": 1},
+            },
+            upsert=True,
+        )
+
+        keeper = asyncio.create_task(_keepLease(name))
+        started = time.monotonic()
+        run = {"status": "success", "error": None, "items": None}
+        token = _current_run.set(run_id)
+        try:
+            summary = await job()
+            if summary:
+                run["summary"] = summary
+                run["items"] = sum(
+                    summary.get(key, 0)
+                    for key in ("sent", "failed", "skipped")
+                )
+                failed = summary.get("failed", 0)
+                if failed and not summary.get("sent", 0):
+                    run["status"] = "failed"
+                    run["error"] = f"{failed} items failed, none sent"
+                    run["last_error"] = run["error"]
+                elif failed:
+                    run["status"] = "partial"
+                    run["error"] = f"{failed} items failed"
+                    run["last_error"] = run["error"]
+        except Exception as e:
+            print(f"{name}: run failed: {e}")
+            run["status"] = "failed"
+            run["error"] = str(e)
+            # the last error is kept after later successful attempts
+            run["last_error"] = str(e)
+        finally:
+            _current_run.reset(token)
+
+        run["finished_at"] = datetime.now(UTC)
+        run["duration"] = round(time.monotonic() - started, 3)
+        await scheduler_runsdb.update_one({"_id": run_id}, {"$set": run})
+        return {"_id": run_id, **run}
+    finally:
+        if keeper is not None:
+            keeper.cancel()
+        await releaseLease(name)
+
+
+async def sentItems() -> set:
+    """
+    Items handled by earlier attempts of the firing being run, to be
+    skipped by a retry.
+
+    Returns:
+        (set): the recorded item ids, empty outside of a leased job
+    """
+    run_id = _current_run.get()
+    if run_id is None:
+        return set()
+    run = await scheduler_runsdb.find_one({"_id": run_id}, {"sent_ids": 1})
+    return set((run or {}).get("sent_ids", []))
+
+
+async def recordSentItem(item_id: str) -> None:
+    """
+    Records an item as handled by the firing being run.
+
+    Args:
+        item_id (str): id of the item, e.g. the event id
+    """
+    run_id = _current_run.get()
+    if run_id is None:
+        return
+    await scheduler_runsdb.update_one(
+        {"_id": run_id}, {"$addToSet": {"sent_ids": item_id}}
+    )
+
+
+def addLeasedJob(
+    scheduler: AsyncIOScheduler, name: str, job: Job, trigger: BaseTrigger
+) -> None:
+    """
+    Adds a job to the scheduler, run under its lease on every firing.
+
+    Args:
+        scheduler (apscheduler.schedulers.asyncio.AsyncIOScheduler): the
+            scheduler
+        name (str): name of the job, unique across the service
+        job (Callable[[], Awaitable[dict | None]]): the job, may return a
+            summary with sent/failed/skipped counts
+        trigger (apscheduler.triggers.base.BaseTrigger): when to run it
+    """
+    _jobs[name] = (job, trigger)
+    scheduler.add_job(
+        runLeasedJob,
+        trigger,
+        args=[name],
+        id=name,
+        coalesce=True,
+        misfire_grace_time=SCHEDULER_CATCHUP_WINDOW,
+        replace_existing=True,
+    )
+
+
+async def catchUpMisfires() -> None:
+    """
+    Runs the last firing of each job within SCHEDULER_CATCHUP_WINDOW that
+    has no successful run, e.g. missed while every instance was down.
+    """
+    now = datetime.now(UTC)
+    for name, (_, trigger) in list(_jobs.items()):
+        scheduled_for = lastFireTime(trigger, now, SCHEDULER_CATCHUP_WINDOW)
+        if scheduled_for is None:
+            continue
+        try:
+            if await scheduler_runsdb.find_one(
+                {"_id": runId(name, scheduled_for), "status": "success"},
+                {"_id": 1},
+            ):
+                continue
+            print(f"{name}: catching up the firing of {scheduled_for}")
+            await runLeasedJob(name, scheduled_for)
+        except Exception as e:
+            print(f"{name}: catch up failed: {e}")
+
+
+def startCatchUp() -> asyncio.Task:
+    """
+    Starts catchUpMisfires in the background, called once the scheduler
+    has started.
+
+    Returns:
+        (asyncio.Task): the catch up task
+    """
+    task = asyncio.create_task(catchUpMisfires())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
@@ -0,0 +1,94 @@
+"""
+script to backfill the native date fields start_at and end_at of events
+from their datetimeperiod strings. Runs online: events are updated in _id
+order in small batches, and an event whose datetimeperiod changed since it
+was read is left alone, editEvent has already written its dates. Safe to
+re-run, only events missing the fields are touched.
+to run:
+    docker-compose exec -it events /bin/bash
+    export PYTHONPATH=`pwd`
+    python3 scripts/backfill_event_dates.py
+    python3 scripts/backfill_event_dates.py --batch-size 200 --pause 0.5
+"""
+
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from db import eventsdb
+from utils import eventDateFields
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill start_at/end_at of events"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=0.1,
+        help="seconds to sleep between batches",
+    )
+    args = parser.parse_args()
+
+    query = {
+        "datetimeperiod": {"$exists": True},
+        "$or": [
+            {"start_at": {"$exists": False}},
+            {"end_at": {"$exists": False}},
+        ],
+    }
+    last_id = None
+    updated = failed = 0
+
+    while True:
+        batch_query = (
+            query
+            if last_id is None
+            else {
+                **query,
+                "_id": {"$gt": last_id},
+            }
+        )
+        events = (
+            await eventsdb.find(batch_query, {"datetimeperiod": 1})
+            .sort("_id", 1)
+            .limit(args.batch_size)
+            .to_list(length=None)
+        )
+        if not events:
+            break
+        last_id = events[-1]["_id"]
+
+        requests = []
+        for event in events:
+            try:
+                dates = eventDateFields(event["datetimeperiod"])
+            except (TypeError, ValueError, IndexError):
+                print(f"Invalid datetimeperiod for event {event['_id']}")
+                failed += 1
+                continue
+            requests.append(
+                UpdateOne(
+                    {
+                        "_id": event["_id"],
+                        "datetimeperiod": event["datetimeperiod"],
+                    },
+                    {"$set": dates},
+                )
+            )
+
+        if requests:
+            result = await eventsdb.bulk_write(requests, ordered=False)
+            updated += result.modified_count
+        print(f"Backfilled {updated} events, up to {last_id}")
+        await asyncio.sleep(args.pause)
+
+    remaining = await eventsdb.count_documents(query)
+    print(f"Done: {updated} updated, {failed} invalid, {remaining} remaining")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+script to backfill the search_terms of events from their names, used by the
+indexed name search. Runs online in _id order batches, an event renamed
+since it was read is left alone, editEvent has already written its terms.
+Pass --all to recompute the terms of every event, e.g. after a change to
+the normalisation.
+to run:
+    docker-compose exec -it events /bin/bash
+    export PYTHONPATH=`pwd`
+    python3 scripts/backfill_search_terms.py
+    python3 scripts/backfill_search_terms.py --all
+"""
+
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from db import eventsdb
+from utils import searchTerms
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill search_terms of events"
+    )
+    parser.add_argument("--all", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=0.1,
+        help="seconds to sleep between batches",
+    )
+    args = parser.parse_args()
+
+    query = {} if args.all else {"search_terms": {"$exists": False}}
+    last_id = None
+    updated = 0
+
+    while True:
+        batch_query = (
+            query if last_id is None else {**query, "_id": {"$gt": last_id}}
+        )
+        events = (
+            await eventsdb.find(batch_query, {"name": 1})
+            .sort("_id", 1)
+            .limit(args.batch_size)
+            .to_list(length=None)
+        )
+        if not events:
+            break
+        last_id = events[-1]["_id"]
+
+        result = await eventsdb.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": event["_id"], "name": event.get("name")},
+                    {"$set": {"search_terms": searchTerms(event.get("name"))}},
+                )
+                for event in events
+            ],
+            ordered=False,
+        )
+        updated += result.modified_count
+        print(f"Backfilled {updated} events, up to {last_id}")
+        await asyncio.sleep(args.pause)
+
+    print(f"Done: {updated} updated")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
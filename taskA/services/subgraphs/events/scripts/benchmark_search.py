@@ -0,0 +1,105 @@
+"""
+script to compare the indexed name search (search_terms) with the former
+case-insensitive regex on the name. Generates synthetic events in a scratch
+collection, never the events collection, and drops it afterwards.
+to run:
+    docker-compose exec -it events /bin/bash
+    export PYTHONPATH=`pwd`
+    python3 scripts/benchmark_search.py
+    python3 scripts/benchmark_search.py --events 50000 --runs 20
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import time
+
+from db import db
+from utils import searchTerms, searchTermsQuery
+
+WORDS = [
+    "annual", "cultural", "night", "tech", "talk", "workshop", "hackathon",
+    "quiz", "music", "dance", "drama", "film", "screening", "robotics",
+    "coding", "contest", "open", "mic", "poetry", "chess", "football",
+    "cricket", "orientation", "fest", "felicity", "research", "seminar",
+    "startup", "pitch", "design", "photography", "art", "exhibition",
+    "gaming", "tournament", "debate", "literature", "meetup", "alumni",
+]  # fmt: skip
+
+QUERIES = ["hack", "night", "tech talk", "photo exhib", "quiz", "zzz"]
+
+
+def random_name(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+
+
+async def timed(collection, query, runs: int) -> tuple:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await collection.find(query, {"_id": 1}).to_list(length=None)
+        durations.append(time.perf_counter() - start)
+    explain = await collection.find(query, {"_id": 1}).explain()
+    stats = explain["executionStats"]
+    count = await collection.count_documents(query)
+    return (
+        sorted(durations)[len(durations) // 2] * 1000,
+        stats["totalDocsExamined"],
+        stats["totalKeysExamined"],
+        count,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark name search")
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the scratch collection"
+    )
+    args = parser.parse_args()
+
+    collection = db["benchmark_search_events"]
+    await collection.drop()
+
+    rng = random.Random(args.seed)
+    print(f"Inserting {args.events} events")
+    batch = []
+    for i in range(args.events):
+        name = random_name(rng)
+        batch.append(
+            {"_id": str(i), "name": name, "search_terms": searchTerms(name)}
+        )
+        if len(batch) == 5000:
+            await collection.insert_many(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch)
+    await collection.create_index([("search_terms", 1)])
+
+    print(
+        f"{'query':<14} {'method':<8} {'median ms':>10} {'docs':>8} "
+        f"{'keys':>8} {'matches':>8}"
+    )
+    for text in QUERIES:
+        methods = {
+            "regex": {"name": {"$regex": re.escape(text), "$options": "i"}},
+            "terms": searchTermsQuery(text),
+        }
+        for method, query in methods.items():
+            median, docs, keys, count = await timed(
+                collection, query, args.runs
+            )
+            print(
+                f"{text:<14} {method:<8} {median:>10.2f} {docs:>8} "
+                f"{keys:>8} {count:>8}"
+            )
+
+    if not args.keep:
+        await collection.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
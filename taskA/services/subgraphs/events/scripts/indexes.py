@@ -0,0 +1,78 @@
+"""
+script to compare the declared indexes (db.INDEXES) with the live indexes
+and to report unused indexes from $indexStats
+to run:
+    docker-compose exec -it events /bin/bash
+    export PYTHONPATH=`pwd`
+    python3 scripts/indexes.py diff
+    python3 scripts/indexes.py diff --apply
+    python3 scripts/indexes.py stats --max-ops 0
+"""
+
+import argparse
+import asyncio
+
+from db import INDEXES, create_index, db, diff_indexes
+
+
+async def diff(apply: bool):
+    report = await diff_indexes()
+    for collection, result in report.items():
+        print(f"{collection}:")
+        for kind in ["missing", "changed", "undeclared"]:
+            for name in result[kind]:
+                print(f"    {kind:<10} {name}")
+        if not any(result.values()):
+            print("    up to date")
+
+    if apply:
+        # only builds the missing ones, changed and undeclared indexes have
+        # to be dropped by hand
+        await create_index()
+        print("Built missing indexes")
+
+
+async def stats(max_ops: int):
+    for collection in INDEXES:
+        print(f"{collection}:")
+        cursor = await db[collection].aggregate([{"$indexStats": {}}])
+        async for index in cursor:
+            ops = index["accesses"]["ops"]
+            since = index["accesses"]["since"]
+            unused = ops <= max_ops and index["name"] != "_id_"
+            print(
+                f"    {index['name']:<30} {ops:>10} ops since {since}"
+                + ("  (unused)" if unused else "")
+            )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Manage events indexes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    diff_parser = subparsers.add_parser(
+        "diff", help="compare declared and live indexes"
+    )
+    diff_parser.add_argument(
+        "--apply", action="store_true", help="build the missing indexes"
+    )
+
+    stats_parser = subparsers.add_parser(
+        "stats", help="report index usage from $indexStats"
+    )
+    stats_parser.add_argument(
+        "--max-ops",
+        type=int,
+        default=0,
+        help="indexes with at most this many ops are reported as unused",
+    )
+
+    args = parser.parse_args()
+    if args.command == "diff":
+        await diff(args.apply)
+    else:
+        await stats(args.max_ops)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
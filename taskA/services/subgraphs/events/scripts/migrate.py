@@ -0,0 +1,110 @@
+"""
+script to list and run the data migrations of scripts/migrations, see
+migrations.py. Without numbers, the migrations not completed yet are run in
+order.
+to run:
+    docker-compose exec -it events /bin/bash
+    export PYTHONPATH=`pwd`
+    python3 scripts/migrate.py list
+    python3 scripts/migrate.py run --dry-run
+    python3 scripts/migrate.py run 2 --rate 200
+"""
+
+import argparse
+import asyncio
+
+from migrations import (
+    MIGRATION_BATCH_SIZE,
+    MIGRATION_RATE,
+    loadMigrations,
+    migrationStatus,
+    runMigration,
+)
+from response_cache import invalidateEvents
+
+
+async def listMigrations() -> None:
+    status = await migrationStatus()
+    for migration in loadMigrations():
+        record = status.get(migration.number, {})
+        print(
+            f"{migration.number:04d} {migration.name}: "
+            f"{record.get('status', 'pending')} - {migration.description}"
+        )
+        if record.get("checkpoint") is not None:
+            print(f"     checkpoint {record['checkpoint']}")
+
+
+async def runMigrations(args: argparse.Namespace) -> None:
+    status = await migrationStatus()
+    migrations = loadMigrations()
+    if args.numbers:
+        migrations = [m for m in migrations if m.number in args.numbers]
+        unknown = set(args.numbers) - {m.number for m in migrations}
+        if unknown:
+            print(f"Unknown migrations: {sorted(unknown)}")
+            return
+
+    for migration in migrations:
+        record = status.get(migration.number, {})
+        if record.get("status") == "done" and not args.force:
+            if args.numbers:
+                print(f"{migration.number:04d} is done, use --force to rerun")
+            continue
+
+        mode = " (dry run)" if args.dry_run else ""
+        print(f"Running {migration.number:04d} {migration.name}{mode}")
+        stats = await runMigration(
+            migration,
+            dry_run=args.dry_run,
+            batch_size=args.batch_size,
+            rate=args.rate,
+            restart=args.restart,
+        )
+        print(", ".join(f"{key}: {value}" for key, value in stats.items()))
+        if stats["failed"] and not args.dry_run:
+            print(f"{stats['failed']} updates failed, run it again to retry")
+
+        if migration.collection == "events" and stats["modified"]:
+            await invalidateEvents()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Data migrations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="list the migrations and their status")
+
+    run = subparsers.add_parser("run", help="run migrations")
+    run.add_argument(
+        "numbers", nargs="*", type=int, help="migrations to run, all pending"
+    )
+    run.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="count the updates without writing or recording anything",
+    )
+    run.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    run.add_argument(
+        "--rate",
+        type=float,
+        default=MIGRATION_RATE,
+        help="documents per second at most, 0 for no limit",
+    )
+    run.add_argument(
+        "--restart",
+        action="store_true",
+        help="start over instead of resuming from the checkpoint",
+    )
+    run.add_argument(
+        "--force", action="store_true", help="rerun completed migrations"
+    )
+    args = parser.parse_args()
+
+    if args.command == "list":
+        await listMigrations()
+    else:
+        await runMigrations(args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,39 @@
+"""
+Fixes the end times messed up for the events older than 1 Feb, events
+lasting exactly 2 minutes are given an end 2 hours after their start.
+
+Only the datetimeperiod and its date fields are set. The room occupancy of
+the approved events is not updated, run scripts/rebuild_occupancy.py after.
+"""
+
+from datetime import datetime, timedelta
+
+from migrations import Migration
+from utils import eventDateFields
+
+
+def parseTime(value: str) -> datetime:
+    return datetime.fromisoformat(value.split("+")[0].removesuffix("Z"))
+
+
+class FixEndTimes(Migration):
+    description = "End 2 minute events 2 hours after their start"
+    collection = "events"
+    projection = {"datetimeperiod": 1}
+
+    def update(self, document: dict) -> dict | None:
+        start_time = parseTime(document["datetimeperiod"][0])
+        end_time = parseTime(document["datetimeperiod"][1])
+        if end_time - start_time != timedelta(minutes=2):
+            return None
+
+        datetimeperiod = [
+            start_time.isoformat() + "Z",
+            (start_time + timedelta(hours=2)).isoformat() + "Z",
+        ]
+        return {"datetimeperiod": datetimeperiod} | eventDateFields(
+            datetimeperiod
+        )
+
+
+migration = FixEndTimes()
@@ -0,0 +1,140 @@
+"""
+Regenerates the codes of all the events, numbered per club and fiscal year
+in the order of their start times.
+
+The codes are computed before the first batch, in one pass over the events
+with a counter per code prefix, from a club code map fetched once. The
+event code counters used by createEvent are seeded with the new numbers and
+the codes still held by another event to be renumbered are moved out of the
+way, the code index is unique. The batches then set the new codes, an
+update only applies if the event still has the code it was read with.
+
+The numbering is deterministic, an interrupted run resumes with the same
+codes. Run it while no events are being created, a code created in the
+meantime may take a number assigned here; the update of that event then
+fails and is retried by running the migration again with --force.
+"""
+
+from typing import Dict, List, Tuple
+
+from db import eventsdb
+from migrations import BulkWriter, Migration
+from utils import (
+    fetchClubs,
+    get_bot_cookie,
+    getEventCodePrefix,
+    seedEventCodeCounter,
+)
+
+
+async def clubCodes() -> Dict[str, str]:
+    """
+    Codes of all the clubs, deleted ones included, by cid.
+    """
+    clubs = await fetchClubs(await get_bot_cookie())
+    return {club["cid"]: club["code"] for club in clubs if club.get("code")}
+
+
+def assignCodes(
+    events: List[dict], club_codes: Dict[str, str]
+) -> Tuple[Dict[str, str], Dict[str, int], List[dict]]:
+    """
+    Numbers the events of each prefix in the given order.
+
+    Events of unknown clubs keep their codes, which are not given to any
+    other event.
+
+    Args:
+        events (List[dict]): the events, in start time order.
+        club_codes (Dict[str, str]): club codes by cid.
+
+    Returns:
+        (Tuple[Dict[str, str], Dict[str, int], List[dict]]): the new code of
+            each event by id, the highest number of each prefix and the
+            skipped events.
+    """
+    skipped = [event for event in events if event["clubid"] not in club_codes]
+    reserved = {event.get("code") for event in skipped}
+
+    counters: Dict[str, int] = {}
+    codes = {}
+    for event in events:
+        club_code = club_codes.get(event["clubid"])
+        if club_code is None:
+            continue
+
+        prefix = getEventCodePrefix(club_code, event["datetimeperiod"][0])
+        number = counters.get(prefix, 0) + 1
+        while f"{prefix}{number:03d}" in reserved:
+            number += 1
+        counters[prefix] = number
+        codes[event["_id"]] = f"{prefix}{number:03d}"
+
+    return codes, counters, skipped
+
+
+class RegenerateEventCodes(Migration):
+    description = "Renumber the event codes per club and fiscal year"
+    collection = "events"
+    projection = {"code": 1}
+
+    def __init__(self):
+        self.codes: Dict[str, str] = {}
+
+    async def prepare(self, writer: BulkWriter) -> None:
+        club_codes = await clubCodes()
+        if not club_codes:
+            raise Exception("Could not fetch the club codes")
+
+        events = (
+            await eventsdb.find(
+                {}, {"clubid": 1, "code": 1, "datetimeperiod": 1}
+            )
+            .sort([("datetimeperiod.0", 1), ("_id", 1)])
+            .to_list(length=None)
+        )
+        self.codes, counters, skipped = assignCodes(events, club_codes)
+
+        for event in skipped:
+            print(
+                f"Skipped {event.get('code')}, unknown club {event['clubid']}"
+            )
+        changes = [
+            event
+            for event in events
+            if event["_id"] in self.codes
+            and event.get("code") != self.codes[event["_id"]]
+        ]
+        print(
+            f"{len(events)} events, {len(changes)} codes to change, "
+            f"{len(skipped)} skipped, {len(counters)} prefixes"
+        )
+        if writer.dry_run:
+            for event in changes:
+                print(
+                    f"{event['_id']}: {event.get('code')} -> "
+                    f"{self.codes[event['_id']]}"
+                )
+            return
+
+        # new events must not take the numbers given here
+        for prefix, number in counters.items():
+            await seedEventCodeCounter(prefix, number)
+        print(f"Seeded {len(counters)} counters")
+
+        targets = {self.codes[event["_id"]] for event in changes}
+        for event in changes:
+            if event.get("code") in targets:
+                writer.add(self.filter(event), {"code": f"~{event['_id']}"})
+
+    def update(self, document: dict) -> dict | None:
+        code = self.codes.get(document["_id"])
+        if code is None or code == document.get("code"):
+            return None
+        return {"code": code}
+
+    def filter(self, document: dict) -> dict:
+        return {"_id": document["_id"], "code": document.get("code")}
+
+
+migration = RegenerateEventCodes()
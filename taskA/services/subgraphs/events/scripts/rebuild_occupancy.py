@@ -0,0 +1,69 @@
+"""
+script to rebuild the room occupancy collection from the approved events,
+use it to fill the collection the first time or to fix any drift. Existing
+documents are replaced, stale ones dropped.
+to run:
+    docker-compose exec -it events /bin/bash
+    export PYTHONPATH=`pwd`
+    python3 scripts/rebuild_occupancy.py
+"""
+
+import asyncio
+
+from pymongo import ReplaceOne
+
+from db import countersdb, eventsdb, occupancydb
+from mtypes import Event_State_Status
+from occupancy import MAX_DURATION_ID, occupancyDocuments
+
+BATCH_SIZE = 1000
+
+
+async def main():
+    cursor = eventsdb.find(
+        {"status.state": Event_State_Status.approved.value},
+        {"status.state": 1, "location": 1, "datetimeperiod": 1},
+    )
+
+    max_seconds = 0.0
+    kept_ids = set()
+    requests = []
+    async for event in cursor:
+        for document in occupancyDocuments(event):
+            max_seconds = max(
+                max_seconds,
+                (document["end"] - document["start"]).total_seconds(),
+            )
+            kept_ids.add(document["_id"])
+            requests.append(
+                ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+            )
+        if len(requests) >= BATCH_SIZE:
+            await occupancydb.bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        await occupancydb.bulk_write(requests, ordered=False)
+
+    # the longest interval is set exactly, not raised
+    await countersdb.update_one(
+        {"_id": MAX_DURATION_ID},
+        {"$set": {"seconds": max_seconds}},
+        upsert=True,
+    )
+
+    stale_ids = [
+        document["_id"]
+        async for document in occupancydb.find({}, {"_id": 1})
+        if document["_id"] not in kept_ids
+    ]
+    if stale_ids:
+        await occupancydb.delete_many({"_id": {"$in": stale_ids}})
+
+    print(
+        f"Rebuilt {len(kept_ids)} occupancy documents, "
+        f"dropped {len(stale_ids)} stale ones"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+script to rebuild the finance rollups (see finance_rollups.py) from the
+approved events and to check the stored rollups against the events. Use
+rebuild to fill the collection the first time or to fix any drift reported
+by check, run it while the finances are not being changed, a mutation made
+during the rebuild may be counted twice or not at all.
+to run:
+    docker-compose exec -it events /bin/bash
+    export PYTHONPATH=`pwd`
+    python3 scripts/rollups.py check
+    python3 scripts/rollups.py rebuild
+    python3 scripts/rollups.py rebuild --club clubid1 clubid2
+"""
+
+import argparse
+import asyncio
+import sys
+
+from finance_rollups import (
+    ROLLUP_FIELDS,
+    checkFinanceRollups,
+    rebuildFinanceRollups,
+)
+
+
+async def rebuild(clubs: list[str] | None):
+    count = await rebuildFinanceRollups(clubs)
+    print(f"Rebuilt {count} finance rollups")
+
+
+async def check(tolerance: float) -> bool:
+    mismatches = await checkFinanceRollups(tolerance)
+    for mismatch in mismatches:
+        stored, expected = mismatch["stored"], mismatch["expected"]
+        if stored is None:
+            print(f"{mismatch['_id']}: missing")
+            continue
+        if expected is None:
+            print(f"{mismatch['_id']}: stale")
+            continue
+        print(f"{mismatch['_id']}:")
+        for field in ROLLUP_FIELDS:
+            print(
+                f"    {field:<12} stored {stored.get(field, 0)}, "
+                f"expected {expected[field]}"
+            )
+        print(
+            f"    {'bills':<12} stored {stored.get('bills', {})}, "
+            f"expected {expected['bills']}"
+        )
+
+    if mismatches:
+        print(f"{len(mismatches)} rollups differ, run rebuild to fix them")
+    else:
+        print("Finance rollups are consistent")
+    return not mismatches
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Manage finance rollups")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = subparsers.add_parser(
+        "rebuild", help="recompute the rollups from the events"
+    )
+    rebuild_parser.add_argument(
+        "--club", nargs="+", help="only the rollups of these clubs"
+    )
+
+    check_parser = subparsers.add_parser(
+        "check", help="compare the rollups with the events"
+    )
+    check_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.01,
+        help="largest difference of amounts taken as equal",
+    )
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        await rebuild(args.club)
+    elif not await check(args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+"""
+script to seed the event code counters from the existing event codes,
+one counter per club code and fiscal year. Safe to re-run, counters are
+never moved backwards.
+to run:
+    docker-compose exec -it events /bin/bash
+    export PYTHONPATH=`pwd`
+    python3 scripts/seed_event_counters.py
+"""
+
+import asyncio
+
+from db import eventsdb
+from utils import seedEventCodeCounter
+
+
+async def main():
+    # codes are formatted as CODE20XX00Y, the prefix is all but the
+    # last three digits
+    pipeline = [
+        {"$match": {"code": {"$regex": "[0-9]{3}$"}}},
+        {
+            "$group": {
+                "_id": {
+                    "$substrCP": [
+                        "$code",
+                        0,
+                        {"$subtract": [{"$strLenCP": "$code"}, 3]},
+                    ]
+                },
+                "max_code": {"$max": "$code"},
+            }
+        },
+    ]
+    prefixes = await (await eventsdb.aggregate(pipeline)).to_list(length=None)
+
+    for prefix in prefixes:
+        value = int(prefix["max_code"][-3:])
+        await seedEventCodeCounter(prefix["_id"], value)
+        print(f"Seeded {prefix['_id']} with {value}")
+
+    print(f"Seeded {len(prefixes)} counters")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,17 +1,32 @@
+import asyncio
+import base64
 import html
+import json
 import os
 import re
-from datetime import datetime
-from typing import List
+import time
+import unicodedata
+from datetime import UTC, datetime
+from typing import AsyncIterator, List, Tuple
 
 import fiscalyear
-from httpx import AsyncClient
+from cachetools import TTLCache
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
-from db import eventsdb
+from db import countersdb, eventsdb
+from httpclient import gateway_request, post
+from models import Event
 from mtypes import timezone
 from otypes import timelot_type
 
 inter_communication_secret = os.getenv("INTER_COMMUNICATION_SECRET")
+ROLE_EMAILS_CACHE_TTL = int(os.getenv("ROLE_EMAILS_CACHE_TTL", "600"))
+
+role_emails_cache = TTLCache(maxsize=16, ttl=ROLE_EMAILS_CACHE_TTL)
+role_emails_lock = asyncio.Lock()
+
+CLUB_DIRECTORY_TTL = int(os.getenv("CLUB_DIRECTORY_TTL", "3600"))
 
 # start month of financial year
 FISCAL_START_MONTH = 4
@@ -46,12 +61,8 @@ async def getMember(cid, uid, cookies=None) -> dict | None:
             }
         """
         variables = {"memberInput": {"cid": cid, "uid": uid, "rid": None}}
-        async with AsyncClient(cookies=cookies) as client:
-            response = await client.post(
-                "http://gateway/graphql",
-                json={"query": query, "variables": variables},
-            )
-        return response.json()["data"]["member"]
+        response = await gateway_request(query, variables, cookies=cookies)
+        return response["data"]["member"]
 
     except Exception:
         return None
@@ -85,20 +96,14 @@ async def getUser(uid, cookies=None) -> tuple[dict, dict] | None:
             }
         """
         variable = {"userInput": {"uid": uid}}
-        async with AsyncClient(cookies=cookies) as client:
-            response = await client.post(
-                "http://gateway/graphql",
-                json={"query": query, "variables": variable},
-            )
+        response = await gateway_request(query, variable, cookies=cookies)
 
-        return response.json()["data"]["userProfile"], response.json()["data"][
-            "userMeta"
-        ]
+        return response["data"]["userProfile"], response["data"]["userMeta"]
     except Exception:
         return None
 
 
-async def getClubs(cookies=None) -> List[dict]:
+async def fetchClubs(cookies=None) -> List[dict]:
     """
     Function to call a query to the Clubs service resolved by the allClubs
     method, fetches info about all clubs.
@@ -118,18 +123,127 @@ async def getClubs(cookies=None) -> List[dict]:
                             name
                             code
                             email
+                            category
                         }
                     }
                 """
-        async with AsyncClient(cookies=cookies) as client:
-            response = await client.post(
-                "http://gateway/graphql", json={"query": query}
-            )
-        return response.json()["data"]["allClubs"]
+        response = await gateway_request(query, cookies=cookies)
+        return response["data"]["allClubs"]
     except Exception:
         return []
 
 
+class ClubDirectory:
+    """
+    In-process directory of clubs, mapping cid to name, code, email and
+    category.
+
+    A snapshot is kept per visibility scope, `public` for the active clubs
+    every visitor sees and `cc` for all clubs as seen by the Clubs Council.
+    A snapshot older than the TTL is still served while a background task
+    refreshes it. `invalidate` drops every snapshot, it is called when the
+    clubs subgraph reports a change.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._snapshots: dict[str, tuple[float, dict[str, dict]]] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._generation = 0
+
+    async def get(self, cookies=None, scope: str = "public") -> dict:
+        """
+        Returns the cid to club mapping of the given scope.
+
+        Args:
+            cookies (dict): cookies used if the scope has to be fetched.
+                            Defaults to None.
+            scope (str): `public` or `cc`. Defaults to `public`.
+
+        Returns:
+            (dict[str, dict]): clubs keyed by cid.
+        """
+        snapshot = self._snapshots.get(scope)
+        if snapshot is None:
+            return await self._refresh(cookies, scope)
+
+        fetched_at, clubs = snapshot
+        if time.monotonic() - fetched_at > self.ttl:
+            # serve stale, revalidate in the background
+            self._refresh_task(cookies, scope)
+        return clubs
+
+    def invalidate(self) -> None:
+        """
+        Drops all snapshots, the next read fetches them again.
+        """
+        self._generation += 1
+        self._snapshots.clear()
+
+    def _refresh_task(self, cookies, scope: str) -> asyncio.Task:
+        task = self._refreshing.get(scope)
+        if task is None or task.done():
+            task = asyncio.create_task(self._fetch(cookies, scope))
+            self._refreshing[scope] = task
+        return task
+
+    async def _refresh(self, cookies, scope: str) -> dict:
+        return await asyncio.shield(self._refresh_task(cookies, scope))
+
+    async def _fetch(self, cookies, scope: str) -> dict:
+        generation = self._generation
+        clubs = {
+            club["cid"]: club
+            for club in await fetchClubs(
+                cookies if scope != "public" else None
+            )
+        }
+
+        if not clubs:
+            # keep serving the last snapshot if the clubs service is down
+            snapshot = self._snapshots.get(scope)
+            return snapshot[1] if snapshot else clubs
+
+        if generation == self._generation:
+            self._snapshots[scope] = (time.monotonic(), clubs)
+        return clubs
+
+
+club_directory = ClubDirectory(ttl=CLUB_DIRECTORY_TTL)
+
+
+def club_scope(user: dict | None) -> str:
+    """
+    Scope of the club directory visible to the given user.
+
+    Args:
+        user (dict | None): user metadata.
+
+    Returns:
+        (str): `cc` for the Clubs Council, `public` otherwise.
+    """
+    if user is not None and user.get("role") == "cc":
+        return "cc"
+    return "public"
+
+
+async def getClubs(cookies=None, user: dict | None = None) -> List[dict]:
+    """
+    Fetches info about all clubs visible to the user from the club
+    directory.
+
+    Args:
+        cookies (dict): cookies. Defaults to None.
+        user (dict | None): user metadata, decides whether deleted clubs are
+                            included. Defaults to None.
+
+    Returns:
+        (List[dict]): list of clubs
+    """
+    clubs = await club_directory.get(cookies, club_scope(user))
+    return list(clubs.values())
+
+
 # method gets club code from club id
 async def getClubCode(clubid: str) -> str | None:
     """
@@ -141,11 +255,10 @@ async def getClubCode(clubid: str) -> str | None:
     Returns:
         (str | None): club code or None if club not found
     """
-    allclubs = await getClubs()
-    for club in allclubs:
-        if club["cid"] == clubid:
-            return club["code"]
-    return None
+    club = (await club_directory.get()).get(clubid)
+    if club is None:
+        return None
+    return club["code"]
 
 
 async def getClubDetails(
@@ -155,6 +268,7 @@ async def getClubDetails(
     """
     This method makes a query to the clubs service resolved by the club
     method, used to get a club's name from its clubid.
+    Active clubs are served from the club directory without a request.
 
     Args:
         clubid (str): club id
@@ -164,6 +278,10 @@ async def getClubDetails(
         (List[dict]): response of the request
     """
 
+    club = (await club_directory.get()).get(clubid)
+    if club is not None:
+        return dict(club)
+
     try:
         query = """
                     query Club($clubInput: SimpleClubInput!) {
@@ -176,20 +294,84 @@ async def getClubDetails(
                     }
                 """
         variable = {"clubInput": {"cid": clubid}}
-        async with AsyncClient(cookies=cookies) as client:
-            response = await client.post(
-                "http://gateway/graphql",
-                json={"query": query, "variables": variable},
-            )
-        return response.json()["data"]["club"]
+        response = await gateway_request(query, variable, cookies=cookies)
+        return response["data"]["club"]
     except Exception:
         return {}
 
 
+def getEventCodePrefix(club_code: str, starttime) -> str:
+    """
+    Event code prefix of a club for the fiscal year of the given time.
+
+    Args:
+        club_code (str): club code
+        starttime (datetime | str): start time of the event
+
+    Returns:
+        (str): code prefix, format: CODE20XX
+    """
+    # stored times end with either +00:00 or Z
+    year = fiscalyear.FiscalDateTime.fromisoformat(
+        str(starttime).split("+")[0].removesuffix("Z")
+    ).fiscal_year
+    return f"{club_code}{str(year - 1)[-2:]}{str(year)[-2:]}"
+
+
+async def getMaxEventCodeNumber(prefix: str) -> int:
+    """
+    Highest event number already used with the given code prefix, looked up
+    on the unique code index.
+
+    Args:
+        prefix (str): event code prefix
+
+    Returns:
+        (int): highest number in use, 0 if there is none.
+    """
+    event = await eventsdb.find_one(
+        {"code": {"$regex": f"^{re.escape(prefix)}[0-9]{{3}}$"}},
+        {"code": 1},
+        sort=[("code", -1)],
+    )
+    return int(event["code"][-3:]) if event else 0
+
+
+async def seedEventCodeCounter(prefix: str, value: int | None = None) -> int:
+    """
+    Seeds the event code counter of a prefix, never moving it backwards.
+
+    Args:
+        prefix (str): event code prefix
+        value (int | None): highest number in use. Defaults to the highest
+                            number found in the events collection.
+
+    Returns:
+        (int): the value the counter was seeded with.
+    """
+    if value is None:
+        value = await getMaxEventCodeNumber(prefix)
+
+    try:
+        await countersdb.update_one(
+            {"_id": prefix},
+            {"$max": {"seq": value}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # a concurrent seed created the counter first
+        await countersdb.update_one({"_id": prefix}, {"$max": {"seq": value}})
+    return value
+
+
 async def getEventCode(clubid, starttime) -> str:
     """
     generate event code based on starttime and organizing club
 
+    The number is taken from the atomic per-club, per-fiscal-year counter in
+    the counters collection, which is seeded from the existing codes the
+    first time it is used.
+
     Args:
         clubid (str): club id
         starttime (datetime): start time of the event
@@ -205,35 +387,23 @@ async def getEventCode(clubid, starttime) -> str:
     if club_code is None:
         raise ValueError("Invalid clubid")
 
-    year = fiscalyear.FiscalYear(
-        fiscalyear.FiscalDateTime.fromisoformat(
-            str(starttime).split("+")[0]
-        ).fiscal_year
-    )
-    start = year.start
-    end = year.end
-
-    club_events = await eventsdb.find(
-        {
-            "clubid": clubid,
-            "datetimeperiod": {
-                "$gte": start.isoformat(),
-                "$lte": end.isoformat(),
-            },
-        }
-    ).to_list(length=None)
-
-    max_code = 0
-    for i in club_events:
-        code = i["code"]
-        code = int(code[-3:])
-        if code > max_code:
-            max_code = code
+    prefix = getEventCodePrefix(club_code, starttime)
 
-    event_count = max_code + 1
-    code_year = str(year.fiscal_year - 1)[-2:] + str(year.fiscal_year)[-2:]
+    counter = await countersdb.find_one_and_update(
+        {"_id": prefix},
+        {"$inc": {"seq": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if counter is None:
+        await seedEventCodeCounter(prefix)
+        counter = await countersdb.find_one_and_update(
+            {"_id": prefix},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
 
-    return f"{club_code}{code_year}{event_count:03d}"  # format: CODE20XX00Y
+    return f"{prefix}{counter['seq']:03d}"  # format: CODE20XX00Y
 
 
 # method produces link to event (based on code as input)
@@ -273,6 +443,10 @@ async def getRoleEmails(role: str) -> List[str]:
     """
     Brings all the emails of members belonging to a role
 
+    Resolves the uids of the role with `usersByRole` and then all their
+    profiles with a single `usersByList` call. Results are cached per role
+    for ROLE_EMAILS_CACHE_TTL seconds.
+
     Args:
         role: role of the user to be searched
 
@@ -280,6 +454,10 @@ async def getRoleEmails(role: str) -> List[str]:
         (List[str]): list of emails.
     """
 
+    async with role_emails_lock:
+        if role in role_emails_cache:
+            return list(role_emails_cache[role])
+
     try:
         query = """
             query Query($role: String!, $interCommunicationSecret: String) {
@@ -292,33 +470,41 @@ async def getRoleEmails(role: str) -> List[str]:
             "role": role,
             "interCommunicationSecret": inter_communication_secret,
         }
-        async with AsyncClient() as client:
-            response = await client.post(
-                "http://gateway/graphql",
-                json={"query": query, "variables": variables},
-            )
-            uids = [
-                user["uid"] for user in response.json()["data"]["usersByRole"]
+        response = await gateway_request(query, variables)
+        uids = [user["uid"] for user in response["data"]["usersByRole"]]
+
+        emails = []
+        if uids:
+            query = """
+                query UsersByList($userInputs: [UserInput!]!) {
+                  usersByList(userInputs: $userInputs) {
+                    email
+                  }
+                }
+            """
+            variables = {"userInputs": [{"uid": uid} for uid in uids]}
+            response = await gateway_request(query, variables)
+            emails = [
+                profile["email"]
+                for profile in response["data"]["usersByList"]
+                if profile and profile.get("email")
             ]
-            emails = []
-            for uid in uids:
-                query = """
-                    query UserProfile($userInput: UserInput) {
-                      userProfile(userInput: $userInput) {
-                        email
-                      }
-                    }
-                """
-                variables = {"userInput": {"uid": uid}}
-                resp = await client.post(
-                    "http://gateway/graphql",
-                    json={"query": query, "variables": variables},
-                )
-                emails.append(resp.json()["data"]["userProfile"]["email"])
-        return emails
     except Exception:
         return []
 
+    async with role_emails_lock:
+        role_emails_cache[role] = emails
+
+    return list(emails)
+
+
+async def invalidateRoleEmails() -> None:
+    """
+    Drops the cached emails of all roles, run when the users change.
+    """
+    async with role_emails_lock:
+        role_emails_cache.clear()
+
 
 def subtract_months(dt, months):
     """Move a datetime back by the specified number of months."""
@@ -333,6 +519,326 @@ def subtract_months(dt, months):
     return dt.replace(year=year, month=month, day=1)
 
 
+def toUTCDatetime(value: str | datetime) -> datetime:
+    """
+    Converts an event time, either an ISO string as stored in datetimeperiod
+    or a datetime, to an aware UTC datetime. Times without an offset are
+    taken to be in UTC.
+
+    Args:
+        value (str | datetime): the time
+
+    Returns:
+        (datetime): the time in UTC
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+def eventDateFields(datetimeperiod) -> dict:
+    """
+    Builds the native date shadow fields of an event, start_at and end_at,
+    stored next to the datetimeperiod strings so that range filters and
+    sorts compare BSON dates instead of strings.
+
+    Args:
+        datetimeperiod (Tuple[str | datetime, str | datetime]): start and end
+                                                               time
+
+    Returns:
+        (dict): the start_at and end_at fields
+    """
+    return {
+        "start_at": toUTCDatetime(datetimeperiod[0]),
+        "end_at": toUTCDatetime(datetimeperiod[1]),
+    }
+
+
+def searchTerms(text: str | None) -> List[str]:
+    """
+    Normalises a text into its search terms: accents are stripped, it is
+    lowercased and split into words. Stored on events as search_terms, a
+    multikey indexed field, for the name search.
+
+    Args:
+        text (str | None): the text
+
+    Returns:
+        (List[str]): the distinct words, in order
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return list(dict.fromkeys(re.findall(r"\w+", text.lower())))
+
+
+def searchTermsQuery(text: str) -> dict:
+    """
+    Builds the filter of the name search: each word of the text must be the
+    prefix of a word of the event's name, in any order. The prefixes are
+    escaped and anchored, so they are matched on the search_terms index.
+
+    Args:
+        text (str): the searched text
+
+    Returns:
+        (dict): the filter, empty if the text has no words
+    """
+    terms = searchTerms(text)
+    if not terms:
+        return {}
+    return {
+        "search_terms": {
+            "$all": [re.compile("^" + re.escape(term)) for term in terms]
+        }
+    }
+
+
+# phase ranks of events, in the order they are listed
+ONGOING_PHASE, UPCOMING_PHASE, PAST_PHASE = 0, 1, 2
+
+
+def eventsSortingPipeline(
+    searchspace,
+    name: str | None = None,
+    pagination=False,
+    skip=0,
+    limit: int | None = None,
+    timings: List[datetime] | None = None,
+    pastEventsLimit: int | None = None,
+    after: Tuple[datetime, str] | None = None,
+) -> List[dict]:
+    """
+    Builds the aggregation pipeline used by eventsWithSorting.
+
+    Each matching event is ranked by its phase (ongoing, upcoming, past) and
+    sorted on (phase, phase-specific key) by the database, so skip and limit
+    are applied server-side.
+
+    Args:
+        searchspace (dict): search space for events
+        name (str): words searched in the names of the events, see
+                    searchTermsQuery. Defaults to None.
+        pagination (bool): if True, paginates the events. Defaults to False.
+        skip (int): number of events to skip. Defaults to 0.
+        limit (int): number of events to return. Defaults to None.
+        timings (List[datetime] | None): The time period for which the
+                                         events are to be fetched. Defaults
+                                         to None.
+        pastEventsLimit (int | None): Time Limit for the past events to
+                                      be fetched in months. Defaults to None.
+        after (Tuple[datetime, str] | None): (end time, id) of the last
+                                             past event already seen, only
+                                             past events after it are
+                                             returned. Defaults to None.
+
+    Returns:
+        (List[dict]): the aggregation pipeline
+    """
+    current_datetime = datetime.now(UTC)
+
+    if name is not None and pagination:
+        searchspace.update(searchTermsQuery(name))
+
+    conditions = [searchspace]
+
+    if timings is not None:
+        timings = [toUTCDatetime(timing) for timing in timings]
+        conditions.append(
+            {
+                "$or": [
+                    # Event starts within the timing period
+                    {
+                        "start_at": {
+                            "$gte": timings[0],
+                            "$lt": timings[1],
+                        }
+                    },
+                    # Event ends within the timing period
+                    {
+                        "end_at": {
+                            "$gt": timings[0],
+                            "$lte": timings[1],
+                        }
+                    },
+                    # Event spans the entire timing period
+                    {
+                        "start_at": {"$lte": timings[0]},
+                        "end_at": {"$gte": timings[1]},
+                    },
+                ]
+            }
+        )
+
+    phase_queries = {
+        ONGOING_PHASE: {
+            "start_at": {"$lte": current_datetime},
+            "end_at": {"$gte": current_datetime},
+        },
+        UPCOMING_PHASE: {
+            "start_at": {"$gt": current_datetime},
+        },
+        PAST_PHASE: {
+            "end_at": {"$lt": current_datetime},
+        },
+    }
+
+    if pastEventsLimit is not None:
+        limit_datetime = subtract_months(
+            datetime.now(timezone), pastEventsLimit
+        )
+        phase_queries[PAST_PHASE]["end_at"]["$gte"] = limit_datetime
+
+    if pagination and skip < 0:
+        phases = [ONGOING_PHASE, UPCOMING_PHASE]
+    elif pagination:
+        phases = [PAST_PHASE]
+    else:
+        phases = [ONGOING_PHASE, UPCOMING_PHASE, PAST_PHASE]
+
+    if after is not None and phases == [PAST_PHASE]:
+        # keyset on (end time, id), both descending
+        conditions.append(
+            {
+                "$or": [
+                    {"end_at": {"$lt": after[0]}},
+                    {"end_at": after[0], "_id": {"$lt": after[1]}},
+                ]
+            }
+        )
+
+    if len(phases) == 1:
+        conditions.append(phase_queries[phases[0]])
+    else:
+        conditions.append({"$or": [phase_queries[p] for p in phases]})
+
+    pipeline: List[dict] = [{"$match": {"$and": conditions}}]
+
+    if phases == [PAST_PHASE]:
+        # a plain sort on an indexed field, no phase rank needed, the id
+        # breaks ties so that pages are stable
+        pipeline.append({"$sort": {"end_at": -1, "_id": -1}})
+    else:
+        start, end = "$start_at", "$end_at"
+        pipeline += [
+            {
+                "$set": {
+                    "_phase": {
+                        "$switch": {
+                            "branches": [
+                                {
+                                    "case": {"$gt": [start, current_datetime]},
+                                    "then": UPCOMING_PHASE,
+                                },
+                                {
+                                    "case": {"$lt": [end, current_datetime]},
+                                    "then": PAST_PHASE,
+                                },
+                            ],
+                            "default": ONGOING_PHASE,
+                        }
+                    }
+                }
+            },
+            {
+                "$set": {
+                    # ongoing by start time and past by end time, descending
+                    "_sort_desc": {
+                        "$switch": {
+                            "branches": [
+                                {
+                                    "case": {
+                                        "$eq": ["$_phase", ONGOING_PHASE]
+                                    },
+                                    "then": start,
+                                },
+                                {
+                                    "case": {"$eq": ["$_phase", PAST_PHASE]},
+                                    "then": end,
+                                },
+                            ],
+                            "default": None,
+                        }
+                    },
+                    # upcoming by start time, ascending
+                    "_sort_asc": {
+                        "$cond": [
+                            {"$eq": ["$_phase", UPCOMING_PHASE]},
+                            start,
+                            None,
+                        ]
+                    },
+                }
+            },
+            {"$sort": {"_phase": 1, "_sort_desc": -1, "_sort_asc": 1}},
+        ]
+
+    if pagination and skip > 0:
+        pipeline.append({"$skip": skip})
+    if limit and not (pagination and skip < 0):
+        pipeline.append({"$limit": limit})
+
+    if phases != [PAST_PHASE]:
+        pipeline.append({"$unset": ["_phase", "_sort_desc", "_sort_asc"]})
+
+    return pipeline
+
+
+async def iterEventsWithSorting(
+    searchspace,
+    name: str | None = None,
+    date_filter=False,
+    pagination=False,
+    skip=0,
+    limit: int | None = None,
+    timings: List[datetime] | None = None,
+    pastEventsLimit: int | None = None,
+    projection: dict | None = None,
+    public: bool = False,
+) -> AsyncIterator[dict]:
+    """
+    Streams the events of eventsWithSorting one at a time from the database
+    cursor, takes the same arguments.
+
+    Args:
+        projection (dict | None): fields of the events to return. Defaults
+                                  to None, all fields.
+        public (bool): if True, fields hidden from public viewers are not
+                       read. Defaults to False.
+
+    Yields:
+        (dict): event
+    """
+    if public:
+        projection = publicEventsProjection(projection)
+
+    if date_filter:
+        cursor = eventsdb.find(searchspace, projection).sort("start_at", -1)
+        if limit:
+            cursor = cursor.limit(limit)
+    else:
+        pipeline = eventsSortingPipeline(
+            searchspace,
+            name=name,
+            pagination=pagination,
+            skip=skip,
+            limit=limit,
+            timings=timings,
+            pastEventsLimit=pastEventsLimit,
+        )
+        if projection:
+            pipeline.append({"$project": projection})
+        cursor = await eventsdb.aggregate(pipeline, allowDiskUse=True)
+
+    async with cursor:
+        async for event in cursor:
+            yield event
+
+
 async def eventsWithSorting(
     searchspace,
     name: str | None = None,
@@ -340,25 +846,31 @@ async def eventsWithSorting(
     pagination=False,
     skip=0,
     limit: int | None = None,
-    timings: List[str] | None = None,
+    timings: List[datetime] | None = None,
     pastEventsLimit: int | None = None,
+    projection: dict | None = None,
+    public: bool = False,
 ) -> List[dict]:
     """
     Provides a list of events based on the searchspace provided.
 
     Custom sorting of events based on
     datetimeperiod with
-    ongoing events first in ascending order of end time
+    ongoing events first in descending order of start time
     then
     upcoming events first in ascending order of start time
     and then
     past events in descending order of end time
     It also filters events based on name if name is provided and
-    pagination is True.
+    pagination is True, with the indexed prefix search of searchTermsQuery.
+
+    The sorting, skip and limit all run in a single aggregation on the
+    database, see eventsSortingPipeline.
 
     Args:
         searchspace (dict): search space for events
-        name (str): name of the event. Defaults to None.
+        name (str): words searched in the names of the events, see
+                    searchTermsQuery. Defaults to None.
         date_filter (bool): if True, filters events based on date.
                             Defaults to False. Does not work with
                             pagination.
@@ -371,123 +883,201 @@ async def eventsWithSorting(
                                 events are to be fetched. Defaults to None.
         pastEventsLimit (int | None): Time Limit for the past events to
                                       be fetched in months. Defaults to None.
+        projection (dict | None): fields of the events to return. Defaults
+                                  to None, all fields.
+        public (bool): if True, fields hidden from public viewers are not
+                       read, see publicEventsProjection. Defaults to False.
 
     Returns:
         (List[dict]): list of events
     """
-    current_datetime = datetime.now(timezone).strftime(
-        "%Y-%m-%dT%H:%M:%S+00:00"
-    )
-
-    if date_filter:
-        required_events_query = {
-            **searchspace,
-        }
-        events = (
-            await eventsdb.find(required_events_query)
-            .sort("datetimeperiod.0", -1)
-            .to_list(length=None)
+    return [
+        event
+        async for event in iterEventsWithSorting(
+            searchspace,
+            name=name,
+            date_filter=date_filter,
+            pagination=pagination,
+            skip=skip,
+            limit=limit,
+            timings=timings,
+            pastEventsLimit=pastEventsLimit,
+            projection=projection,
+            public=public,
         )
-        return events[:limit] if limit else events
+    ]
 
-    if name is not None and pagination:
-        searchspace["name"] = {"$regex": name, "$options": "i"}
 
-    if timings is not None:
-        timings_conditions = [
-            # Event starts within the timing period
-            {
-                "datetimeperiod.0": {
-                    "$gte": timings[0],
-                    "$lt": timings[1],
-                }
-            },
-            # Event ends within the timing period
-            {
-                "datetimeperiod.1": {
-                    "$gt": timings[0],
-                    "$lte": timings[1],
-                }
-            },
-            # Event spans the entire timing period
-            {
-                "datetimeperiod.0": {"$lte": timings[0]},
-                "datetimeperiod.1": {"$gte": timings[1]},
-            },
-        ]
+def encodeEventsCursor(event: dict) -> str:
+    """
+    Encodes the position of a past event in the events feed as an opaque
+    cursor.
 
-        searchspace = {
-            **searchspace,
-            "$or": timings_conditions,
-        }
+    Args:
+        event (dict): the last event of a page
 
-    ongoing_events_query = {
-        **searchspace,
-        "datetimeperiod.0": {"$lte": current_datetime},
-        "datetimeperiod.1": {"$gte": current_datetime},
-    }
-    upcoming_events_query = {
-        **searchspace,
-        "datetimeperiod.0": {"$gt": current_datetime},
-    }
-    past_events_query = {
-        **searchspace,
-        "datetimeperiod.1": {"$lt": current_datetime},
-    }
+    Returns:
+        (str): the cursor
+    """
+    position = [toUTCDatetime(event["end_at"]).isoformat(), str(event["_id"])]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
 
-    if pastEventsLimit is not None:
-        limit_datetime = subtract_months(
-            datetime.now(timezone), pastEventsLimit
-        )
-        limit_datetime = limit_datetime.strftime("%Y-%m-%dT%H:%M:%S+00:00")
-        past_events_query["datetimeperiod.1"]["$gte"] = limit_datetime
-
-    if pagination:
-        if skip < 0:
-            ongoing_events = (
-                await eventsdb.find(ongoing_events_query)
-                .sort("datetimeperiod.0", -1)
-                .to_list(length=None)
-            )
-            upcoming_events = (
-                await eventsdb.find(upcoming_events_query)
-                .sort("datetimeperiod.0", 1)
-                .to_list(length=None)
-            )
-            events = ongoing_events + upcoming_events
-        else:
-            past_events = (
-                await eventsdb.find(past_events_query)
-                .sort("datetimeperiod.1", -1)
-                .skip(skip)
-                .limit(limit or 0)
-                .to_list(length=None)
-            )
-            events = past_events
-    else:
-        ongoing_events = (
-            await eventsdb.find(ongoing_events_query)
-            .sort("datetimeperiod.0", -1)
-            .to_list(length=None)
-        )
-        upcoming_events = (
-            await eventsdb.find(upcoming_events_query)
-            .sort("datetimeperiod.0", 1)
-            .to_list(length=None)
-        )
-        past_events = (
-            await eventsdb.find(past_events_query)
-            .sort("datetimeperiod.1", -1)
-            .to_list(length=None)
+
+def decodeEventsCursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Decodes a cursor made by encodeEventsCursor.
+
+    Args:
+        cursor (str): the cursor
+
+    Returns:
+        (Tuple[datetime, str]): end time and id of the event
+
+    Raises:
+        ValueError: Invalid cursor.
+    """
+    try:
+        end, eventid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(eventid, str):
+            raise ValueError
+        return toUTCDatetime(end), eventid
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+
+async def eventsPageWithSorting(
+    searchspace,
+    name: str | None = None,
+    skip=0,
+    limit: int | None = None,
+    after: str | None = None,
+    timings: List[datetime] | None = None,
+    pastEventsLimit: int | None = None,
+    projection: dict | None = None,
+    public: bool = False,
+) -> Tuple[List[dict], str | None, bool]:
+    """
+    Provides one page of the paginated events of eventsWithSorting.
+
+    Past events are paged by keyset on (end time, id) when a cursor is given,
+    so every page costs the same whatever its depth. A skip lt 0 still
+    returns all ongoing and upcoming events in one page.
+
+    Args:
+        searchspace (dict): search space for events
+        name (str): words searched in the names of the events, see
+                    searchTermsQuery. Defaults to None.
+        skip (int): number of events to skip, only used when after is None.
+                    Defaults to 0.
+        limit (int): number of events to return. Defaults to None.
+        after (str | None): cursor of the last event of the previous page.
+                            Defaults to None.
+        timings (List[datetime] | None): The time period for which the
+                                         events are to be fetched. Defaults
+                                         to None.
+        pastEventsLimit (int | None): Time Limit for the past events to
+                                      be fetched in months. Defaults to None.
+        projection (dict | None): fields of the events to return. Defaults
+                                  to None, all fields.
+        public (bool): if True, fields hidden from public viewers are not
+                       read. Defaults to False.
+
+    Returns:
+        (Tuple[List[dict], str | None, bool]): events, cursor of the last
+                                               event and whether more events
+                                               follow
+
+    Raises:
+        ValueError: Invalid cursor.
+    """
+    if skip < 0 and after is None:
+        events = await eventsWithSorting(
+            searchspace,
+            name=name,
+            pagination=True,
+            skip=skip,
+            timings=timings,
+            pastEventsLimit=pastEventsLimit,
+            projection=projection,
+            public=public,
         )
-        events = ongoing_events + upcoming_events + past_events
-        if limit:
-            events = events[:limit]
+        return events, None, False
+
+    if public:
+        projection = publicEventsProjection(projection)
+
+    position = decodeEventsCursor(after) if after is not None else None
+
+    # fetch one more than asked for to know whether a next page exists
+    pipeline = eventsSortingPipeline(
+        searchspace,
+        name=name,
+        pagination=True,
+        skip=0 if position is not None else max(skip, 0),
+        limit=limit + 1 if limit else None,
+        timings=timings,
+        pastEventsLimit=pastEventsLimit,
+        after=position,
+    )
+    if projection:
+        # the cursor is built from the end time
+        pipeline.append({"$project": {**projection, "end_at": 1}})
+    cursor = await eventsdb.aggregate(pipeline, allowDiskUse=True)
+    events = await cursor.to_list(length=None)
+
+    hasNextPage = bool(limit) and len(events) > limit
+    if hasNextPage:
+        events = events[:limit]
+
+    endCursor = encodeEventsCursor(events[-1]) if events else after
+    return events, endCursor, hasNextPage
+
+
+# fields of an event hidden from public viewers, only the state of its status
+# is shown to them
+PUBLIC_HIDDEN_FIELDS = [
+    "equipment",
+    "additional",
+    "population",
+    "poc",
+    "budget",
+    "bills_status",
+]
+
+# stored fields of an event readable by public viewers
+PUBLIC_EVENT_FIELDS = [
+    field.alias or name
+    for name, field in Event.model_fields.items()
+    if name not in PUBLIC_HIDDEN_FIELDS and name != "status"
+] + ["status.state", "start_at", "end_at"]
+
+
+def publicEventsProjection(projection: dict | None = None) -> dict:
+    """
+    Restricts a projection of events to the fields readable by public
+    viewers, so the hidden fields never leave the database.
+
+    Args:
+        projection (dict | None): inclusion projection to restrict. Defaults
+                                  to None, all fields.
+
+    Returns:
+        (dict): the restricted inclusion projection
+    """
+    if projection is None:
+        return {field: 1 for field in PUBLIC_EVENT_FIELDS}
 
-    return events
+    restricted = {}
+    for field, value in projection.items():
+        if field == "status" or field.startswith("status."):
+            restricted["status.state"] = 1
+        elif field.split(".")[0] not in PUBLIC_HIDDEN_FIELDS:
+            restricted[field] = value
+    return restricted
 
 
-# method hides data from public viewers who view information of an event
+# method hides data from public viewers who view information of an event,
+# for events already read, see publicEventsProjection to not read them
 def trim_public_events(event: dict) -> dict:
     """
     Hides certain data fields from public viewers who view information of
@@ -499,24 +1089,18 @@ def trim_public_events(event: dict) -> dict:
     Returns:
         (dict): trimmed event
     """
-    delete_keys = [
-        "equipment",
-        "additional",
-        "population",
-        "poc",
-        "budget",
-        "bills_status",
-    ]
-    for key in delete_keys:
+    for key in PUBLIC_HIDDEN_FIELDS:
         if key in event:
             del event[key]
 
-    status = event["status"]
-    del event["status"]
+    # events read with a projection may not have a status
+    if "status" in event:
+        status = event["status"]
+        del event["status"]
 
-    event["status"] = {
-        "state": status["state"],
-    }
+        event["status"] = {
+            "state": status["state"],
+        }
 
     return event
 
@@ -559,14 +1143,13 @@ async def delete_file(filename) -> str:
     Returns:
         (str): response from the file service.
     """
-    async with AsyncClient() as client:
-        response = await client.post(
-            "http://files/delete-file",
-            params={
-                "filename": filename,
-                "inter_communication_secret": inter_communication_secret,
-            },
-        )
+    response = await post(
+        "http://files/delete-file",
+        params={
+            "filename": filename,
+            "inter_communication_secret": inter_communication_secret,
+        },
+    )
 
     if response.status_code != 200:
         raise Exception(response.text)
@@ -582,11 +1165,10 @@ async def get_bot_cookie() -> dict:
         (dict): cookies.
     """
 
-    async with AsyncClient() as client:
-        response = await client.post(
-            "http://auth/bot-cookie",
-            json={"secret": inter_communication_secret, "uid": "events"},
-        )
+    response = await post(
+        "http://auth/bot-cookie",
+        json={"secret": inter_communication_secret, "uid": "events"},
+    )
 
     return_dict = {}
     for key, value in response.cookies.items():
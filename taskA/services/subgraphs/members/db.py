@@ -15,6 +15,9 @@ Attributes:
     client (MongoClient): MongoDB client.
     db (Database): MongoDB database.
     membersdb (Collection): MongoDB collection for members.
+    cache_invalidationsdb (Collection): MongoDB collection for versions of
+                                        the collections polled by the
+                                        invalidation bus.
 """
 
 from os import getenv
@@ -33,6 +36,7 @@ MONGO_DATABASE = getenv("MONGO_DATABASE", default="default")
 client = AsyncMongoClient(MONGO_URI)
 db = client[MONGO_DATABASE]
 membersdb = db.members
+cache_invalidationsdb = db.cache_invalidations
 
 
 async def create_index():
@@ -0,0 +1,144 @@
+"""
+Request Loaders Module.
+
+DataLoaders batching and deduplicating the lookups of users and clubs made
+while resolving one GraphQL operation. They are created per request on
+first use, see `otypes.Context.loaders`, so nothing is shared between users
+and the results live only as long as the request.
+
+All the keys requested in the same tick are fetched with a single gateway
+request: users through `usersByList`, clubs from the club directory
+(`allClubs`) with the clubs it does not list queried together.
+
+Each loader counts the loads it served, how many were cache hits, and the
+upstream requests and keys it fetched; the counts are returned in the
+`extensions` of the response in debug mode.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+from httpx import AsyncClient
+from strawberry.dataloader import DataLoader
+from strawberry.extensions import SchemaExtension
+
+from utils import club_directory
+
+
+class CountingDataLoader(DataLoader):
+    """
+    DataLoader keeping statistics of its loads and upstream fetches.
+    """
+
+    def __init__(
+        self,
+        load_fn: Callable[[List[Any]], Awaitable[Sequence[Any]]],
+        stats: Dict[str, int],
+        **kwargs,
+    ):
+        self.stats = stats
+
+        async def counted_load_fn(keys: List[Any]) -> Sequence[Any]:
+            self.stats["batches"] += 1
+            self.stats["keys"] += len(keys)
+            return await load_fn(keys)
+
+        super().__init__(counted_load_fn, **kwargs)
+
+    def load(self, key: Any) -> Awaitable[Any]:
+        self.stats["loads"] += 1
+        if self.cache and self.cache_map.get(key) is not None:
+            self.stats["hits"] += 1
+        return super().load(key)
+
+
+class Loaders:
+    """
+    The loaders of a request.
+
+    Attributes:
+        user (CountingDataLoader): user profile by uid, None for unknown
+                                   users, as utils.getUser.
+        club (CountingDataLoader): club details by cid, empty for unknown
+                                   clubs, as utils.getClubDetails.
+        stats (Dict[str, Dict[str, int]]): statistics by loader.
+    """
+
+    def __init__(self, cookies: dict | None = None):
+        self.cookies = cookies
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.user = self._loader("user", self._loadUsers)
+        self.club = self._loader("club", self._loadClubs)
+
+    def _loader(self, name: str, load_fn) -> CountingDataLoader:
+        self.stats[name] = {"loads": 0, "hits": 0, "batches": 0, "keys": 0}
+        return CountingDataLoader(load_fn, self.stats[name])
+
+    async def _request(self, query: str, variables: dict) -> dict:
+        async with AsyncClient(cookies=self.cookies) as client:
+            result = await client.post(
+                "http://gateway/graphql",
+                json={"query": query, "variables": variables},
+            )
+        return result.json()["data"] or {}
+
+    async def _loadUsers(self, uids: List[str]) -> List[dict | None]:
+        query = """
+            query usersByList($userInputs: [UserInput!]!) {
+                usersByList(userInputs: $userInputs) {
+                    firstName
+                    lastName
+                    email
+                    rollno
+                    batch
+                }
+            }
+        """
+        try:
+            data = await self._request(
+                query, {"userInputs": [{"uid": uid} for uid in uids]}
+            )
+            return list(data["usersByList"])
+        except Exception:
+            return [None] * len(uids)
+
+    async def _loadClubs(self, cids: List[str]) -> List[dict]:
+        # active clubs are in the directory, others (e.g. deleted clubs)
+        # are queried together
+        directory = await club_directory.get()
+        clubs = {cid: dict(directory[cid]) for cid in cids if cid in directory}
+
+        missing = [cid for cid in cids if cid not in clubs]
+        if missing:
+            variables = ", ".join(
+                f"$k{i}: SimpleClubInput!" for i in range(len(missing))
+            )
+            fields = "\n".join(
+                f"k{i}: club(clubInput: $k{i}) {{ cid category }}"
+                for i in range(len(missing))
+            )
+            try:
+                data = await self._request(
+                    f"query ({variables}) {{\n{fields}\n}}",
+                    {f"k{i}": {"cid": cid} for i, cid in enumerate(missing)},
+                )
+            except Exception:
+                data = {}
+            for i, cid in enumerate(missing):
+                clubs[cid] = data.get(f"k{i}") or {}
+
+        return [clubs[cid] for cid in cids]
+
+
+class LoaderStatsExtension(SchemaExtension):
+    """
+    Adds the statistics of the loaders used by the operation to the
+    `extensions` of the response, used in debug mode only.
+    """
+
+    def get_results(self) -> Dict[str, Any]:
+        context = self.execution_context.context
+        # the loaders are a cached property, only set if they were used
+        loaders = getattr(context, "__dict__", {}).get("loaders")
+        if loaders is None:
+            return {}
+        return {"loaderStats": loaders.stats}
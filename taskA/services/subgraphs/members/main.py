@@ -13,6 +13,7 @@ Attributes:
     app (FastAPI): The FastAPI application instance.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from os import getenv
 
@@ -22,6 +23,8 @@ from strawberry.fastapi import GraphQLRouter
 from strawberry.tools import create_type
 
 from db import create_index
+from invalidation import invalidation_bus
+from loaders import LoaderStatsExtension
 
 # override PyObjectId and Context scalars
 from models import PyObjectId
@@ -30,6 +33,7 @@ from otypes import Context, PyObjectIdType
 
 # import all queries and mutations
 from queries import queries
+from utils import invalidate_club_caches
 
 # create query types
 Query = create_type("Query", queries)
@@ -43,22 +47,27 @@ async def get_context() -> Context:
     return Context()
 
 
+# check whether running in debug mode
+DEBUG = getenv("GLOBAL_DEBUG", "False").lower() in ("true", "1", "t")
+
 # initialize federated schema
 schema = strawberry.federation.Schema(
     query=Query,
     mutation=Mutation,
     enable_federation_2=True,
     scalar_overrides={PyObjectId: PyObjectIdType},
+    extensions=[LoaderStatsExtension] if DEBUG else [],
 )
 
-# check whether running in debug mode
-DEBUG = getenv("GLOBAL_DEBUG", "False").lower() in ("true", "1", "t")
-
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_index()
+    # drops the club caches when the clubs change in any process
+    invalidation_bus.subscribe("clubs", lambda _: invalidate_club_caches())
+    invalidation_task = asyncio.create_task(invalidation_bus.run())
     yield
+    invalidation_task.cancel()
 
 
 # serve API with FastAPI router
@@ -14,7 +14,13 @@ from models import Member
 
 # import all models and types
 from otypes import FullMemberInput, Info, MemberType, SimpleMemberInput
-from utils import clubCategory, getUser, non_deleted_members, unique_roles_id
+from utils import (
+    clubCategory,
+    getUser,
+    invalidate_club_caches,
+    non_deleted_members,
+    unique_roles_id,
+)
 
 inter_communication_secret_global = getenv("INTER_COMMUNICATION_SECRET")
 ist = ZoneInfo("Asia/Kolkata")
@@ -81,7 +87,9 @@ async def createMember(memberInput: FullMemberInput, info: Info) -> MemberType:
             raise Exception("Start year cannot be greater than end year")
 
     club_category = await clubCategory(
-        member_input["cid"], info.context.cookies
+        member_input["cid"],
+        info.context.cookies,
+        loader=info.context.loaders.club,
     )
     auto_approve = user["role"] == "cc" or club_category in ["body", "admin"]
 
@@ -182,7 +190,9 @@ async def editMember(memberInput: FullMemberInput, info: Info) -> MemberType:
     time_str = current_time.strftime("%d-%m-%Y %I:%M %p IST")
 
     club_category = await clubCategory(
-        member_input["cid"], info.context.cookies
+        member_input["cid"],
+        info.context.cookies,
+        loader=info.context.loaders.club,
     )
     auto_approve = user["role"] == "cc" or club_category in ["body", "admin"]
 
@@ -557,6 +567,33 @@ async def updateMembersCid(
     return upd_ref.modified_count
 
 
+@strawberry.mutation
+async def invalidateMembersClubCache(
+    inter_communication_secret: str | None = None,
+) -> bool:
+    """
+    Drops the club directory and club category cache of this service,
+    called by the clubs service whenever a club is created, edited, deleted
+    or restarted.
+
+    Args:
+        inter_communication_secret (str): The inter communication
+                                                 secret. Defaults to None.
+
+    Returns:
+        (bool): True if the caches were invalidated.
+
+    Raises:
+        Exception: Authentication Error! Invalid secret!
+    """
+
+    if inter_communication_secret != inter_communication_secret_global:
+        raise Exception("Authentication Error! Invalid secret!")
+
+    await invalidate_club_caches()
+    return True
+
+
 # register all mutations
 mutations = [
     createMember,
@@ -565,4 +602,5 @@ mutations = [
     approveMember,
     rejectMember,
     updateMembersCid,
+    invalidateMembersClubCache,
 ]
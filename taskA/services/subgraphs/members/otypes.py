@@ -37,6 +37,16 @@ class Context(BaseContext):
         cookies = json.loads(self.request.headers.get("cookies", "{}"))
         return cookies
 
+    @cached_property
+    def loaders(self):
+        """
+        DataLoaders of users and clubs for this request.
+        """
+        # imported here as loaders depends on utils, which imports otypes
+        from loaders import Loaders
+
+        return Loaders(self.cookies)
+
 
 Info = _Info[Context, RootValueType]
 """custom info Type for user metadata"""
@@ -25,7 +25,6 @@ from otypes import (
 from utils import (
     getClubs,
     getUsersByBatch,
-    getUsersByList,
 )
 
 
@@ -326,7 +325,7 @@ async def downloadMembersData(
     if user is None:
         raise Exception("You do not have permission to access this resource.")
 
-    allClubs = await getClubs(info.context.cookies)
+    allClubs = await getClubs(info.context.cookies, user)
     if len(allClubs) == 0:
         raise Exception("No clubs found.")
 
@@ -412,7 +411,9 @@ async def downloadMembersData(
 
     # Get details of all members
     if "allBatches" in details.batchFiltering:
-        userDetailsList = await getUsersByList(userIds, info.context.cookies)
+        userDetailsList = dict(
+            zip(userIds, await info.context.loaders.user.load_many(userIds))
+        )
 
     headerMapping = {
         "clubid": "Club Name",
@@ -1,5 +1,6 @@
 import asyncio
 import os
+import time
 from datetime import datetime, timedelta
 
 from cachetools import TTLCache
@@ -15,6 +16,8 @@ CACHE_TTL = int(timedelta(days=10).total_seconds())
 club_category_cache = TTLCache(maxsize=100, ttl=CACHE_TTL)
 cache_lock = asyncio.Lock()
 
+CLUB_DIRECTORY_TTL = int(os.getenv("CLUB_DIRECTORY_TTL", "3600"))
+
 
 async def non_deleted_members(member_input) -> MemberType:
     """
@@ -250,7 +253,7 @@ async def getClubDetails(
         return {}
 
 
-async def getClubs(cookies=None) -> list:
+async def fetchClubs(cookies=None) -> list:
     """
     Query to Clubs Microservice to call the all clubs query
 
@@ -266,6 +269,9 @@ async def getClubs(cookies=None) -> list:
                 allClubs {
                     cid
                     name
+                    code
+                    email
+                    category
                 }
             }
         """
@@ -279,7 +285,128 @@ async def getClubs(cookies=None) -> list:
         return []
 
 
-async def clubCategory(cid: str, cookies: dict | None = None) -> str:
+class ClubDirectory:
+    """
+    In-process directory of clubs, mapping cid to name, code, email and
+    category.
+
+    A snapshot is kept per visibility scope, `public` for the active clubs
+    every visitor sees and `cc` for all clubs as seen by the Clubs Council.
+    A snapshot older than the TTL is still served while a background task
+    refreshes it. `invalidate` drops every snapshot, it is called when the
+    clubs subgraph reports a change.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._snapshots: dict[str, tuple[float, dict[str, dict]]] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._generation = 0
+
+    async def get(self, cookies=None, scope: str = "public") -> dict:
+        """
+        Returns the cid to club mapping of the given scope.
+
+        Args:
+            cookies (dict): cookies used if the scope has to be fetched.
+                            Defaults to None.
+            scope (str): `public` or `cc`. Defaults to `public`.
+
+        Returns:
+            (dict[str, dict]): clubs keyed by cid.
+        """
+        snapshot = self._snapshots.get(scope)
+        if snapshot is None:
+            return await self._refresh(cookies, scope)
+
+        fetched_at, clubs = snapshot
+        if time.monotonic() - fetched_at > self.ttl:
+            # serve stale, revalidate in the background
+            self._refresh_task(cookies, scope)
+        return clubs
+
+    def invalidate(self) -> None:
+        """
+        Drops all snapshots, the next read fetches them again.
+        """
+        self._generation += 1
+        self._snapshots.clear()
+
+    def _refresh_task(self, cookies, scope: str) -> asyncio.Task:
+        task = self._refreshing.get(scope)
+        if task is None or task.done():
+            task = asyncio.create_task(self._fetch(cookies, scope))
+            self._refreshing[scope] = task
+        return task
+
+    async def _refresh(self, cookies, scope: str) -> dict:
+        return await asyncio.shield(self._refresh_task(cookies, scope))
+
+    async def _fetch(self, cookies, scope: str) -> dict:
+        generation = self._generation
+        clubs = {
+            club["cid"]: club
+            for club in await fetchClubs(
+                cookies if scope != "public" else None
+            )
+        }
+
+        if not clubs:
+            # keep serving the last snapshot if the clubs service is down
+            snapshot = self._snapshots.get(scope)
+            return snapshot[1] if snapshot else clubs
+
+        if generation == self._generation:
+            self._snapshots[scope] = (time.monotonic(), clubs)
+        return clubs
+
+
+club_directory = ClubDirectory(ttl=CLUB_DIRECTORY_TTL)
+
+
+def club_scope(user: dict | None) -> str:
+    """
+    Scope of the club directory visible to the given user.
+
+    Args:
+        user (dict | None): user metadata.
+
+    Returns:
+        (str): `cc` for the Clubs Council, `public` otherwise.
+    """
+    if user is not None and user.get("role") == "cc":
+        return "cc"
+    return "public"
+
+
+async def getClubs(cookies=None, user: dict | None = None) -> list:
+    """
+    Fetches all clubs visible to the user from the club directory.
+
+    Args:
+        cookies (dict): The cookies of the user. Defaults to None.
+        user (dict | None): user metadata, decides whether deleted clubs are
+                            included. Defaults to None.
+
+    Returns:
+        (list): list of all clubs
+    """
+    clubs = await club_directory.get(cookies, club_scope(user))
+    return list(clubs.values())
+
+
+async def invalidate_club_caches() -> None:
+    """
+    Drops the club directory and the club category cache.
+    """
+    club_directory.invalidate()
+    async with cache_lock:
+        club_category_cache.clear()
+
+
+async def clubCategory(
+    cid: str, cookies: dict | None = None, loader=None
+) -> str:
     """
     Get the category of a club from its cid.
     Uses caching to reduce repeated calls.
@@ -287,6 +414,9 @@ async def clubCategory(cid: str, cookies: dict | None = None) -> str:
     Args:
         cid (str): club id
         cookies (dict | None): The cookies of the user. Defaults to None.
+        loader (DataLoader | None): club loader of the request, used instead
+                                    of querying the club directly if given.
+                                    Defaults to None.
     Returns:
         (str): category of the club
     """
@@ -294,7 +424,12 @@ async def clubCategory(cid: str, cookies: dict | None = None) -> str:
         if cid in club_category_cache:
             return club_category_cache[cid]
 
-    club_details = await getClubDetails(cid, cookies)
+    if loader is not None:
+        club_details = await loader.load(cid)
+    else:
+        club_details = (await club_directory.get()).get(cid)
+        if club_details is None:
+            club_details = await getClubDetails(cid, cookies)
 
     if not club_details or "category" not in club_details:
         raise Exception(f"Club with cid {cid} not found.")
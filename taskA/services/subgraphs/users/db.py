@@ -13,6 +13,9 @@ Attributes:
     MONGO_DATABASE (str): MongoDB database name.
     client (pymongo.AsyncMongoClient): MongoDB client.
     db (pymongo.asynchronous.database.AsyncDatabase): Entire MongoDB database.
+    cache_invalidationsdb (pymongo.asynchronous.collection.AsyncCollection):
+        MongoDB collection for versions of the collections polled by the
+        invalidation bus.
 """
 
 from os import getenv
@@ -32,3 +35,4 @@ client = AsyncMongoClient(MONGO_URI)
 
 # get database
 db = client[MONGO_DATABASE]
+cache_invalidationsdb = db.cache_invalidations
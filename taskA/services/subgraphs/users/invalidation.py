@@ -0,0 +1,29 @@
+"""
+Cache Invalidation Module.
+
+The other subgraphs cache data of the users service in process and drop it
+when notified by their invalidation bus. The bus follows a change stream
+over the shared database or, on a standalone server, polls the
+`cache_invalidations` collection, a version per collection. The users
+service only writes, it publishes its changes for the polling buses after
+its writes.
+"""
+
+from db import cache_invalidationsdb
+
+
+async def publish(collection: str) -> None:
+    """
+    Records a change of the collection for the processes polling it, called
+    after the write.
+
+    Args:
+        collection (str): name of the collection.
+    """
+    try:
+        await cache_invalidationsdb.update_one(
+            {"_id": collection}, {"$inc": {"version": 1}}, upsert=True
+        )
+    except Exception as e:
+        # the write is done, pollers catch up on the next publish
+        print(f"Could not publish the invalidation of {collection}: {e}")
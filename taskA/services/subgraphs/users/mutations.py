@@ -8,6 +8,7 @@ import strawberry
 from fastapi.encoders import jsonable_encoder
 
 from db import db
+from invalidation import publish
 from models import User
 
 # import all models and types
@@ -60,6 +61,8 @@ async def updateRole(roleInput: RoleInput, info: Info) -> bool:
         },
         upsert=True,
     )
+    # the services caching the users of a role drop them
+    await publish("users")
 
     return True
 